@@ -14,6 +14,21 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from miqcli.api import Client
+import sys
 
 __all__ = ['Client']
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        """Import the client on first use.
+
+        The cli entry point (miqcli.cli.launcher) does not pay for the
+        client imports when forwarding commands to the daemon.
+        """
+        if name == 'Client':
+            from miqcli.api import Client
+            return Client
+        raise AttributeError('module %r has no attribute %r' % (__name__,
+                                                                name))
+else:
+    from miqcli.api import Client
@@ -14,7 +14,10 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import logging
 import os
+import threading
+import time
 import urllib3
 import errno
 
@@ -22,19 +25,120 @@ from click import Context
 from click.globals import push_context
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 
 from manageiq_client.api import APIException, ManageIQClient
 
 from requests.exceptions import ConnectionError
 
-from miqcli.constants import CFG_DIR, CFG_NAME, DEFAULT_CONFIG, TOKENFILE
+from miqcli.cache import ResolutionCache
+from miqcli.constants import CACHE_SIZE, CACHE_TTL, CFG_DIR, CFG_NAME, \
+    DEFAULT_CONFIG, HTTP_BACKOFF, HTTP_POOL_SIZE, HTTP_RETRIES, \
+    HTTP_RETRY_STATUSES, QUERY_PAGE_SIZE, QUERY_PREFETCH, TOKENFILE
+from miqcli.query import paginate
 from miqcli.utils import log, get_collection_class, Config
 
-__all__ = ['ClientAPI', 'Client']
+__all__ = ['ClientAPI', 'Client', 'Connections', 'build_session',
+           'connections']
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+#: seconds before the token expiry the token is considered expired
+TOKEN_EXPIRY_MARGIN = 30
+
+
+def build_session(pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES,
+                  backoff_factor=HTTP_BACKOFF):
+    """Build the http session used to talk with the ManageIQ server.
+
+    Connections are kept alive and reused by every request sent with the
+    session, so a command sending many requests performs a single TCP/TLS
+    handshake. Requests failing to connect or answered with a gateway
+    error are retried with an exponential backoff.
+
+    :param pool_size: maximum number of connections kept alive per host
+    :type pool_size: int
+    :param retries: number of times a failed request is retried
+    :type retries: int
+    :param backoff_factor: backoff factor between retries
+    :type backoff_factor: float
+    :return: http session
+    :rtype: requests.Session
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=HTTP_RETRY_STATUSES,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class _ManageIQClient(ManageIQClient):
+    """ManageIQ API client.
+
+    Extends the ManageIQ Python API client to send its requests with the
+    http session given (instead of opening its own session) and to
+    authenticate again when the server rejects the token. A request
+    answered with 401 calls the reauthenticate function given, which returns
+    a new token, and the request is sent again with the new token. This
+    happens once per request, and again on a later 401 only once the new
+    token was accepted.
+    """
+
+    def __init__(self, entry_point, auth, session=None, reauthenticate=None,
+                 logger=None, verify_ssl=True, ca_bundle_path=None):
+        """Constructor.
+
+        :param entry_point: ManageIQ API url
+        :type entry_point: str
+        :param auth: authentication details
+        :type auth: dict
+        :param session: http session
+        :type session: requests.Session
+        :param reauthenticate: function returning a new token
+        :type reauthenticate: object
+        """
+        # mirrors ManageIQClient.__init__, which always opens a new session
+        self._entry_point = entry_point
+        self._auth = auth
+        self._verify_ssl = verify_ssl
+        self._ca_bundle_path = ca_bundle_path
+        self._reauthenticate = reauthenticate
+        self._session = session or requests.Session()
+        self._session.headers.update(
+            {'Content-Type': 'application/json; charset=utf-8'})
+        self._build_auth(auth)
+        if not verify_ssl:
+            self._session.verify = False
+        elif ca_bundle_path:
+            self._session.verify = ca_bundle_path
+        self.logger = logger or logging.getLogger('manageiq_client.api')
+        self.response = None
+        self._load_data()
+
+    def _sending_request(self, func, retries=2):
+        """Send the request, authenticating again on 401 responses."""
+        response = super(_ManageIQClient, self)._sending_request(
+            func, retries)
+
+        if response.status_code == 401 and self._reauthenticate is not None:
+            reauthenticate, self._reauthenticate = self._reauthenticate, None
+            token = reauthenticate()
+            self._auth = dict(token=token)
+            self._session.headers.update({'X-Auth-Token': token})
+            response = super(_ManageIQClient, self)._sending_request(
+                func, retries)
+            if response.status_code != 401:
+                # the new token may expire as well (e.g. daemon connections)
+                self._reauthenticate = reauthenticate
+        return response
+
 
 class ClientAPI(object):
     """ManageIQ API client class.
@@ -74,9 +178,35 @@ class ClientAPI(object):
         self._password = settings.get('password', DEFAULT_CONFIG['password'])
 
         self._token = settings.get('token', None)
+        self._token_given = self._token is not None
+        self._token_expires = None
+
+        # optimistic authentication uses the token from the auth file without
+        # validating it first, the first request validates it
+        self._optimistic_auth = settings.get('optimistic_auth', True)
+
+        # resolution cache details
+        self._cache_enabled = settings.get('cache', None) is not False
+        self._cache_ttl = settings.get('cache_ttl', CACHE_TTL)
+        self._cache_size = settings.get('cache_size', CACHE_SIZE)
+        self._cache = None
+
+        # http session details
+        self._pool_size = settings.get('pool_size', HTTP_POOL_SIZE)
+        self._retries = settings.get('retries', HTTP_RETRIES)
+        self._backoff_factor = settings.get('backoff_factor', HTTP_BACKOFF)
+        self._session = None
 
         self._client = None
 
+    @property
+    def url(self):
+        """URL property.
+
+        :return: ManageIQ API url
+        """
+        return self._url
+
     @property
     def token(self):
         """Token property
@@ -85,6 +215,33 @@ class ClientAPI(object):
         """
         return self._token
 
+    @property
+    def cache(self):
+        """Resolution cache property.
+
+        :return: resolution cache or none when the cache is disabled
+        :rtype: ResolutionCache
+        """
+        if self._cache_enabled and self._cache is None:
+            self._cache = ResolutionCache(ttl=self._cache_ttl,
+                                          size=self._cache_size)
+        return self._cache
+
+    @property
+    def session(self):
+        """Http session property.
+
+        Every request sent to the server (authentication and collections)
+        goes through this session.
+
+        :return: http session
+        :rtype: requests.Session
+        """
+        if self._session is None:
+            self._session = build_session(self._pool_size, self._retries,
+                                          self._backoff_factor)
+        return self._session
+
     @property
     def client(self):
         """Return the ManageIQ API Client connection property.
@@ -93,13 +250,26 @@ class ClientAPI(object):
         """
         return self._client
 
+    def expired(self):
+        """Check if the token of the connection is known to be expired.
+
+        :return: True if the token expired otherwise False (also when the
+            token expiry is unknown)
+        :rtype: bool
+        """
+        return self._token_expires is not None and \
+            time.time() >= self._token_expires - TOKEN_EXPIRY_MARGIN
+
     def connect(self):
         """
         Create a connection pointer for the ManageIQ instance. This
         function first build a token to assign it to self._token before
         trying to create a connection pointer.
+
+        Connecting again (e.g. once the token expired) uses the token from
+        the auth file (or a new one) unless the token was given.
         """
-        self._build_token(token=self.token)
+        self._build_token(token=self.token if self._token_given else None)
         self._connect()
 
     def _build_token(self, token=None):
@@ -122,32 +292,86 @@ class ClientAPI(object):
 
         """
 
+        saved = None
+
         # if none is given
         if token is None:
-            # get from auth file and test it
-            token = self._get_from_auth_file()
+            # get from auth file, along with its expiry
+            token = saved = self._get_from_auth_file()
+            self._token_expires = None if token is None else \
+                self._get_token_expiry()
 
-            # if token from auth file is not valid, generate one
-            if token is None or not self._valid_token(token):
+            if token is None or self.expired():
+                # token from auth file is undefined or known to be expired
                 token = self._generate_token()
+            elif not self._optimistic_auth and not self._valid_token(token):
+                # token from auth file is not valid, generate one
+                token = self._generate_token()
+            # otherwise the token is validated by the first request sent
+            # to the server (see _reauthenticate)
         else:
             # check if given token is valid
             if not self._valid_token(token):
                 log.abort('Given token {0} is not valid.'.format(token))
 
-        # always save the token in the auth file
-        self._set_auth_file(token)
+        # always save a new token in the auth file, the saved token reused
+        # is kept along with its expiry
+        if token != saved:
+            self._set_auth_file(token, self._token_expires)
+        self._token = token
+
+    def _reauthenticate(self):
+        """Generate a new token once the server rejects the current one.
+
+        Called on the first 401 response of the ManageIQ client (when
+        optimistic authentication is enabled).
+
+        :return: new token
+        :rtype: str
+        """
+        token = self._generate_token()
+        self._set_auth_file(token, self._token_expires)
         self._token = token
+        return token
 
     @staticmethod
-    def _set_auth_file(token):
+    def _token_expiry_file():
+        """Return the file holding the token expiry, next to TOKENFILE."""
+        return TOKENFILE + '.expires'
+
+    @classmethod
+    def _get_token_expiry(cls):
+        """Get the expiry of the token from the auth file.
+
+        :return: token expiry (epoch seconds) or none when unknown
+        :rtype: float
+        """
+        try:
+            with open(cls._token_expiry_file(), 'r') as fp:
+                return float(fp.read().strip())
+        except (IOError, OSError, ValueError):
+            return None
+
+    @classmethod
+    def _set_auth_file(cls, token, expires=None):
         """
         Save the token into TOKENFILE
         :param token: given token
+        :param expires: optional token expiry (epoch seconds), saved next to
+            TOKENFILE (the expiry of a previous token is removed when none)
         """
         try:
             with open(TOKENFILE, "w") as fp:
                 fp.write(token)
+            if expires is not None:
+                with open(cls._token_expiry_file(), "w") as fp:
+                    fp.write(str(expires))
+            else:
+                try:
+                    os.remove(cls._token_expiry_file())
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
         except (IOError, OSError) as e:
             log.abort('Error setting token file. %s' % e)
 
@@ -179,8 +403,8 @@ class ClientAPI(object):
         """
         headers = {'Accept': 'application/json', 'X-Auth-Token': token}
         try:
-            output = requests.get(self._url, headers=headers,
-                                  verify=self._verify_ssl)
+            output = self.session.get(self._url, headers=headers,
+                                      verify=self._verify_ssl)
             if output.status_code != 200:
                 return False
             return True
@@ -205,13 +429,21 @@ class ClientAPI(object):
             log.abort('You need to set username and password.')
         auth_endpoint = self._url + "/auth"
         try:
-            output = requests.get(auth_endpoint,
-                                  auth=HTTPBasicAuth(self._username,
-                                                     self._password),
-                                  verify=False)
+            # the (possibly rejected) token header set on the session by the
+            # ManageIQ client is dropped, basic authentication is used
+            output = self.session.get(auth_endpoint,
+                                      headers={'X-Auth-Token': None},
+                                      auth=HTTPBasicAuth(self._username,
+                                                         self._password),
+                                      verify=False)
 
             if output.status_code == 200:
-                return output.json()["auth_token"]
+                data = output.json()
+                # the expiry of a previous token never applies to this one
+                self._token_expires = None
+                if 'token_ttl' in data:
+                    self._token_expires = time.time() + int(data['token_ttl'])
+                return data["auth_token"]
             else:
                 log.abort('Unsuccessful attempt to authenticate: '
                           '{0}'.format(output.status_code))
@@ -224,13 +456,76 @@ class ClientAPI(object):
         Create new manageIQClient pointer and assign to self._client
         """
         try:
-            self._client = ManageIQClient(self._url,
-                                          dict(token=self._token),
-                                          verify_ssl=self._verify_ssl)
+            # a given token is validated up front, only the token from the
+            # auth file is generated again when the server rejects it
+            reauthenticate = None
+            if self._optimistic_auth and not self._token_given:
+                reauthenticate = self._reauthenticate
+            self._client = _ManageIQClient(self._url,
+                                           dict(token=self._token),
+                                           session=self.session,
+                                           reauthenticate=reauthenticate,
+                                           verify_ssl=self._verify_ssl)
         except APIException as e:
-            log.abort('Error creating library pointer - {0}'.format(e.message))
+            log.abort('Error creating library pointer - {0}'.format(e))
         except Exception as e:
-            log.abort('{0}'.format(e.message))
+            log.abort('{0}'.format(e))
+
+
+class Connections(object):
+    """Connected client apis, one per server settings.
+
+    A command run by the cli connects once and exits. A long running
+    process (see miqcli.daemon) gets the client api of the same settings
+    again, keeping its http session, token and collections. The client api
+    is connected again once its token is known to be expired.
+    """
+
+    #: settings which do not change the connection
+    IGNORED = ('verbose', 'log_level', 'version')
+
+    def __init__(self):
+        """Constructor."""
+        self._apis = dict()
+        self._lock = threading.Lock()
+
+    def _key(self, settings):
+        """Return the key of the connection for the settings."""
+        return repr(sorted((key, value) for key, value in settings.items()
+                           if key not in self.IGNORED))
+
+    def get(self, settings):
+        """Return the connected client api for the settings.
+
+        :param settings: server settings
+        :type settings: dict
+        :return: connected client api
+        :rtype: ClientAPI
+        """
+        key = self._key(settings)
+        with self._lock:
+            api = self._apis.get(key)
+            if api is None:
+                api = ClientAPI(settings)
+                api.connect()
+                self._apis[key] = api
+            elif api.expired():
+                api.connect()
+            return api
+
+    def clear(self):
+        """Forget all connections."""
+        with self._lock:
+            self._apis.clear()
+
+    def __len__(self):
+        """Return the number of connections."""
+        with self._lock:
+            return len(self._apis)
+
+
+#: connections of the cli process
+connections = Connections()
 
 
 class Client(object):
@@ -316,3 +611,30 @@ class Client(object):
         :type name: str
         """
         self._collection = get_collection_class(self._ctx, name)()
+
+    def paginate(self, name, page_size=QUERY_PAGE_SIZE, limit=None, offset=0,
+                 attributes=None, prefetch=QUERY_PREFETCH):
+        """Iterate over the resources of a collection, page by page.
+
+        .. code-block: python
+
+            for vm in client.paginate('vms', page_size=500, prefetch=4):
+                print(vm.name)
+
+        :param name: collection name
+        :type name: str
+        :param page_size: number of resources per page
+        :type page_size: int
+        :param limit: maximum number of resources (all when none)
+        :type limit: int
+        :param offset: number of resources to skip
+        :type offset: int
+        :param attributes: attributes to load into the resources
+        :type attributes: tuple
+        :param prefetch: number of pages requested ahead
+        :type prefetch: int
+        :return: generator of resources
+        """
+        collection = getattr(self._ctx.client_api.client.collections, name)
+        return paginate(collection, page_size, limit, offset, attributes,
+                        prefetch)
@@ -0,0 +1,256 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Cache module persists name to id resolutions between cli invocations."""
+
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+
+from miqcli.constants import CACHE_FILE, CACHE_SIZE, CACHE_TTL
+
+__all__ = ['ResolutionCache', 'write_json']
+
+
+def write_json(path, data):
+    """Atomically write data to a json file.
+
+    The file is never seen half written by another cli process. Files
+    written are optimizations (caches), failing to save is not an error.
+
+    :param path: json file
+    :type path: str
+    :param data: json serializable data
+    :return: whether the file was written
+    :rtype: bool
+    """
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            return False
+
+    try:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.cache')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(data, fp)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # windows does not replace existing files on rename
+            os.remove(path)
+            os.rename(tmp, path)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+class ResolutionCache(object):
+    """Persistent name to id resolution cache.
+
+    Resolved ids of provider resources (flavors, images, tenants, ...) are
+    stored on disk so following cli invocations do not need to look them up
+    again. Entries expire after ttl seconds and the least recently used
+    entries are evicted once the cache holds more than size entries.
+
+    The cache file is written atomically, it is never seen half written by
+    another cli process. It is only written when an entry is put, expired
+    or evicted: access times of the entries read are kept in memory until
+    then.
+    """
+
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, size=CACHE_SIZE):
+        """Constructor.
+
+        :param path: cache file
+        :type path: str
+        :param ttl: seconds an entry is valid for
+        :type ttl: int
+        :param size: maximum number of entries
+        :type size: int
+        """
+        self._path = path
+        self._ttl = ttl
+        self._size = size
+        self._entries = None
+        self._accessed = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, collection, _type, name, tenant=None):
+        """Build the cache key for a resource.
+
+        :param url: ManageIQ API url
+        :type url: str
+        :param collection: collection name
+        :type collection: str
+        :param _type: resource type
+        :type _type: str
+        :param name: resource name
+        :type name: str
+        :param tenant: optional tenant id
+        :type tenant: str
+        :return: cache key
+        :rtype: str
+        """
+        parts = (url, collection, _type, name, tenant or '')
+        return '|'.join(str(part) for part in parts)
+
+    def _read(self):
+        """Read the entries from the cache file.
+
+        A missing or corrupt cache file is an empty cache.
+
+        :return: entries
+        :rtype: dict
+        """
+        try:
+            with open(self._path, 'r') as fp:
+                entries = json.load(fp)
+            if isinstance(entries, dict):
+                return entries
+        except (IOError, OSError, ValueError):
+            pass
+        return dict()
+
+    def _write(self, entries):
+        """Atomically write the entries to the cache file.
+
+        :param entries: entries
+        :type entries: dict
+        """
+        write_json(self._path, entries)
+
+    def _reread(self):
+        """Read the entries again before writing.
+
+        Entries saved by other cli processes in the meantime are kept. The
+        access times kept in memory are merged into the entries read.
+
+        :return: entries
+        :rtype: dict
+        """
+        entries = self._read()
+        for _key, accessed in self._accessed.items():
+            if _key in entries:
+                entries[_key][2] = max(entries[_key][2], accessed)
+        self._accessed = dict()
+        return entries
+
+    def _commit(self, entries):
+        """Evict the least recently used entries and write the entries.
+
+        :param entries: entries
+        :type entries: dict
+        """
+        if len(entries) > self._size:
+            keys = sorted(entries, key=lambda k: entries[k][2])
+            for _key in keys[:len(entries) - self._size]:
+                del entries[_key]
+
+        self._entries = entries
+        self._write(entries)
+
+    def _save(self, key, entry):
+        """Save an entry (or remove it when entry is none).
+
+        :param key: cache key
+        :type key: str
+        :param entry: value, creation and access times
+        :type entry: list
+        """
+        entries = self._reread()
+        if entry is None:
+            entries.pop(key, None)
+        else:
+            entries[key] = entry
+        self._commit(entries)
+
+    def get(self, key):
+        """Get the value for the key.
+
+        :param key: cache key
+        :type key: str
+        :return: cached value or none when the key is undefined or expired
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            now = time.time()
+            if now - entry[1] > self._ttl:
+                self._save(key, None)
+                return None
+
+            self._accessed[key] = now
+            return entry[0]
+
+    def put(self, key, value):
+        """Set the value for the key.
+
+        :param key: cache key
+        :type key: str
+        :param value: value
+        """
+        with self._lock:
+            now = time.time()
+            self._save(key, [value, now, now])
+
+    def invalidate(self, url, _type=None):
+        """Remove the entries of a server.
+
+        Called once resources may change their ids, e.g. when a provider
+        is added, removed or refreshed.
+
+        :param url: ManageIQ API url
+        :type url: str
+        :param _type: part of the resource type of the entries removed, all
+            entries of the server are removed when not set
+        :type _type: str
+        """
+        with self._lock:
+            entries = self._reread()
+            for key in list(entries):
+                parts = key.split('|')
+                if parts[0] == url and (_type is None or _type in parts[2]):
+                    del entries[key]
+            self._commit(entries)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries = dict()
+            self._accessed = dict()
+            try:
+                os.remove(self._path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    def __len__(self):
+        """Return the number of entries."""
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            return len(self._entries)
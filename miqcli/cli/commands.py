@@ -0,0 +1,215 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Built-in commands.
+
+Commands which are not ManageIQ collections. They manage the client itself
+and do not connect to the ManageIQ server.
+"""
+
+import json
+import shlex
+import time
+
+import click
+
+from miqcli.cache import ResolutionCache
+from miqcli.constants import DAEMON_SOCKET, GLOBAL_PARAMS
+from miqcli.daemon import DaemonServer, control
+from miqcli.utils import log
+
+__all__ = ['BUILTIN_COMMANDS', 'GLOBAL_ARGS']
+
+#: context meta data key of the global options given to the cli
+GLOBAL_ARGS = 'miqcli.global_args'
+
+
+@click.group()
+def cache():
+    """Manage the local cache of resolved resource ids."""
+
+
+@cache.command()
+def clear():
+    """Remove all cached resource ids."""
+    ResolutionCache().clear()
+    log.info('Resolution cache cleared.')
+
+
+@click.group()
+def daemon():
+    """Run the commands within a long running process."""
+
+
+def _socket_option(func):
+    """Add the daemon unix socket option."""
+    return click.option('--socket', 'path', default=DAEMON_SOCKET,
+                        help='Unix socket the daemon listens on.')(func)
+
+
+@daemon.command()
+@_socket_option
+@click.option('--foreground', is_flag=True, default=False,
+              help='Run the daemon without detaching from the terminal.')
+def start(path, foreground):
+    """Start the daemon, following commands are forwarded to it."""
+    if control('status', path) is not None:
+        log.abort('Daemon is already running.')
+
+    server = DaemonServer(path)
+    server.bind()
+    if foreground:
+        log.info('Daemon listening on %s.', path)
+    else:
+        log.flush()
+        pid = server.detach()
+        if pid:
+            log.info('Daemon started (pid %s).', pid)
+            return
+    log.flush()
+    server.serve_forever()
+
+
+@daemon.command()
+@_socket_option
+def stop(path):
+    """Stop the daemon."""
+    if control('stop', path) is None:
+        log.abort('Daemon is not running.')
+    log.info('Daemon stopped.')
+
+
+@daemon.command()
+@_socket_option
+def status(path):
+    """Show the daemon status."""
+    status = control('status', path)
+    if status is None:
+        log.abort('Daemon is not running.')
+    log.info('Daemon is running (pid %s, up %ss, %s commands run, '
+             '%s connections).', status['pid'], status['uptime'],
+             status['commands'], status['connections'])
+
+
+def _command_name(argv):
+    """Return the command name of cli arguments, following global options.
+
+    :param argv: cli arguments
+    :type argv: list
+    :return: command name or none
+    :rtype: str
+    """
+    valued = set()
+    for param in GLOBAL_PARAMS:
+        if not param.is_flag:
+            valued.update(param.opts)
+
+    args = iter(argv)
+    for arg in args:
+        if arg in valued:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+
+def _read_batch(fp):
+    """Read the commands of a batch.
+
+    Every line is verified before any command runs.
+
+    :param fp: file listing the commands
+    :type fp: file
+    :return: line number, line and cli arguments of the commands
+    :rtype: list
+    """
+    commands = list()
+    for number, line in enumerate(fp, 1):
+        line = line.strip()
+        try:
+            argv = shlex.split(line, comments=True)
+        except ValueError as e:
+            log.abort('Line {0}: {1}.'.format(number, e))
+        if not argv:
+            continue
+        if _command_name(argv) in BUILTIN_COMMANDS:
+            log.abort('Line {0}: the {1} command can not run within a '
+                      'batch.'.format(number, _command_name(argv)))
+        commands.append((number, line, argv))
+    return commands
+
+
+@click.command()
+@click.option('-f', '--file', 'commands', type=click.File('r'), default='-',
+              help='File listing the commands, one per line (defaults to '
+                   'the standard input).')
+@click.option('--results', type=str,
+              help='File the JSON Lines results (line, command, exit code '
+                   'and seconds) are written to.')
+@click.option('--stop-on-error', is_flag=True, default=False,
+              help='Stop at the first failing command.')
+def batch(commands, results, stop_on_error):
+    """Run many commands within one process.
+
+    Each line is a command as given to miqcli, e.g. "vms query my_vm".
+    Blank lines and comments (#) are skipped. Commands run in order with
+    the global options given to miqcli and share the connection, the
+    token and the caches.
+    """
+    # the cli imports the built-in commands
+    from miqcli.cli.main import run
+
+    lines = _read_batch(commands)
+    args = click.get_current_context().find_root().meta.get(GLOBAL_ARGS, [])
+
+    output = list()
+    fp = open(results, 'w') if results else None
+    try:
+        for number, line, argv in lines:
+            log.debug('Running line {0}: {1}'.format(number, line))
+            start = time.time()
+            try:
+                rc = run(args + argv)
+            except Exception as e:
+                log.error('Line {0}: {1}'.format(number, e))
+                rc = 1
+            log.flush()
+
+            result = dict(line=number, command=line, exit=rc,
+                          seconds=round(time.time() - start, 3))
+            output.append(result)
+            if fp is not None:
+                fp.write(json.dumps(result, sort_keys=True) + '\n')
+                fp.flush()
+            if rc != 0:
+                log.error('Line {0} failed with exit code {1}: {2}'.format(
+                    number, rc, line))
+                if stop_on_error:
+                    break
+    finally:
+        if fp is not None:
+            fp.close()
+
+    failed = len([result for result in output if result['exit'] != 0])
+    log.info('{0} of {1} commands succeeded.'.format(
+        len(output) - failed, len(lines)))
+    if failed:
+        log.abort('{0} of {1} commands failed.'.format(failed, len(lines)))
+    return output
+
+
+#: command name to click command
+BUILTIN_COMMANDS = dict(batch=batch, cache=cache, daemon=daemon)
@@ -0,0 +1,69 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Cli entry point.
+
+Commands are forwarded to the daemon when it runs (see miqcli.daemon),
+otherwise they run within this process. The cli is only imported when the
+command is not forwarded.
+"""
+
+import sys
+
+from miqcli.daemon import forward
+
+__all__ = ['main']
+
+
+def _local(argv):
+    """Check if the command must run within this process.
+
+    The daemon is managed by this process, not by the daemon itself. The
+    daemon does not get the standard input, batches read from it run here.
+
+    :param argv: cli arguments
+    :type argv: list
+    :return: True if the command is not forwarded otherwise False
+    :rtype: bool
+    """
+    if 'daemon' in argv:
+        return True
+    if 'batch' in argv:
+        for index, arg in enumerate(argv):
+            if arg.startswith('--file='):
+                return arg == '--file=-'
+            if arg in ('-f', '--file'):
+                return argv[index + 1:index + 2] in ([], ['-'])
+        return True
+    return False
+
+
+def main(argv=None):
+    """Run the cli.
+
+    :param argv: cli arguments (sys.argv)
+    :type argv: list
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if not _local(argv):
+        rc = forward(argv)
+        if rc is not None:
+            sys.exit(rc)
+
+    from miqcli.cli.main import cli
+    cli.main(args=argv)
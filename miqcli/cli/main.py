@@ -19,14 +19,15 @@ from copy import copy
 from functools import wraps
 
 import click
-from os import listdir
 
-from miqcli.api import ClientAPI
+from miqcli.api import connections
 from miqcli._compat import ServerProxy
-from miqcli.constants import CFG_DIR, CFG_NAME, COLLECTIONS_ROOT, \
-    DEFAULT_CONFIG, GLOBAL_PARAMS, PACKAGE, PYPI, VERSION
-from miqcli.utils import Config, get_class_methods, log, \
-    is_default_config_used, _abort_invalid_commands, get_collection_class
+from miqcli.cli.commands import BUILTIN_COMMANDS, GLOBAL_ARGS
+from miqcli.cli.manifest import command_help, manifest
+from miqcli.constants import CFG_DIR, CFG_NAME, DEFAULT_CONFIG, \
+    GLOBAL_PARAMS, PACKAGE, PYPI, get_version
+from miqcli.utils import Config, log, is_default_config_used, \
+    _abort_invalid_commands, get_collection_class
 
 
 class ManageIQ(click.MultiCommand):
@@ -47,30 +48,46 @@ class ManageIQ(click.MultiCommand):
     def list_commands(self, ctx):
         """Return a list of available commands.
 
-        Traverses the collections package to get all module names. Module
-        names are the name of the command itself.
+        Reads the collection names from the command manifest, collection
+        modules are not imported. Module names are the name of the command
+        itself. Built-in commands are appended to the collections.
 
         :param ctx: Click context.
         :type ctx: Namespace
         :return: Available commands.
         :rtype: list
         """
-        collections = list()
-        for filename in listdir(COLLECTIONS_ROOT):
-            if '__init__' in filename:
-                continue
-            if filename.endswith('.py'):
-                collections.append(filename[:-3])
+        collections = manifest.names()
+        collections.extend(BUILTIN_COMMANDS)
         collections.sort()
         return collections
 
+    def parse_args(self, ctx, args):
+        """Parse the arguments, keeping the global options given.
+
+        The global options are kept in the context meta data, the batch
+        command runs each of its commands with them.
+
+        :param ctx: Click context.
+        :type ctx: Namespace
+        :param args: Arguments.
+        :type args: list
+        :return: Remaining arguments.
+        :rtype: list
+        """
+        given = list(args)
+        rest = super(ManageIQ, self).parse_args(ctx, args)
+        used = len(ctx.protected_args) + len(ctx.args)
+        ctx.meta[GLOBAL_ARGS] = given[:len(given) - used]
+        return rest
+
     def get_command(self, ctx, name):
         """Return the command (collections) object based on the command
         selected to run.
 
-        Imports the collection module based on the command to run and gets
-        the collection class. The collection class is then passed to the
-        sub-command class.
+        Looks up the collection in the command manifest and passes its
+        entry to the sub-command class. The collection module is imported
+        only when one of its sub-commands is run.
 
         :param ctx: Click context.
         :type ctx: Namespace
@@ -79,7 +96,12 @@ class ManageIQ(click.MultiCommand):
         :return: Click command object.
         :rtype: object
         """
-        return SubCollections(get_collection_class(ctx, name))
+        if name in BUILTIN_COMMANDS:
+            return BUILTIN_COMMANDS[name]
+        entry = manifest.get(name)
+        if entry is None:
+            _abort_invalid_commands(ctx, name)
+        return SubCollections(name, entry)
 
     def invoke(self, ctx):
         """Invoke the command selected.
@@ -96,13 +118,15 @@ class ManageIQ(click.MultiCommand):
             # miq cli version
             msg, version = '', ''
 
+            installed = get_version()
+
             # get ManageIQ CLI available versions from PYPI
             pypi = ServerProxy(PYPI)
             versions = pypi.package_releases(PACKAGE)
 
             # lets begin version message formatting
             try:
-                version_index = versions.index(VERSION)
+                version_index = versions.index(installed)
                 if version_index == 0:
                     status = 'an up-to-date'
                 else:
@@ -118,7 +142,7 @@ class ManageIQ(click.MultiCommand):
             finally:
                 msg = 'Installed version : {0}\nLatest version    : {1}\n\n' \
                       'You are running {2} version of ManageIQ CLI!'. \
-                    format(VERSION, version, status)
+                    format(installed, version, status)
                 click.echo(msg)
                 ctx.exit()
         else:
@@ -135,22 +159,34 @@ class SubCollections(click.MultiCommand):
         miqcli <parent_command> <sub_command>
     """
 
-    def __init__(self, collection_cls):
+    def __init__(self, name, entry):
         """Constructor.
 
-        :param collection: Collection class.
-        :type collection: class
+        :param name: Collection name.
+        :type name: str
+        :param entry: Command manifest entry of the collection.
+        :type entry: dict
         """
-        super(SubCollections, self).__init__(help=collection_cls.__doc__)
-        self.collection_cls = collection_cls
+        super(SubCollections, self).__init__(name=name, help=entry['help'])
+        self.entry = entry
+        self._collection_cls = None
+
+    @property
+    def collection_cls(self):
+        """Collection class, the module is imported on first access."""
+        if self._collection_cls is None:
+            self._collection_cls = get_collection_class(
+                click.get_current_context(), self.name)
+        return self._collection_cls
 
     def list_commands(self, ctx):
         """Return a list of available sub-commands for the parent command.
 
-        Traverses the collection class to get all method names. Class method
-        names are the names of the sub-commands for the parent command.
+        Reads the collection class method names from the command manifest.
+        Class method names are the names of the sub-commands for the parent
+        command.
         """
-        return get_class_methods(self.collection_cls)
+        return sorted(self.entry['commands'])
 
     @staticmethod
     def convert_to_function(method):
@@ -189,6 +225,9 @@ class SubCollections(click.MultiCommand):
         :return: Click command object.
         :rtype: object
         """
+        if name not in self.entry['commands']:
+            return None
+
         collection = self.collection_cls()
 
         method = getattr(collection, name)
@@ -198,16 +237,32 @@ class SubCollections(click.MultiCommand):
         new_method.__click_params__ = copy(params)
 
         attributes = dict()
-        try:
-            # removes methods documented parameters from showing in help
-            attributes['help'] = method.__doc__.split('::')[0].strip()
-        except AttributeError:
-            # methods docstring does not container documented parameters
-            attributes['help'] = method.__doc__
+        # removes methods documented parameters from showing in help
+        attributes['help'] = command_help(method.__doc__)
 
         cmd = click.command(name=name, **attributes)(new_method)
         return cmd
 
+    def _output(self, ctx):
+        """Return the output format given to the sub-command.
+
+        The sub-command options are parsed (not processed) ahead of the
+        sub-command, the configuration and connection messages are then
+        written to stderr for the machine readable outputs.
+
+        :param ctx: Click context.
+        :type ctx: Namespace
+        :return: Output format or none when not given.
+        :rtype: str
+        """
+        command = self.get_command(ctx, ctx.protected_args[0])
+        try:
+            opts, _, _ = command.make_parser(ctx).parse_args(list(ctx.args))
+        except click.UsageError:
+            # reported when the sub-command itself parses its options
+            return None
+        return opts.get('output')
+
     def invoke(self, ctx):
         """Invoke the sub-command selected.
 
@@ -227,6 +282,10 @@ class SubCollections(click.MultiCommand):
             _abort_invalid_commands(ctx, ctx.protected_args[0])
 
         if '--help' not in ctx.args:
+            # machine readable output, stdout holds the records only
+            if self._output(ctx) not in (None, 'text'):
+                log.set_machine_output(ctx)
+
             # get parent context
             parent_ctx = click.get_current_context().find_root()
 
@@ -255,11 +314,11 @@ class SubCollections(click.MultiCommand):
             if is_default_config_used():
                 log.warning('Default configuration is used.')
 
-            # create the client api object
-            client = ClientAPI(click.get_current_context().find_root().params)
-
-            # connect to manageiq server
-            client.connect()
+            # get the client api connected to the manageiq server, a long
+            # running process (daemon) reuses the connection of previous
+            # commands
+            client = connections.get(
+                click.get_current_context().find_root().params)
 
             # save the client api pointer reference in the parent context for
             # each collection to access
@@ -271,3 +330,27 @@ class SubCollections(click.MultiCommand):
 
 # it all begins here..
 cli = ManageIQ()
+
+
+def run(argv):
+    """Run a command within the current process, returning its exit code.
+
+    Unlike the cli entry point, the process does not exit once the command
+    ends. Used to run many commands within one process (the batch command
+    and the daemon), sharing connections and caches.
+
+    :param argv: cli arguments
+    :type argv: list
+    :return: exit code
+    :rtype: int
+    """
+    try:
+        cli.main(args=list(argv), prog_name=PACKAGE)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        click.echo(e.code, err=True)
+        return 1
+    return 0
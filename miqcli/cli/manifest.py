@@ -0,0 +1,179 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Command manifest lists the cli commands without importing collections.
+
+Listing the commands (miqcli --help, shell completion, invalid command
+errors) needs the sub-commands and help text of every collection. Reading
+them means importing every collection module, so they are recorded once in
+a manifest file and only the collection of the command run is imported.
+"""
+
+import json
+import os
+from importlib import import_module
+
+from miqcli.cache import write_json
+from miqcli.constants import COLLECTIONS_PACKAGE, COLLECTIONS_ROOT, \
+    MANIFEST_FILE
+from miqcli.utils import get_class_methods
+
+__all__ = ['CommandManifest', 'command_help', 'manifest']
+
+
+def command_help(doc):
+    """Return the help text of a command from its docstring.
+
+    Documented parameters (following '::') are not part of the help.
+
+    :param doc: docstring
+    :type doc: str
+    :return: help text
+    :rtype: str
+    """
+    if doc is None:
+        return None
+    return doc.split('::')[0].strip()
+
+
+class CommandManifest(object):
+    """Manifest of the collection commands.
+
+    The manifest records for each collection its help text and for each
+    sub-command its help text. The sub-command options are read from the
+    collection module, imported to run one of its sub-commands (or show
+    its help). The manifest is stored in a json file, keyed by the size
+    and modification time of the collection modules. It is built again
+    (importing every collection module) only when the key changes, e.g.
+    after an upgrade.
+    """
+
+    def __init__(self, path=MANIFEST_FILE, root=COLLECTIONS_ROOT,
+                 package=COLLECTIONS_PACKAGE):
+        """Constructor.
+
+        :param path: manifest file
+        :type path: str
+        :param root: collections package directory
+        :type root: str
+        :param package: collections package name
+        :type package: str
+        """
+        self._path = path
+        self._root = root
+        self._package = package
+        self._collections = None
+
+    def _modules(self):
+        """Return the collection module names."""
+        modules = list()
+        for filename in os.listdir(self._root):
+            if filename.endswith('.py') and not filename.startswith('__'):
+                modules.append(filename[:-3])
+        modules.sort()
+        return modules
+
+    def key(self):
+        """Return the key of the installed collections.
+
+        The key is built from the modification time of the collections
+        package directory and the size and modification time of its
+        modules, both change on upgrades as well as on development
+        installs. Reading the installed version instead would look up the
+        distribution metadata on every invocation.
+
+        :return: manifest key
+        :rtype: str
+        """
+        parts = ['%d' % int(os.stat(self._root).st_mtime)]
+        for name in self._modules():
+            stat = os.stat(os.path.join(self._root, name + '.py'))
+            parts.append('%s:%d:%d' % (name, stat.st_size,
+                                       int(stat.st_mtime)))
+        return '|'.join(parts)
+
+    def build(self):
+        """Build the manifest importing every collection module.
+
+        :return: collection name to its help text and sub-commands
+        :rtype: dict
+        """
+        collections = dict()
+        for name in self._modules():
+            cls = getattr(import_module(self._package + '.' + name),
+                          'Collections')
+            commands = dict()
+            for method_name in get_class_methods(cls):
+                method = getattr(cls, method_name)
+                commands[method_name] = dict(
+                    help=command_help(method.__doc__))
+            collections[name] = dict(help=cls.__doc__, commands=commands)
+        return collections
+
+    def _read(self):
+        """Read the manifest file.
+
+        A missing or corrupt manifest file is an empty manifest.
+
+        :return: manifest key and collections
+        :rtype: dict
+        """
+        try:
+            with open(self._path, 'r') as fp:
+                data = json.load(fp)
+            if isinstance(data, dict):
+                return data
+        except (IOError, OSError, ValueError):
+            pass
+        return dict()
+
+    def load(self):
+        """Load the manifest, building it when missing or outdated.
+
+        :return: collection name to its help text and sub-commands
+        :rtype: dict
+        """
+        if self._collections is None:
+            key = self.key()
+            data = self._read()
+            if data.get('key') != key or \
+                    not isinstance(data.get('collections'), dict):
+                data = dict(key=key, collections=self.build())
+                write_json(self._path, data)
+            self._collections = data['collections']
+        return self._collections
+
+    def names(self):
+        """Return the collection names.
+
+        :return: collection names
+        :rtype: list
+        """
+        return sorted(self.load())
+
+    def get(self, name):
+        """Return the manifest entry of a collection.
+
+        :param name: collection name
+        :type name: str
+        :return: help text and sub-commands or none for unknown collections
+        :rtype: dict
+        """
+        return self.load().get(name)
+
+
+#: manifest of the installed collections
+manifest = CommandManifest()
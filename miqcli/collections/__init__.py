@@ -14,6 +14,17 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+from functools import reduce
+
+from manageiq_client.api import APIException, Entity
+from manageiq_client.filters import Q
+
+from miqcli.constants import POLL_TIMEOUT, QUERY_CHUNK_SIZE
+from miqcli.query import Record, paginate
+from miqcli.utils import get_client_api_pointer, log
+from miqcli.utils.output import get_writer
+from miqcli.utils.poll import poll, ticks
+
 __all__ = ['CollectionsMixin']
 
 
@@ -21,11 +32,100 @@ class CollectionsMixin(object):
     """Mixin collections class.
 
     Provides extra properties and methods to collections.
+
+    The api, collection, all and action properties are bound lazily. The
+    client_api decorator only records which collection method is running,
+    the ManageIQ server is not contacted until a property is accessed for
+    the first time. This way a method that never touches the full listing
+    (e.g. deleting a vm by id) never downloads the whole collection.
     """
 
     # request id
     _req_id = ''
 
+    # attribute holding the state of a request (or task)
+    _state_attr = 'state'
+
+    # states a request (or task) ends in
+    _terminal_states = ('finished',)
+
+    # collection method currently bound by the client_api decorator
+    _method_name = None
+
+    # lazily bound attributes (see _bind)
+    _api, _collection, _all, _action = None, None, None, None
+    _all_loaded, _action_loaded = False, False
+
+    def _bind(self, method_name):
+        """Bind the collection method about to be invoked.
+
+        Resets any previously resolved attributes. They will be resolved
+        again on first access for the given method.
+
+        :param method_name: collection method name
+        :type method_name: str
+        """
+        self._method_name = method_name
+        self._api, self._collection, self._all, self._action = \
+            None, None, None, None
+        self._all_loaded, self._action_loaded = False, False
+
+    @property
+    def api(self):
+        """Client api pointer property.
+
+        :return: client api pointer
+        :rtype: object
+        """
+        if self._api is None:
+            self._api = get_client_api_pointer()
+        return self._api
+
+    @property
+    def collection(self):
+        """ManageIQ API client collection property.
+
+        The collection name is the name of the collection module.
+
+        :return: collection
+        :rtype: object
+        """
+        if self._collection is None:
+            self._collection = getattr(self.api.client.collections,
+                                       self.__module__.split('.')[-1])
+        return self._collection
+
+    @property
+    def all(self):
+        """All entities of the collection.
+
+        The collection is downloaded on first access only.
+
+        :return: collection entities
+        :rtype: list
+        """
+        if not self._all_loaded:
+            self._all = self.collection.all
+            self._all_loaded = True
+        return self._all
+
+    @property
+    def action(self):
+        """Collection action matching the bound collection method.
+
+        :return: collection action or None when the action does not exist
+        :rtype: object
+        """
+        if not self._action_loaded:
+            try:
+                self._action = getattr(self.collection.action,
+                                       self._method_name)
+            except (AttributeError, RuntimeError, TypeError):
+                # action does not exist
+                self._action = None
+            self._action_loaded = True
+        return self._action
+
     @property
     def req_id(self):
         """Request id property.
@@ -61,3 +161,297 @@ class CollectionsMixin(object):
             # python 2
             results = value.pop(0)
         self._req_id = getattr(results, 'id')
+
+    def wait_for(self, req_id, states=None, timeout=POLL_TIMEOUT,
+                 output='text'):
+        """Wait for a request (or task) to reach one of the given states.
+
+        The request is polled with exponential backoff and jitter and is
+        returned as soon as it reaches one of the states. Only the state
+        transitions are reported, for the text output only.
+
+        Usage
+
+        .. code-block: python
+
+        client.collection = 'provision_requests'
+        request = client.collection.wait_for(req_id)
+        log.info('Request status: %s.' % request.status)
+
+        :param req_id: id of the request
+        :type req_id: str
+        :param states: states waited for (defaults to the terminal states)
+        :type states: tuple
+        :param timeout: maximum seconds spent waiting
+        :type timeout: float
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :return: request object
+        :rtype: object
+        """
+        states = tuple(states or self._terminal_states)
+        href = '{0}/{1}'.format(self.collection._href, req_id)
+        last = dict() if output == 'text' else None
+
+        def get():
+            try:
+                data = self.collection._api.get(href)
+            except APIException as e:
+                log.abort('Unable to get {0} id: {1}: {2}'.format(
+                    self.collection.name, req_id, e))
+            self._transition(last, req_id, data)
+            return data
+
+        done, data = poll(
+            get, lambda data: data.get(self._state_attr) in states, timeout)
+        if not done:
+            log.abort('Timed out waiting for {0} id: {1} to be {2} after {3} '
+                      'seconds.'.format(self.collection.name, req_id,
+                                        ' or '.join(states), timeout))
+        return Entity(self.collection, data)
+
+    def wait_for_all(self, req_ids, states=None, timeout=POLL_TIMEOUT,
+                     chunk_size=QUERY_CHUNK_SIZE, output='text'):
+        """Wait for many requests (or tasks) to reach one of the given states.
+
+        Every outstanding request is polled by a single filter request per
+        tick (one per chunk_size requests), with exponential backoff and
+        jitter between ticks. Requests reaching one of the states are
+        removed from the outstanding requests and generated right away.
+        Only the state transitions are reported, for the text output only.
+
+        Usage
+
+        .. code-block: python
+
+        client.collection = 'provision_requests'
+        for request in client.collection.wait_for_all(req_ids):
+            log.info('Request %s: %s.' % (request.id, request.status))
+
+        :param req_ids: ids of the requests
+        :type req_ids: list
+        :param states: states waited for (defaults to the terminal states)
+        :type states: tuple
+        :param timeout: maximum seconds spent waiting
+        :type timeout: float
+        :param chunk_size: maximum number of requests per filter request
+        :type chunk_size: int
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :return: generator of request objects, in completion order
+        """
+        states = tuple(states or self._terminal_states)
+        pending = list()
+        for req_id in req_ids:
+            if str(req_id) not in pending:
+                pending.append(str(req_id))
+        last = dict() if output == 'text' else None
+
+        for _ in ticks(timeout):
+            found = dict((str(data['id']), data)
+                         for data in self._filter_ids(pending, chunk_size))
+
+            for req_id in list(pending):
+                data = found.get(req_id)
+                if data is None:
+                    log.warning('{0} id: {1} not found!'.format(
+                        self.collection.name, req_id))
+                    pending.remove(req_id)
+                    continue
+
+                self._transition(last, req_id, data)
+                if data.get(self._state_attr) in states:
+                    pending.remove(req_id)
+                    yield Entity(self.collection, data)
+
+            if not pending:
+                return
+
+        log.abort('Timed out waiting for {0} ids: {1} to be {2} after {3} '
+                  'seconds.'.format(self.collection.name, ', '.join(pending),
+                                    ' or '.join(states), timeout))
+
+    def _filter_ids(self, req_ids, chunk_size):
+        """Get the requests by chunked OR filter requests.
+
+        :param req_ids: ids of the requests
+        :type req_ids: list
+        :param chunk_size: maximum number of requests per filter request
+        :type chunk_size: int
+        :return: requests data
+        :rtype: list
+        """
+        resources = list()
+        for index in range(0, len(req_ids), chunk_size):
+            chunk = req_ids[index:index + chunk_size]
+            query = reduce(lambda q, req_id: q | Q('id', '=', req_id),
+                           chunk[1:], Q('id', '=', chunk[0]))
+            try:
+                data = self.collection._api.get(
+                    self.collection._href, **{'filter[]': query.as_filters,
+                                              'expand': 'resources'})
+            except APIException as e:
+                log.abort('Unable to get {0} ids: {1}: {2}'.format(
+                    self.collection.name, ', '.join(chunk), e))
+            resources.extend(data.get('resources', []))
+        return resources
+
+    def _transition(self, last, req_id, data):
+        """Report the state transition of a request.
+
+        :param last: request id to last reported state and status, None
+            to report nothing
+        :type last: dict
+        :param req_id: id of the request
+        :type req_id: str
+        :param data: request data
+        :type data: dict
+        """
+        if last is None:
+            # machine readable output, keep stdout for the records
+            return
+        state = (data.get(self._state_attr), data.get('status'))
+        if state != last.get(req_id):
+            # report state transitions only
+            last[req_id] = state
+            log.info(' * ID: %s\tSTATE: %s\tSTATUS: %s', req_id, *state)
+
+    def _bulk_targets(self, ids=None, ids_file=None, filters=None):
+        """Collect the resources targeted by a bulk action.
+
+        :param ids: ids (or hrefs) of the resources
+        :type ids: list
+        :param ids_file: file listing the ids (or hrefs), one per line,
+            blank lines and comments (#) are skipped
+        :type ids_file: file
+        :param filters: filters the resources match (e.g. ['name=vm*'])
+        :type filters: list
+        :return: resources (id and name, when known), without duplicates
+        :rtype: list
+        """
+        targets, seen = list(), set()
+
+        def add(_id, name=None):
+            if str(_id) not in seen:
+                seen.add(str(_id))
+                targets.append(dict(id=str(_id), name=name))
+
+        lines = list(ids or []) + list(ids_file or [])
+        for line in lines:
+            line = line.split('#')[0].strip()
+            if line:
+                add(line.rstrip('/').split('/')[-1])
+
+        if filters:
+            try:
+                for resource in paginate(self.collection,
+                                         attributes=('name',),
+                                         records=True, filters=filters):
+                    add(resource.id, getattr(resource, 'name', None))
+            except APIException as e:
+                log.abort('Unable to filter {0}: {1}: {2}'.format(
+                    self.collection.name, ', '.join(filters), e))
+        return targets
+
+    def _bulk_action(self, action, ids, chunk_size=QUERY_CHUNK_SIZE):
+        """Run an action on many resources by chunked bulk action requests.
+
+        A single request runs the action on chunk_size resources. Results
+        are generated as each request is answered. A failing request fails
+        the resources of its chunk only, the following chunks still run.
+
+        :param action: action name (e.g. delete)
+        :type action: str
+        :param ids: ids of the resources
+        :type ids: list
+        :param chunk_size: maximum number of resources per request
+        :type chunk_size: int
+        :return: generator of results (id, success, message and task id)
+        """
+        href = self.collection._href
+        for index in range(0, len(ids), chunk_size):
+            chunk = ids[index:index + chunk_size]
+            resources = [dict(href='{0}/{1}'.format(href, _id))
+                         for _id in chunk]
+            try:
+                results = self.collection._api.post(
+                    href, action=action, resources=resources).get(
+                    'results', [])
+            except APIException as e:
+                results = [dict(success=False, message=str(e))] * len(chunk)
+
+            for position, _id in enumerate(chunk):
+                result = dict(success=False, message='No result returned.')
+                if position < len(results):
+                    result = results[position]
+                yield dict(id=str(_id), success=bool(result.get('success')),
+                           message=result.get('message'),
+                           task_id=result.get('task_id'))
+
+    def _bulk(self, action, ids=None, ids_file=None, filters=None,
+              chunk_size=QUERY_CHUNK_SIZE, output='text', fields=''):
+        """Run an action on the resources given, listed in a file or filtered.
+
+        The results (resource id, name, success, message and task id) are
+        reported as they are received, written one record per resource for
+        the machine readable outputs.
+
+        :param action: action name (e.g. delete)
+        :type action: str
+        :param ids: ids of the resources
+        :type ids: list
+        :param ids_file: file listing the ids, one per line
+        :type ids_file: file
+        :param filters: filters the resources match
+        :type filters: list
+        :param chunk_size: maximum number of resources per request
+        :type chunk_size: int
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
+        :return: results
+        :rtype: list
+        """
+        if chunk_size < 1:
+            log.abort('Chunk size must be greater than 0.')
+        if not (ids or ids_file or filters):
+            log.abort('Set the {0} ids, --from-file or --filter.'.format(
+                self.collection.name))
+
+        targets = self._bulk_targets(ids, ids_file, filters)
+        if not targets:
+            log.abort('No {0} found for given parameters.'.format(
+                self.collection.name))
+        names = dict((target['id'], target['name']) for target in targets)
+        log.debug('Running {0} on {1} {2}.'.format(
+            action, len(targets), self.collection.name))
+
+        results = list()
+        writer = get_writer(output, fields)
+        verb = action.replace('_', ' ')
+        ids = [target['id'] for target in targets]
+        for result in self._bulk_action(action, ids, chunk_size):
+            result['name'] = names[result['id']]
+            results.append(result)
+            if writer is not None:
+                writer.write(Record(result))
+                continue
+
+            label = result['id']
+            if result['name']:
+                label = '{0} ({1})'.format(result['name'], result['id'])
+            if result['success']:
+                log.info('Task to {0} {1} created: {2}'.format(
+                    verb, label, result['task_id']))
+            else:
+                log.error('Unable to {0} {1}: {2}'.format(
+                    verb, label, result['message']))
+        if writer is not None:
+            writer.close()
+
+        failed = len([result for result in results if not result['success']])
+        if failed:
+            log.abort('{0} of {1} {2} failed to {3}.'.format(
+                failed, len(results), self.collection.name, verb))
+        return results
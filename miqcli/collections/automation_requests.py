@@ -20,16 +20,21 @@ from manageiq_client.api import APIException
 from pprint import pformat
 
 from miqcli.collections import CollectionsMixin
-from miqcli.constants import OSP_FIP_PAYLOAD, SUPPORTED_AUTOMATE_REQUESTS, AR
-from miqcli.decorators import client_api
+from miqcli.constants import SUPPORTED_AUTOMATE_REQUESTS, AR, POLL_TIMEOUT
+from miqcli.decorators import client_api, output_options, watch_options
+from miqcli.payloads import OSP_FLOATING_IP
 from miqcli.provider import Networks, Tenant
 from miqcli.query import BasicQuery
 from miqcli.utils import log, get_input_data
+from miqcli.utils.output import get_writer
 
 
 class Collections(CollectionsMixin):
     """Automation requests collections."""
 
+    # attribute holding the state of an automation request
+    _state_attr = 'request_state'
+
     @click.option('--method', type=click.Choice(SUPPORTED_AUTOMATE_REQUESTS),
                   required=True, help='automation request method.')
     @click.option('--payload', type=str,
@@ -67,33 +72,33 @@ class Collections(CollectionsMixin):
             _payload = input_data
         elif method == AR.GEN_FIP:
             # set the floating ip if set by the user
-            _payload = OSP_FIP_PAYLOAD
+            parameters = dict()
             if 'fip_pool' in input_data:
                 # lookup cloud network resource to get the id
                 # TODO: need to have user set the provider
                 networks = Networks('OpenStack', self.api, 'public')
-                _payload['parameters']['cloud_network_id'] = \
+                parameters['cloud_network_id'] = \
                     networks.get_id(input_data['fip_pool'])
 
                 # lookup cloud tenant
                 # TODO: need to have user set the provider
                 tenant = Tenant('OpenStack', self.api)
-                _payload['parameters']['cloud_tenant_id'] = \
+                parameters['cloud_tenant_id'] = \
                     tenant.get_id(input_data['tenant'])
+            _payload = OSP_FLOATING_IP.build(parameters=parameters)
 
         elif method == AR.RELEASE_FIP:
-            _payload = OSP_FIP_PAYLOAD
             # release the floating_ip
-            _payload["uri_parts"]["instance"] = "release_floating_ip"
             if 'floating_ip' in input_data:
-                _payload['parameters']['floating_ip'] = \
-                    input_data["floating_ip"]
+                parameters = dict(floating_ip=input_data["floating_ip"])
             elif 'floating_ip_id' in input_data:
-                _payload['parameters']['floating_ip_id'] = \
-                    input_data["floating_ip_id"]
+                parameters = dict(floating_ip_id=input_data["floating_ip_id"])
             else:
                 log.abort('To release a floating ip, set floating_ip or '
                           'floating_ip_id.')
+            _payload = OSP_FLOATING_IP.build(
+                uri_parts=dict(instance="release_floating_ip"),
+                parameters=parameters)
 
         try:
             self.req_id = self.action(_payload)
@@ -113,8 +118,11 @@ class Collections(CollectionsMixin):
         raise NotImplementedError
 
     @click.argument('req_id', metavar='ID', type=str, default='')
+    @output_options
+    @watch_options
     @client_api
-    def status(self, req_id):
+    def status(self, req_id, output='text', fields='', watch=False,
+               timeout=POLL_TIMEOUT):
         """Print the status for a automation request.
 
         ::
@@ -123,9 +131,22 @@ class Collections(CollectionsMixin):
 
         :param req_id: id of the automation request
         :type req_id: str
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
+        :param watch: wait for the automation request to finish
+        :type watch: bool
+        :param timeout: maximum seconds spent watching
+        :type timeout: int
         :return: automation request object or list of automation request
             objects
         """
+        if watch:
+            if not req_id:
+                log.abort('Set the automation request id to watch.')
+            self.wait_for(req_id, timeout=timeout, output=output)
+
         status = OrderedDict()
         query = BasicQuery(self.collection)
 
@@ -137,6 +158,12 @@ class Collections(CollectionsMixin):
                 return
 
             req = automation_requests[0]
+            writer = get_writer(output, fields)
+            if writer is not None:
+                writer.write(req)
+                writer.close()
+                return req
+
             status['state'] = req.request_state
             status['status'] = req.status
             status['message'] = req.message
@@ -158,6 +185,13 @@ class Collections(CollectionsMixin):
                 log.warning('No active automation requests at this time.')
                 return None
 
+            writer = get_writer(output, fields)
+            if writer is not None:
+                for item in automation_requests:
+                    writer.write(item)
+                writer.close()
+                return automation_requests
+
             log.info('-' * 50)
             log.info(' Active automation requests'.center(50))
             log.info('-' * 50)
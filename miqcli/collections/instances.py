@@ -17,16 +17,32 @@
 import click
 from manageiq_client.api import APIException
 from miqcli.collections import CollectionsMixin
-from miqcli.decorators import client_api
+from miqcli.decorators import bulk_options, client_api, output_options
+from miqcli.constants import QUERY_CHUNK_SIZE, QUERY_PAGE_SIZE, \
+    QUERY_PREFETCH
 from miqcli.query import AdvancedQuery
 from miqcli.query import BasicQuery
 from miqcli.query import inject
+from miqcli.query import paginate
 from miqcli.utils import log
+from miqcli.utils.output import get_writer, projection
 
 
 class Collections(CollectionsMixin):
     """Instances collections."""
 
+    @click.option('--prefetch', type=int, default=QUERY_PREFETCH,
+                  help='number of pages requested ahead when listing all '
+                  'instances')
+    @click.option('--offset', type=int, default=0,
+                  help='number of instances to skip when listing all '
+                  'instances')
+    @click.option('--limit', type=int, default=None,
+                  help='maximum number of instances listed when listing all '
+                  'instances')
+    @click.option('--page-size', type=int, default=QUERY_PAGE_SIZE,
+                  help='number of instances requested at a time when listing '
+                  'all instances')
     @click.option('--by_id', type=bool, default=False,
                   help='inst_name given as ID of instance, '
                        'all other options except --attr are ignored')
@@ -45,9 +61,12 @@ class Collections(CollectionsMixin):
     @click.option('--itype', type=str, default='',
                   help='type of an instance(s) - ex. "Openstack", "Amazon"...')
     @click.argument('inst_name', metavar='INST_NAME', type=str, default='')
+    @output_options
     @client_api
     def query(self, inst_name, provider=None, network=None, tenant=None,
-              subnet=None, vendor=None, itype=None, attr=None, by_id=False):
+              subnet=None, vendor=None, itype=None, attr=None, by_id=False,
+              page_size=QUERY_PAGE_SIZE, limit=None, offset=0,
+              prefetch=QUERY_PREFETCH, output='text', fields=''):
         """Query instances.
 
         ::
@@ -71,10 +90,30 @@ class Collections(CollectionsMixin):
         :type attr: tuple
         :param by_id: name is instance id
         :type by_id: bool
-        :return: instance object or list of instance objects
+        :param page_size: number of instances requested at a time (listing
+            all)
+        :type page_size: int
+        :param limit: maximum number of instances listed (listing all)
+        :type limit: int
+        :param offset: number of instances to skip (listing all)
+        :type offset: int
+        :param prefetch: number of pages requested ahead (listing all)
+        :type prefetch: int
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
+        :return: instance object or list of instance objects (when
+            listing all instances, instances are logged as they are received)
         """
 
         instances = None
+        streamed = False
+
+        # request the attributes written only, the resources returned to
+        # the caller are loaded in full unless attributes are selected
+        selected = projection(self.collection, attr, output, fields)
+        filtered = selected if attr or output != 'text' else None
 
         # Query by ID
         if by_id:
@@ -85,7 +124,7 @@ class Collections(CollectionsMixin):
 
                 qs_by_id = ("id", "=", inst_name)
                 query = BasicQuery(self.collection)
-                instances = query(qs_by_id, attr)
+                instances = query(qs_by_id, filtered)
 
                 if len(instances) < 1:
                     log.abort(
@@ -125,66 +164,73 @@ class Collections(CollectionsMixin):
                 if len(qs) == 1:
                     # Name only
                     query = BasicQuery(self.collection)
-                    instances = query(qs[0], attr)
+                    instances = query(qs[0], filtered)
                 else:
                     # Mix of various options and name
                     query = AdvancedQuery(self.collection)
-                    instances = query(qs, attr)
+                    instances = query(qs, filtered)
 
                 if len(instances) < 1:
                     log.abort('No instance(s) found for given parameters')
 
-            # general query on all instances
+            # general query on all instances, page by page
             else:
+                instances = paginate(self.collection, page_size, limit,
+                                     offset, selected, prefetch,
+                                     records=selected is not None)
+                streamed = True
+
+        count = 0
+        received = list()
+        debug = log.enabled(log.DEBUG)
+        writer = get_writer(output, fields)
+        for e in instances or []:
+            received.append(e)
+            if writer is not None:
+                # machine readable output
+                writer.write(e)
+                count += 1
+                continue
+
+            if count == 0:
+                log.info('-' * 50)
+                log.info('Instance Info'.center(50))
+                log.info('-' * 50)
+            count += 1
+
+            log.info(' * ID: %s' % e['id'])
+            log.info(' * NAME: %s' % e['name'])
+
+            if debug:
+                for k, v in e['_data'].items():
+                    if k == "id" or k == "name" or k in attr:
+                        continue
+                    try:
+                        log.debug(' * %s: %s', k.upper(), v)
+                    except AttributeError:
+                        log.debug(' * %s: ', k.upper())
+            if attr:
+                for a in attr:
+                    try:
+                        log.info(' * %s: %s' % (a.upper(), e[a]))
+                    except AttributeError:
+                        log.info(' * %s: ' % a.upper())
+            log.info('-' * 50)
 
-                # return instances that have the attribute passed set
-                if attr:
-                    # scrub attr of base attributes
-                    opt_lists = self.collection.options()
-                    att_list = list(attr)
-                    for att in att_list:
-                        if att in opt_lists['attributes']:
-                            att_list.remove(att)
-                    cln_atr = tuple(att_list)
-
-                    instances = self.collection.all_include_attributes(cln_atr)
-
-                # attribute not set, pass back all instances w/basic info
-                else:
-                    instances = self.collection.all
+        if writer is not None:
+            writer.close()
 
-        if instances:
-            log.info('-' * 50)
-            log.info('Instance Info'.center(50))
-            log.info('-' * 50)
+        if count == 0:
+            log.abort('No instance(s) found for given parameters')
 
-            debug = click.get_current_context().find_root().params['verbose']
-            for e in instances:
-                log.info(' * ID: %s' % e['id'])
-                log.info(' * NAME: %s' % e['name'])
-
-                if debug:
-                    for k, v in e['_data'].items():
-                        if k == "id" or k == "name" or k in attr:
-                            continue
-                        try:
-                            log.debug(' * %s: %s' % (k.upper(), v))
-                        except AttributeError:
-                            log.debug(' * %s: ' % k.upper())
-                if attr:
-                    for a in attr:
-                        try:
-                            log.info(' * %s: %s' % (a.upper(), e[a]))
-                        except AttributeError:
-                            log.info(' * %s: ' % a.upper())
-                log.info('-' * 50)
+        if streamed:
+            # logged page by page as received, returned all the same
+            instances = received
 
-            if len(instances) == 1:
-                return instances[0]
-            else:
-                return instances
+        if count == 1:
+            return instances[0]
         else:
-            log.abort('No instance(s) found for given parameters')
+            return instances
 
     @click.option('--by_id', type=bool, default=False,
                   help='inst_name given as ID of instance '
@@ -202,9 +248,12 @@ class Collections(CollectionsMixin):
     @click.option('--itype', type=str, default='',
                   help='type of an instance(s) - ex. "Openstack", "Amazon"...')
     @click.argument('inst_name', metavar='INST_NAME', type=str, default='')
+    @bulk_options
     @client_api
     def terminate(self, inst_name, provider=None, network=None, tenant=None,
-                  subnet=None, vendor=None, itype=None, by_id=False):
+                  subnet=None, vendor=None, itype=None, by_id=False,
+                  from_file=None, filters=None, chunk_size=QUERY_CHUNK_SIZE,
+                  output='text', fields=''):
         """Terminate instance.
 
         ::
@@ -225,9 +274,28 @@ class Collections(CollectionsMixin):
         :type itype: str
         :param by_id: name is instance id
         :type by_id: bool
+        :param from_file: file listing the ids of the instances to terminate
+        :type from_file: file
+        :param filters: filters of the instances to terminate
+        :type filters: tuple
+        :param chunk_size: maximum number of instances per request
+        :type chunk_size: int
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
         :return: id of the task created to terminate the instance
+            (the results of each instance when terminating many instances)
         :rtype: int
         """
+        if from_file or filters:
+            if inst_name:
+                log.abort('Set an instance or --from-file/--filter, not '
+                          'both.')
+            return self._bulk('terminate', ids_file=from_file,
+                              filters=filters, chunk_size=chunk_size,
+                              output=output, fields=fields)
+
         if inst_name:
             instance = self.query(inst_name, provider, network, tenant,
                                   subnet, vendor, itype, by_id=by_id)
@@ -17,13 +17,13 @@
 from pprint import pformat
 
 import click
-from collections import Mapping
+from miqcli._compat import Mapping
 from manageiq_client.api import APIException
 
 from miqcli.collections import CollectionsMixin
 from miqcli.constants import SUPPORTED_PROVIDERS
 from miqcli.decorators import client_api
-from miqcli.provider import Provider
+from miqcli.provider import Provider, provider_types
 from miqcli.query import BasicQuery
 from miqcli.utils import log
 
@@ -99,6 +99,20 @@ class Collections(CollectionsMixin):
             found = False
         return found
 
+    @staticmethod
+    def _invalidate(name, api):
+        """Forget the provider types and the ids resolved for the provider.
+
+        Called once the provider is created, refreshed or deleted, its
+        resources may then have new ids.
+
+        :param name: provider name
+        :param api: client api pointer
+        """
+        provider_types.invalidate(api)
+        if api.cache is not None:
+            api.cache.invalidate(api.url, '::%s::' % name.lower().title())
+
     @click.argument('name', type=click.Choice(SUPPORTED_PROVIDERS))
     @click.option('--hostname', type=str, help='provider hostname/IP address.')
     @click.option('--port', type=str, help='provider API port.')
@@ -164,6 +178,7 @@ class Collections(CollectionsMixin):
 
         try:
             self.req_id = getattr(self, 'action')(_payload)
+            self._invalidate(name, _api)
             log.info('Successfully submitted request to create provider: %s.'
                      % name)
             log.info('Create provider request ID: %s.' % self.req_id)
@@ -211,6 +226,7 @@ class Collections(CollectionsMixin):
 
         try:
             self.req_id = getattr(self, 'action')(_payload)
+            self._invalidate(name, _api)
             log.info('Successfully submitted request to refresh provider: %s.'
                      '\nRequest ID: %s.' % (name, self.req_id))
             return self.req_id
@@ -246,6 +262,7 @@ class Collections(CollectionsMixin):
 
         try:
             self.req_id = getattr(self, 'action')(_payload)
+            self._invalidate(name, _api)
             log.info('Successfully submitted request to delete provider: %s.\n'
                      'Request ID: %s.' % (name, self.req_id))
             return self.req_id
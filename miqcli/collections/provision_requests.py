@@ -14,25 +14,37 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import json
+import os
+import threading
+from multiprocessing.pool import ThreadPool
 from pprint import pformat
 
 import click
+from click.globals import pop_context, push_context
 from collections import OrderedDict
 
 from miqcli.collections import CollectionsMixin
 from miqcli.constants import SUPPORTED_PROVIDERS, REQUIRED_OSP_KEYS, \
-    OSP_PAYLOAD, REQUIRED_AWS_AUTO_PLACEMENT_KEYS, AWS_PAYLOAD, \
-    REQUIRED_AWS_PLACEMENT_KEYS
-from miqcli.decorators import client_api
+    REQUIRED_AWS_AUTO_PLACEMENT_KEYS, REQUIRED_AWS_PLACEMENT_KEYS, \
+    POLL_TIMEOUT, PROVISION_CONCURRENCY, PROVISION_RATE, RESOLVER_POOL_SIZE
+from miqcli.decorators import client_api, output_options, watch_options
 from miqcli.provider import Flavors, KeyPair, Networks, SecurityGroups,\
     Templates, Tenant
+from miqcli.payloads import AWS_PROVISION, OSP_PROVISION
 from miqcli.query import BasicQuery
+from miqcli.resolver import Resolver, SharedLookup
 from miqcli.utils import log, get_input_data
+from miqcli.utils.output import get_writer
+from miqcli.utils.throttle import Throttle
 
 
 class Collections(CollectionsMixin):
     """Provision requests collections."""
 
+    # attribute holding the state of a provision request
+    _state_attr = 'request_state'
+
     @client_api
     def approve(self):
         """Approve."""
@@ -63,161 +75,343 @@ class Collections(CollectionsMixin):
         :return: provision request ID
         :rtype: str
         """
-        # RFE: make generic as possible, remove conditional per provider
-        if provider == "OpenStack":
-            log.info("Attempt to create a provision request")
+        log.info("Attempt to create a provision request")
 
-            # get the data from user input
-            input_data = get_input_data(payload, payload_file)
+        # get the data from user input
+        input_data = get_input_data(payload, payload_file)
 
-            # verify all the required keys are set
-            missing_data = []
-            for key in REQUIRED_OSP_KEYS:
-                if key not in input_data or input_data[key] is None:
-                    missing_data.append(key)
-            if missing_data:
-                log.abort("Required key(s) missing: {0}, please set it in "
-                          "the payload".format(missing_data))
+        # verify all the required keys are set
+        error = self._validate(provider, input_data)
+        if error:
+            log.abort(error)
 
-            # Verified data is valid, update payload w/id lookups
-            # set the email_address and vm name
-            OSP_PAYLOAD["requester"]["owner_email"] = input_data["email"]
-            OSP_PAYLOAD["vm_fields"]["vm_name"] = input_data["vm_name"]
+        # Verified data is valid, build the payload w/id lookups
+        payload = self._payload(provider, input_data, self._lookups(provider))
 
-            # lookup cloud tenant resource to get the id
-            tenant = Tenant(provider, self.api)
-            OSP_PAYLOAD['vm_fields']['cloud_tenant'] = tenant.get_id(
-                input_data['tenant']
-            )
-            tenant_id = OSP_PAYLOAD['vm_fields']['cloud_tenant']
+        log.debug("Payload for the provisioning request: {0}".format(
+            pformat(payload)))
+        self.req_id = self.action(payload)
+        log.info("Provisioning request created: {0}".format(self.req_id))
+        return self.req_id
+
+    @click.option('--provider', type=click.Choice(SUPPORTED_PROVIDERS),
+                  required=True, help='provider to fulfill the provision '
+                                      'requests into.')
+    @click.option('--manifest', type=str, required=True,
+                  help='filename containing one JSON formatted payload data '
+                       'per line (JSON Lines), one provision request each.')
+    @click.option('--concurrency', type=int, default=PROVISION_CONCURRENCY,
+                  help='number of provision requests submitted '
+                       'concurrently.')
+    @click.option('--rate', type=float, default=PROVISION_RATE,
+                  help='maximum provision requests submitted per second '
+                       '(0 for no limit).')
+    @click.option('--results', type=str,
+                  help='filename the JSON Lines results (vm name to request '
+                       'id) are written to, defaults to the standard '
+                       'output (the messages are then written to the '
+                       'standard error).')
+    @client_api
+    def create_bulk(self, provider, manifest,
+                    concurrency=PROVISION_CONCURRENCY, rate=PROVISION_RATE,
+                    results=None):
+        """Create provision requests from a manifest.
+
+        ::
+        Every payload data of the manifest is verified before any request
+        is submitted. The resource ids shared by the provision requests are
+        looked up once, on a single resolver pool, the provision requests
+        are then submitted concurrently (at most rate per second). Without
+        a results file the standard output carries the results only.
+
+        :param provider: cloud provider to fulfill provision requests into
+        :type provider: str
+        :param manifest: file location of the JSON Lines payloads
+        :type manifest: str
+        :param concurrency: number of requests submitted concurrently
+        :type concurrency: int
+        :param rate: maximum requests submitted per second
+        :type rate: float
+        :param results: file location of the JSON Lines results
+        :type results: str
+        :return: results, vm name with request id (or error)
+        :rtype: list
+        """
+        if concurrency < 1:
+            log.abort('Concurrency must be greater than 0.')
+        if results is None:
+            # the results are written to stdout
+            log.set_machine_output()
+
+        entries = self._read_manifest(provider, manifest)
+        log.info("Attempt to create {0} provision requests".format(
+            len(entries)))
+
+        ctx = click.get_current_context()
+        lookups = self._lookups(provider, shared=True)
+        action = self.collection.action.create
+        throttle = Throttle(rate)
+        resolver_pool = ThreadPool(RESOLVER_POOL_SIZE)
+
+        def submit(input_data):
+            return self._submit(ctx, action, throttle, provider, lookups,
+                                input_data, resolver_pool)
+
+        output = list()
+        fp = open(results, 'w') if results else None
+        pool = ThreadPool(min(concurrency, len(entries)))
+        try:
+            for result in pool.imap_unordered(submit, entries):
+                output.append(result)
+                line = json.dumps(result, sort_keys=True)
+                if fp is None:
+                    log.raw(line)
+                    continue
+
+                fp.write(line + '\n')
+                fp.flush()
+                if 'error' in result:
+                    log.error('{0}: {1}'.format(result['vm_name'],
+                                                result['error']))
+                else:
+                    log.info('Provisioning request created for {0}: {1}'
+                             .format(result['vm_name'],
+                                     result['request_id']))
+        finally:
+            pool.terminate()
+            resolver_pool.terminate()
+            if fp is not None:
+                fp.close()
+
+        failed = len([result for result in output if 'error' in result])
+        if failed:
+            log.abort('{0} of {1} provision requests failed.'.format(
+                failed, len(output)))
+        return output
+
+    @staticmethod
+    def _validate(provider, input_data):
+        """Verify the payload data has every required key.
+
+        :param provider: cloud provider
+        :type provider: str
+        :param input_data: payload data
+        :type input_data: dict
+        :return: error message, none when the payload data is valid
+        :rtype: str
+        """
+        if provider == "OpenStack":
+            required_keys = REQUIRED_OSP_KEYS
+        elif 'auto_placement' in input_data and input_data['auto_placement']:
+            required_keys = REQUIRED_AWS_AUTO_PLACEMENT_KEYS
+        else:
+            required_keys = REQUIRED_AWS_PLACEMENT_KEYS
+
+        missing_data = []
+        for key in required_keys:
+            if key not in input_data or input_data[key] is None:
+                missing_data.append(key)
+        if missing_data:
+            return "Required key(s) missing: {0}, please set it in the " \
+                   "payload".format(missing_data)
+
+        subnet = input_data.get('subnet')
+        if provider == "Amazon" and subnet and not input_data.get('network'):
+            return 'Cloud Subnet: {0} requires the network to be set in ' \
+                   'the payload.'.format(subnet)
+        return None
+
+    def _lookups(self, provider, shared=False):
+        """Return the id lookups of the provider resources.
+
+        :param provider: cloud provider
+        :type provider: str
+        :param shared: share the lookups between many provision requests,
+            each distinct lookup runs once
+        :type shared: bool
+        :return: resource name to lookup function
+        :rtype: dict
+        """
+        if provider == "OpenStack":
+            network = Networks(provider, self.api, 'private')
+        else:
+            network = Networks(provider, self.api)
+
+        lookups = dict(
+            tenant=Tenant(provider, self.api).get_id,
+            flavor=Flavors(provider, self.api).get_id,
+            image=Templates(provider, self.api).get_id,
+            security_group=SecurityGroups(provider, self.api).get_id,
+            key_pair=KeyPair(provider, self.api).get_id
+        )
+        if not shared:
+            lookups.update(network=network.get_id,
+                           subnet=network.get_subnet_id)
+            return lookups
+
+        lookups = dict((name, SharedLookup(func))
+                       for name, func in lookups.items())
+        # the subnet lookup reads the networks loaded by the network lookup
+        lock = threading.Lock()
+        lookups['network'] = SharedLookup(network.get_id, lock)
+        lookups['subnet'] = SharedLookup(network.get_subnet_id, lock)
+        return lookups
+
+    @staticmethod
+    def _payload(provider, input_data, lookups, pool=None):
+        """Build the payload of a provision request.
+
+        The resource ids are looked up, lookups not depending on each other
+        run concurrently.
+
+        :param provider: cloud provider
+        :type provider: str
+        :param input_data: payload data
+        :type input_data: dict
+        :param lookups: resource name to lookup function (see _lookups)
+        :type lookups: dict
+        :param pool: thread pool the lookups run on (see Resolver)
+        :type pool: object
+        :return: provision request payload
+        :rtype: dict
+        """
+        resolver = Resolver(pool=pool)
+        vm_fields = dict()
+
+        # RFE: make generic as possible, remove conditional per provider
+        if provider == "OpenStack":
+            template = OSP_PROVISION
 
             if 'floating_ip_id' in input_data:
-                OSP_PAYLOAD['vm_fields']['floating_ip_address'] = \
-                    input_data['floating_ip_id']
+                vm_fields['floating_ip_address'] = input_data['floating_ip_id']
+
+            # lookup cloud tenant resource to get the id
+            resolver.add('cloud_tenant', lookups['tenant'],
+                         (input_data['tenant'],))
 
             # lookup flavor resource to get the id
-            flavors = Flavors(provider, self.api)
-            OSP_PAYLOAD['vm_fields']['instance_type'] = flavors.get_id(
-                input_data['flavor'])
+            resolver.add('instance_type', lookups['flavor'],
+                         (input_data['flavor'],))
 
             # lookup image resource to get the id
-            templates = Templates(provider, self.api)
-            OSP_PAYLOAD['template_fields']['guid'] = templates.get_id(
-                input_data['image']
-            )
+            resolver.add('guid', lookups['image'], (input_data['image'],))
 
             if 'security_group' in input_data and input_data['security_group']:
                 # lookup security group resource to get the id
-                sec_group = SecurityGroups(provider, self.api)
-                OSP_PAYLOAD['vm_fields']['security_groups'] = sec_group.get_id(
-                    input_data['security_group'], tenant_id
-                )
+                resolver.add('security_groups', lookups['security_group'],
+                             (input_data['security_group'],),
+                             requires=('cloud_tenant',))
 
             if 'key_pair' in input_data and input_data["key_pair"]:
                 # lookup key pair resource to get the id
-                key_pair = KeyPair(provider, self.api)
-                OSP_PAYLOAD['vm_fields']['guest_access_key_pair'] = \
-                    key_pair.get_id(input_data['key_pair'])
+                resolver.add('guest_access_key_pair', lookups['key_pair'],
+                             (input_data['key_pair'],))
 
             # lookup cloud network resource to get the id
-            network = Networks(provider, self.api, 'private')
-            OSP_PAYLOAD['vm_fields']['cloud_network'] = network.get_id(
-                input_data['network'], tenant_id
-            )
-
-            log.debug("Payload for the provisioning request: {0}".format(
-                pformat(OSP_PAYLOAD)))
-            self.req_id = self.action(OSP_PAYLOAD)
-            log.info("Provisioning request created: {0}".format(self.req_id))
-            return self.req_id
-
-        # RFE: make generic as possible, remove conditional per provider
-        if provider == "Amazon":
-            log.info("Attempt to create a provision request")
-
-            # get the data from user input
-            input_data = get_input_data(payload, payload_file)
-
-            # Set Required fields
-            if 'auto_placement' in input_data and input_data['auto_placement']:
-                REQUIRED_AWS_KEYS = REQUIRED_AWS_AUTO_PLACEMENT_KEYS
-            else:
-                REQUIRED_AWS_KEYS = REQUIRED_AWS_PLACEMENT_KEYS
-            # verify all the required keys are set
-            missing_data = []
-            for key in REQUIRED_AWS_KEYS:
-                if key not in input_data or input_data[key] is None:
-                    missing_data.append(key)
-            if missing_data:
-                log.abort("Required key(s) missing: {0}, please set it in "
-                          "the payload".format(missing_data))
-
-            # Verified data is valid, update payload w/id lookups
-            # set the email_address and vm name
-            AWS_PAYLOAD["requester"]["owner_email"] = input_data["email"]
-            AWS_PAYLOAD["vm_fields"]["vm_name"] = input_data["vm_name"]
+            resolver.add('cloud_network', lookups['network'],
+                         (input_data['network'],), requires=('cloud_tenant',))
+        else:
+            template = AWS_PROVISION
 
             # lookup flavor resource to get the id
-            flavors = Flavors(provider, self.api)
-            AWS_PAYLOAD['vm_fields']['instance_type'] = flavors.get_id(
-                input_data['flavor'])
+            resolver.add('instance_type', lookups['flavor'],
+                         (input_data['flavor'],))
 
             # lookup image resource to get the id
-            templates = Templates(provider, self.api)
-            AWS_PAYLOAD['template_fields']['guid'] = templates.get_id(
-                input_data['image']
-            )
+            resolver.add('guid', lookups['image'], (input_data['image'],))
 
             # lookup security group resource to get the id
             if 'security_group' in input_data and input_data['security_group']:
-                sec_group = SecurityGroups(provider, self.api)
-                AWS_PAYLOAD['vm_fields']['security_groups'] = \
-                    sec_group.get_id(input_data['security_group'])
+                resolver.add('security_groups', lookups['security_group'],
+                             (input_data['security_group'], None))
 
             # lookup key pair resource to get the id
-            key_pair = KeyPair(provider, self.api)
-            AWS_PAYLOAD['vm_fields']['guest_access_key_pair'] = \
-                key_pair.get_id(input_data['key_pair'])
+            resolver.add('guest_access_key_pair', lookups['key_pair'],
+                         (input_data['key_pair'],))
 
-            # lookup cloud network resource to get the id
+            # lookup cloud network resource to get the id, the cloud subnets
+            # are loaded along with the network when the subnet is set
+            subnet = input_data.get('subnet')
             if 'network' in input_data and input_data['network']:
-                network = Networks(provider, self.api)
-                AWS_PAYLOAD['vm_fields']['cloud_network'] = network.get_id(
-                    input_data['network']
-                )
-
-            # lookup cloud_subnets attribute from cloud network entity
-            # to get the id
-            if 'subnet' in input_data and input_data['subnet']:
-                out = network.get_attribute(
-                    AWS_PAYLOAD['vm_fields']['cloud_network'],
-                    'cloud_subnets')
-
-                # Get id for supplied Subnet
-                subnet_id = None
-                if isinstance(out, list):
-                    for att in out:
-                        if 'name' in att and att['name'] == \
-                                input_data['subnet']:
-                            subnet_id = att['id']
-                elif isinstance(out, dict):
-                    if out and 'name' in out and out['name'] == \
-                            input_data['subnet']:
-                        subnet_id = out['id']
-
-                if subnet_id is None:
-                    log.abort('Cannot obtain Cloud Subnet: {0} info, please '
-                              'check setting in the payload '
-                              'is correct'.format(input_data['subnet']))
-
-                log.info('Attribute: {0}'.format(out))
-                AWS_PAYLOAD['vm_fields']['cloud_subnet'] = subnet_id
-
-            log.debug("Payload for the provisioning request: {0}".format(
-                pformat(AWS_PAYLOAD)))
-            self.req_id = self.action(AWS_PAYLOAD)
-            log.info("Provisioning request created: {0}".format(self.req_id))
-            return self.req_id
+                resolver.add('cloud_network', lookups['network'],
+                             (input_data['network'], None,
+                              ['cloud_subnets'] if subnet else None))
+
+                # lookup cloud_subnets attribute from cloud network entity
+                # to get the id
+                if subnet:
+                    resolver.add('cloud_subnet', lookups['subnet'],
+                                 (subnet,), requires=('cloud_network',))
+
+        ids = resolver()
+        if 'cloud_subnet' in ids and ids['cloud_subnet'] is None:
+            log.abort('Cannot obtain Cloud Subnet: {0} info, please '
+                      'check setting in the payload '
+                      'is correct'.format(input_data['subnet']))
+        vm_fields.update(ids)
+
+        # set the email_address and vm name
+        return template.build(
+            template_fields=dict(guid=vm_fields.pop('guid')),
+            requester=dict(owner_email=input_data['email']),
+            vm_fields=dict(vm_fields, vm_name=input_data['vm_name']))
+
+    def _read_manifest(self, provider, manifest):
+        """Read and verify the payload data of a manifest.
+
+        :param provider: cloud provider
+        :type provider: str
+        :param manifest: file location of the JSON Lines payloads
+        :type manifest: str
+        :return: payload data
+        :rtype: list
+        """
+        if not os.path.isfile(manifest):
+            log.abort("File: {0} not found.".format(manifest))
+
+        entries = list()
+        with open(manifest) as fp:
+            for number, line in enumerate(fp, 1):
+                if not line.strip():
+                    continue
+                try:
+                    input_data = json.loads(line)
+                except ValueError as e:
+                    log.abort('Manifest line {0}: {1}'.format(number, e))
+
+                error = self._validate(provider, input_data)
+                if error:
+                    log.abort('Manifest line {0}: {1}'.format(number, error))
+                entries.append(input_data)
+
+        if not entries:
+            log.abort('Manifest: {0} has no payload data.'.format(manifest))
+        return entries
+
+    def _submit(self, ctx, action, throttle, provider, lookups, input_data,
+                pool):
+        """Build and submit a provision request within a worker thread.
+
+        The click context is pushed for the worker thread. Failures are
+        returned as the result of the provision request.
+
+        :return: result, vm name with request id (or error)
+        :rtype: dict
+        """
+        push_context(ctx)
+        try:
+            payload = self._payload(provider, input_data, lookups, pool)
+            throttle.wait()
+            request = next(iter(action(payload)))
+            return dict(vm_name=input_data['vm_name'],
+                        request_id=getattr(request, 'id'))
+        except SystemExit:
+            # the error is logged when aborting
+            return dict(vm_name=input_data['vm_name'], error='aborted')
+        except Exception as e:
+            return dict(vm_name=input_data['vm_name'], error=format(e))
+        finally:
+            pop_context()
 
     @client_api
     def deny(self):
@@ -230,8 +424,11 @@ class Collections(CollectionsMixin):
         raise NotImplementedError
 
     @click.argument('req_id', metavar='ID', type=str, default='')
+    @output_options
+    @watch_options
     @client_api
-    def status(self, req_id):
+    def status(self, req_id, output='text', fields='', watch=False,
+               timeout=POLL_TIMEOUT):
         """Print the status for a provision request.
 
         ::
@@ -240,8 +437,21 @@ class Collections(CollectionsMixin):
 
         :param req_id: id of the provisioning request
         :type req_id: str
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
+        :param watch: wait for the provision request to finish
+        :type watch: bool
+        :param timeout: maximum seconds spent watching
+        :type timeout: int
         :return: provision request object or list of provision request objects
         """
+        if watch:
+            if not req_id:
+                log.abort('Set the provision request id to watch.')
+            self.wait_for(req_id, timeout=timeout, output=output)
+
         status = OrderedDict()
         query = BasicQuery(self.collection)
 
@@ -253,6 +463,12 @@ class Collections(CollectionsMixin):
                 return None
 
             req = provision_requests[0]
+            writer = get_writer(output, fields)
+            if writer is not None:
+                writer.write(req)
+                writer.close()
+                return req
+
             status['state'] = req.request_state
             status['status'] = req.status
             status['message'] = req.message
@@ -273,6 +489,13 @@ class Collections(CollectionsMixin):
                 log.warning(' * No active provision requests at this time')
                 return None
 
+            writer = get_writer(output, fields)
+            if writer is not None:
+                for item in provision_requests:
+                    writer.write(item)
+                writer.close()
+                return provision_requests
+
             log.info('-' * 50)
             log.info(' Active provision requests'.center(50))
             log.info('-' * 50)
@@ -284,3 +507,44 @@ class Collections(CollectionsMixin):
             log.info('-' * 50)
 
             return provision_requests
+
+    @click.argument('req_ids', metavar='ID...', type=str, nargs=-1,
+                    required=True)
+    @click.option('--timeout', type=int, default=POLL_TIMEOUT,
+                  help='maximum seconds spent waiting')
+    @output_options
+    @client_api
+    def wait(self, req_ids, timeout=POLL_TIMEOUT, output='text', fields=''):
+        """Wait for provision requests to finish.
+
+        ::
+        Polls every outstanding provision request with a single filter
+        request per tick and reports each provision request as soon as it
+        is finished.
+
+        :param req_ids: ids of the provisioning requests
+        :type req_ids: tuple
+        :param timeout: maximum seconds spent waiting
+        :type timeout: int
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
+        :return: provision request objects, in completion order
+        :rtype: list
+        """
+        finished = list()
+        writer = get_writer(output, fields)
+        for req in self.wait_for_all(req_ids, timeout=timeout,
+                                     output=output):
+            finished.append(req)
+            if writer is not None:
+                writer.write(req)
+                continue
+
+            log.info(' * ID: %s\tFINISHED\tSTATUS: %s\tMESSAGE: %s',
+                     req.id, req.status, req._data.get('message'))
+
+        if writer is not None:
+            writer.close()
+        return finished
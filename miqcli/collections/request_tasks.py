@@ -20,7 +20,8 @@ import click
 from collections import OrderedDict
 
 from miqcli.collections import CollectionsMixin
-from miqcli.decorators import client_api
+from miqcli.constants import POLL_TIMEOUT
+from miqcli.decorators import client_api, watch_options
 from miqcli.query import BasicQuery
 from miqcli.utils import log
 
@@ -29,8 +30,9 @@ class Collections(CollectionsMixin):
     """Request tasks collections."""
 
     @click.argument('req_id', metavar='ID', type=str, default='')
+    @watch_options
     @client_api
-    def status(self, req_id):
+    def status(self, req_id, watch=False, timeout=POLL_TIMEOUT):
         """Get the status for a request task.
 
         ::
@@ -39,8 +41,17 @@ class Collections(CollectionsMixin):
 
         :param req_id: id of the request
         :type req_id: str
+        :param watch: wait for the request task to finish
+        :type watch: bool
+        :param timeout: maximum seconds spent watching
+        :type timeout: int
         :return: request task object or list of request objects
         """
+        if watch:
+            if not req_id:
+                log.abort('Set the request task id to watch.')
+            self.wait_for(req_id, timeout=timeout)
+
         status = OrderedDict()
         query = BasicQuery(self.collection)
 
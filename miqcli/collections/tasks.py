@@ -18,22 +18,30 @@ import click
 from collections import OrderedDict
 
 from miqcli.collections import CollectionsMixin
-from miqcli.decorators import client_api
+from miqcli.constants import POLL_TIMEOUT
+from miqcli.decorators import client_api, output_options, watch_options
 from miqcli.query import BasicQuery
 from miqcli.utils import log
+from miqcli.utils.output import get_writer
 
 
 class Collections(CollectionsMixin):
     """Tasks collections."""
 
+    # states a task ends in
+    _terminal_states = ('Finished',)
+
     @client_api
     def query(self):
         """Query."""
         raise NotImplementedError
 
     @click.argument('task_id', metavar='ID', type=str, default='')
+    @output_options
+    @watch_options
     @client_api
-    def status(self, task_id):
+    def status(self, task_id, output='text', fields='', watch=False,
+               timeout=POLL_TIMEOUT):
         """Print the status for a provision request.
 
         ::
@@ -42,8 +50,21 @@ class Collections(CollectionsMixin):
 
         :param req_id: id of the provisioning request
         :type req_id: str
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
+        :param watch: wait for the task to finish
+        :type watch: bool
+        :param timeout: maximum seconds spent watching
+        :type timeout: int
         :return: provision request object or list of provision request objects
         """
+        if watch:
+            if not task_id:
+                log.abort('Set the task id to watch.')
+            self.wait_for(task_id, timeout=timeout, output=output)
+
         status = OrderedDict()
         query = BasicQuery(self.collection)
         if task_id:
@@ -55,6 +76,12 @@ class Collections(CollectionsMixin):
                 return None
 
             task = tasklist[0]
+            writer = get_writer(output, fields)
+            if writer is not None:
+                writer.write(task)
+                writer.close()
+                return task
+
             status['state'] = task.state
             status['status'] = task.status
             status['message'] = task.message
@@ -75,6 +102,13 @@ class Collections(CollectionsMixin):
                 log.warning(' * No active tasks at this time')
                 return None
 
+            writer = get_writer(output, fields)
+            if writer is not None:
+                for item in task_list:
+                    writer.write(item)
+                writer.close()
+                return task_list
+
             log.info('-' * 50)
             log.info(' Active tasks'.center(50))
             log.info('-' * 50)
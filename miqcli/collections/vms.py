@@ -17,16 +17,60 @@
 import click
 from manageiq_client.api import APIException
 from miqcli.collections import CollectionsMixin
-from miqcli.decorators import client_api
+from miqcli.decorators import bulk_options, client_api, output_options
+from miqcli.constants import QUERY_CHUNK_SIZE, QUERY_PAGE_SIZE, \
+    QUERY_PREFETCH
 from miqcli.query import AdvancedQuery
 from miqcli.query import BasicQuery
 from miqcli.query import inject
+from miqcli.query import paginate
 from miqcli.utils import log
+from miqcli.utils.output import get_writer, projection
+
+
+def _power_action(action, summary):
+    """Build the vms command running a power action (start, stop, ...).
+
+    The command runs the action on the vms given by their ids (VM_ID...),
+    listed in a file (--from-file) or filtered (--filter), chunk_size vms
+    per collection action request. It returns the results of each vm (id,
+    name, success, message and task id).
+
+    :param action: vm action name
+    :type action: str
+    :param summary: command help text
+    :type summary: str
+    :return: collection method
+    """
+    def method(self, vm_ids, from_file=None, filters=None,
+               chunk_size=QUERY_CHUNK_SIZE, output='text', fields=''):
+        return self._bulk(action, ids=vm_ids, ids_file=from_file,
+                          filters=filters, chunk_size=chunk_size,
+                          output=output, fields=fields)
+
+    method.__name__ = action
+    method.__doc__ = summary
+    method = client_api(method)
+    method = bulk_options(method)
+    return click.argument('vm_ids', metavar='VM_ID...', type=str,
+                          nargs=-1)(method)
 
 
 class Collections(CollectionsMixin):
     """Virtual machines collections."""
 
+    @click.option('--prefetch', type=int, default=QUERY_PREFETCH,
+                  help='number of pages requested ahead when listing all '
+                  'vms')
+    @click.option('--offset', type=int, default=0,
+                  help='number of vms to skip when listing all '
+                  'vms')
+    @click.option('--limit', type=int, default=None,
+                  help='maximum number of vms listed when listing all '
+                  'vms')
+    @click.option('--page-size', type=int, default=QUERY_PAGE_SIZE,
+                  help='number of vms requested at a time when listing '
+                  'all vms')
     @click.option('--by_id', type=bool, default=False,
                   help='name given as ID of vm, all other options except '
                   '--attr are ignored')
@@ -39,9 +83,12 @@ class Collections(CollectionsMixin):
     @click.option('--vtype', type=str, default='',
                   help='type of an vm(s) - ex. "Openstack", "Amazon"...')
     @click.argument('vm_name', metavar="VM_NAME", type=str, default='')
+    @output_options
     @client_api
     def query(self, vm_name, provider=None, vendor=None,
-              vtype=None, attr=None, by_id=False):
+              vtype=None, attr=None, by_id=False, page_size=QUERY_PAGE_SIZE,
+              limit=None, offset=0, prefetch=QUERY_PREFETCH, output='text',
+              fields=''):
         """Query vms.
 
         ::
@@ -59,9 +106,28 @@ class Collections(CollectionsMixin):
         :type attr: tuple
         :param by_id: name is vm id
         :type by_id: bool
-        :return: vm object or list of vm objects
+        :param page_size: number of vms requested at a time (listing all)
+        :type page_size: int
+        :param limit: maximum number of vms listed (listing all)
+        :type limit: int
+        :param offset: number of vms to skip (listing all)
+        :type offset: int
+        :param prefetch: number of pages requested ahead (listing all)
+        :type prefetch: int
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
+        :return: vm object or list of vm objects (when listing all vms,
+            vms are logged as they are received)
         """
         vms = None
+        streamed = False
+
+        # request the attributes written only, the resources returned to
+        # the caller are loaded in full unless attributes are selected
+        selected = projection(self.collection, attr, output, fields)
+        filtered = selected if attr or output != 'text' else None
 
         # Query by ID
         if by_id:
@@ -72,7 +138,7 @@ class Collections(CollectionsMixin):
 
                 qs_by_id = ("id", "=", vm_name)
                 query = BasicQuery(self.collection)
-                vms = query(qs_by_id, attr)
+                vms = query(qs_by_id, filtered)
 
                 if len(vms) < 1:
                     log.abort(
@@ -106,67 +172,74 @@ class Collections(CollectionsMixin):
                 if len(qs) == 1:
                     # Name only
                     query = BasicQuery(self.collection)
-                    vms = query(qs[0], attr)
+                    vms = query(qs[0], filtered)
                 else:
                     # Mix of various options and name
                     query = AdvancedQuery(self.collection)
-                    vms = query(qs, attr)
+                    vms = query(qs, filtered)
 
                 if len(vms) < 1:
                     log.abort('No Vm(s) found for given parameters')
 
-            # general query on all vms
+            # general query on all vms, page by page
             else:
+                vms = paginate(self.collection, page_size, limit, offset,
+                               selected, prefetch,
+                               records=selected is not None)
+                streamed = True
+
+        count = 0
+        received = list()
+        debug = log.enabled(log.DEBUG)
+        writer = get_writer(output, fields)
+        for e in vms or []:
+            received.append(e)
+            if writer is not None:
+                # machine readable output
+                writer.write(e)
+                count += 1
+                continue
+
+            if count == 0:
+                log.info('-' * 50)
+                log.info('Vm Info'.center(50))
+                log.info('-' * 50)
+            count += 1
+
+            log.info(' * ID: %s' % e['id'])
+            log.info(' * NAME: %s' % e['name'])
+
+            if debug:
+                for k, v in e['_data'].items():
+                    if k == "id" or k == "name" or k in attr:
+                        continue
+                    try:
+                        log.debug(' * %s: %s', k.upper(), v)
+                    except AttributeError:
+                        log.debug(' * %s: ', k.upper())
+
+            if attr:
+                for a in attr:
+                    try:
+                        log.info(' * %s: %s' % (a.upper(), e[a]))
+                    except AttributeError:
+                        log.info(' * %s: ' % a.upper())
+            log.info('-' * 50)
 
-                # return vms that have the attribute passed set
-                if attr:
-                    # scrub attr of base attributes
-                    opt_lists = self.collection.options()
-                    att_list = list(attr)
-                    for att in att_list:
-                        if att in opt_lists['attributes']:
-                            att_list.remove(att)
-                    clean_attr = tuple(att_list)
-
-                    vms = self.collection.all_include_attributes(clean_attr)
-
-                # attribute not set, pass back all vms w/basic info
-                else:
-                    vms = self.collection.all
+        if writer is not None:
+            writer.close()
 
-        if vms:
-            log.info('-' * 50)
-            log.info('Vm Info'.center(50))
-            log.info('-' * 50)
+        if count == 0:
+            log.abort('No vm(s) found for given parameters')
 
-            debug = click.get_current_context().find_root().params['verbose']
-            for e in vms:
-                log.info(' * ID: %s' % e['id'])
-                log.info(' * NAME: %s' % e['name'])
-
-                if debug:
-                    for k, v in e['_data'].items():
-                        if k == "id" or k == "name" or k in attr:
-                            continue
-                        try:
-                            log.debug(' * %s: %s' % (k.upper(), v))
-                        except AttributeError:
-                            log.debug(' * %s: ' % k.upper())
-
-                if attr:
-                    for a in attr:
-                        try:
-                            log.info(' * %s: %s' % (a.upper(), e[a]))
-                        except AttributeError:
-                            log.info(' * %s: ' % a.upper())
-                log.info('-' * 50)
+        if streamed:
+            # logged page by page as received, returned all the same
+            vms = received
 
-            if len(vms) == 1:
-                return vms[0]
-            else:
-                return vms
+        if count == 1:
+            return vms[0]
         else:
-            log.abort('No vm(s) found for given parameters')
+            return vms
 
     @client_api
     def edit(self):
@@ -188,56 +261,24 @@ class Collections(CollectionsMixin):
         """Refresh."""
         raise NotImplementedError
 
-    @client_api
-    def shutdown_guest(self):
-        """Shutdown guest."""
-        raise NotImplementedError
-
-    @client_api
-    def reboot_guest(self):
-        """Reboot guest."""
-        raise NotImplementedError
-
-    @client_api
-    def start(self):
-        """Start."""
-        raise NotImplementedError
-
-    @client_api
-    def stop(self):
-        """Stop."""
-        raise NotImplementedError
-
-    @client_api
-    def suspend(self):
-        """Suspend."""
-        raise NotImplementedError
-
-    @client_api
-    def shelve(self):
-        """Shelve."""
-        raise NotImplementedError
-
-    @client_api
-    def shelve_offload(self):
-        """Shelve offload."""
-        raise NotImplementedError
-
-    @client_api
-    def pause(self):
-        """Pause."""
-        raise NotImplementedError
+    # power actions, run on many vms at once
+    shutdown_guest = _power_action('shutdown_guest',
+                                   'Shut down the guest os of vms.')
+    reboot_guest = _power_action('reboot_guest',
+                                 'Reboot the guest os of vms.')
+    start = _power_action('start', 'Start vms.')
+    stop = _power_action('stop', 'Stop vms.')
+    suspend = _power_action('suspend', 'Suspend vms.')
+    shelve = _power_action('shelve', 'Shelve vms.')
+    shelve_offload = _power_action('shelve_offload', 'Shelve offload vms.')
+    pause = _power_action('pause', 'Pause vms.')
+    reset = _power_action('reset', 'Reset vms.')
 
     @client_api
     def request_console(self):
         """Request console."""
         raise NotImplementedError
 
-    @client_api
-    def reset(self):
-        """Reset."""
-        raise NotImplementedError
-
     @client_api
     def retire(self):
         """Retire."""
@@ -267,9 +308,11 @@ class Collections(CollectionsMixin):
     @click.option('--vtype', type=str, default='',
                   help='type of an vm(s) - ex. "Openstack", "Amazon"...')
     @click.argument('vm_name', metavar='VM_NAME', type=str, default='')
+    @bulk_options
     @client_api
     def delete(self, vm_name, provider=None, vendor=None,
-               vtype=None, by_id=False):
+               vtype=None, by_id=False, from_file=None, filters=None,
+               chunk_size=QUERY_CHUNK_SIZE, output='text', fields=''):
         """Delete.
 
         ::
@@ -285,9 +328,27 @@ class Collections(CollectionsMixin):
         :type vtype: str
         :param by_id: name is vm id
         :type by_id: bool
+        :param from_file: file listing the ids of the vms to delete
+        :type from_file: file
+        :param filters: filters of the vms to delete
+        :type filters: tuple
+        :param chunk_size: maximum number of vms per request
+        :type chunk_size: int
+        :param output: output format (text, jsonl, csv or json)
+        :type output: str
+        :param fields: comma separated fields of the machine readable outputs
+        :type fields: str
         :return: id of a task that will delete the vm
+            (the results of each vm when deleting many vms)
         :rtype: int
         """
+        if from_file or filters:
+            if vm_name:
+                log.abort('Set a vm or --from-file/--filter, not both.')
+            return self._bulk('delete', ids_file=from_file, filters=filters,
+                              chunk_size=chunk_size, output=output,
+                              fields=fields)
+
         if vm_name:
             vm = self.query(vm_name, provider, vendor,
                             vtype, by_id=by_id)
@@ -17,7 +17,6 @@
 miqcli.constants values will differ from installation to installation.
 """
 import os
-import pkg_resources
 
 import click
 
@@ -25,14 +24,53 @@ import click
 #: name of miqcli package
 PACKAGE = 'miqcli'
 
-try:
-    #: Installed version of miqcli
-    _miqcli_distribution = pkg_resources.get_distribution(PACKAGE)
-    VERSION = str(_miqcli_distribution.parsed_version)
-except pkg_resources.DistributionNotFound:
-    # This should be very unlikely, as it means this module is being
-    # imported without the miqcli package being installed
-    VERSION = '0.0.0dev1'
+# installed version of miqcli, looked up on first use (see get_version)
+_version = None
+
+
+def _lookup_version():
+    """Look up the installed version of miqcli in the package metadata.
+
+    :return: installed version or none when miqcli is not installed
+    :rtype: str
+    """
+    try:
+        try:
+            from importlib.metadata import PackageNotFoundError, version
+        except ImportError:
+            # python < 3.8
+            from importlib_metadata import PackageNotFoundError, version
+        try:
+            return version(PACKAGE)
+        except PackageNotFoundError:
+            return None
+    except ImportError:
+        # python 2 without the importlib_metadata backport
+        import pkg_resources
+        try:
+            return pkg_resources.get_distribution(PACKAGE).version
+        except pkg_resources.DistributionNotFound:
+            return None
+
+
+def get_version():
+    """Return the installed version of miqcli.
+
+    The version is read from the package metadata the first time it is
+    needed (e.g. --version), not when the module is imported.
+
+    :return: installed version
+    :rtype: str
+    """
+    global _version
+    if _version is None:
+        _version = _lookup_version()
+        if _version is None:
+            # This should be very unlikely, as it means this module is being
+            # imported without the miqcli package being installed
+            _version = '0.0.0dev1'
+    return _version
+
 
 #: base URL of PyPI
 PYPI = 'https://pypi.python.org/pypi'
@@ -89,9 +127,82 @@ REQUIRED_AWS_PLACEMENT_KEYS = ["email", "image", "flavor", "vm_name",
 
 OPTIONAL_AWS_KEYS = ["network", "subnet", "key_pair", "security_group"]
 
+#: seconds provider types are kept in the provider type registry
+PROVIDER_TYPES_TTL = 300
+
+#: maximum number of concurrent lookups performed by the id resolver
+RESOLVER_POOL_SIZE = 4
+
+#: number of provision requests submitted concurrently (bulk create)
+PROVISION_CONCURRENCY = 4
+
+#: maximum number of provision requests submitted per second (bulk create)
+PROVISION_RATE = 5
+
+#: maximum number of resources loaded by a single bulk query request
+QUERY_CHUNK_SIZE = 100
+
+#: number of resources requested by each page when listing collections
+QUERY_PAGE_SIZE = 100
+
+#: number of pages requested ahead when listing collections (0 disables)
+QUERY_PREFETCH = 0
+
+#: maximum number of compiled advanced query plans cached
+QUERY_PLAN_CACHE_SIZE = 256
+
+#: number of log lines buffered before they are written
+LOG_BUFFER_SIZE = 500
+
+#: maximum seconds log lines stay buffered before they are written
+LOG_FLUSH_INTERVAL = 0.2
+
 #: token file used to authenticate into ManageIQ
 TOKENFILE = os.path.join(os.path.expanduser('~'), ".miqcli/token")
 
+#: resolution cache file used to store resolved resource ids
+CACHE_FILE = os.path.join(os.path.expanduser('~'), ".miqcli/cache.json")
+
+#: command manifest file used to list commands without importing collections
+MANIFEST_FILE = os.path.join(os.path.expanduser('~'), ".miqcli/commands.json")
+
+#: unix socket the miqcli daemon listens on
+DAEMON_SOCKET = os.path.join(os.path.expanduser('~'), ".miqcli/daemon.sock")
+
+#: seconds a resolved resource id is cached for
+CACHE_TTL = 86400
+
+#: maximum number of resolved resource ids cached
+CACHE_SIZE = 1000
+
+#: maximum number of connections kept alive per host by the http session
+HTTP_POOL_SIZE = 10
+
+#: number of times failed http requests are retried
+HTTP_RETRIES = 3
+
+#: backoff factor between http request retries (0.3s, 0.6s, 1.2s, ...)
+HTTP_BACKOFF = 0.3
+
+#: http status codes retried
+HTTP_RETRY_STATUSES = (502, 503, 504)
+
+#: seconds between the first status polls
+POLL_INITIAL = 1
+
+#: maximum seconds between status polls
+POLL_MAXIMUM = 30
+
+#: factor the seconds between status polls grow by
+POLL_FACTOR = 2
+
+#: fraction of the seconds between status polls randomly cut (jitter)
+POLL_JITTER = 0.5
+
+#: maximum seconds spent waiting for a request or task
+POLL_TIMEOUT = 3600
+
+# payload templates, payloads are built from copies (see miqcli.payloads)
 OSP_PAYLOAD = {
     "template_fields": {
         "guid": None
@@ -172,6 +283,17 @@ GLOBAL_PARAMS = [
         default=None,
         help='Enable or disable ssl verification, default is on.'
     ),
+    click.Option(
+        param_decls=['--cache/--no-cache'],
+        default=None,
+        help='Enable or disable the resolution cache, default is on.'
+    ),
+    click.Option(
+        param_decls=['--log-level'],
+        type=click.Choice(['debug', 'info', 'warning', 'error']),
+        default=None,
+        help='Logging level, default is info (debug in verbose mode).'
+    ),
     click.Option(
         param_decls=['--verbose'],
         is_flag=True,
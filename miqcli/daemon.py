@@ -0,0 +1,388 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Daemon module runs cli commands within a long running process.
+
+Each cli invocation pays the python startup, the imports, the configuration
+loading and the authentication. The daemon keeps them warm: imported
+modules, connected client apis (see miqcli.api.Connections), provider types
+and resolution caches. The cli forwards its arguments over a unix socket
+and the daemon streams the command output back.
+
+Messages are json lines. The cli sends a single request::
+
+    {"argv": ["vms", "query"], "cwd": "/home/me", "env": {"MIQ_CFG": ""}}
+
+The daemon answers with the output of the command (stdout and stderr) and
+its exit code::
+
+    {"out": "INFO: ..."}
+    {"err": "ERROR: ..."}
+    {"exit": 0}
+
+This module is imported by the cli entry point before it knows whether
+the command is forwarded, it only imports the cli itself when running a
+command.
+"""
+
+import errno
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from miqcli._compat import StringIO, socketserver
+from miqcli.constants import DAEMON_SOCKET
+
+__all__ = ['DaemonServer', 'control', 'forward']
+
+#: environment variables of the cli forwarded to the daemon
+FORWARDED_ENV = ('MIQ_CFG',)
+
+
+def _connect(path):
+    """Connect to the daemon socket.
+
+    :param path: unix socket
+    :type path: str
+    :return: connected socket or none when no daemon is listening
+    """
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError):
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock, message):
+    """Send a message over the socket."""
+    sock.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+
+def _receive(sock):
+    """Generate the messages received over the socket."""
+    fp = sock.makefile('rb')
+    try:
+        for line in fp:
+            yield json.loads(line.decode('utf-8'))
+    finally:
+        fp.close()
+
+
+def forward(argv, path=DAEMON_SOCKET, output=None, errors=None):
+    """Forward a command to the daemon.
+
+    The current directory and the configuration environment variable of
+    the cli are forwarded along with the arguments.
+
+    :param argv: cli arguments
+    :type argv: list
+    :param path: unix socket
+    :type path: str
+    :param output: stream the command output is written to (stdout)
+    :type output: object
+    :param errors: stream the command errors are written to (stderr)
+    :type errors: object
+    :return: exit code of the command or none when no daemon is running
+    :rtype: int
+    """
+    sock = _connect(path)
+    if sock is None:
+        return None
+
+    output = output or sys.stdout
+    errors = errors or sys.stderr
+    env = dict((key, os.environ[key]) for key in FORWARDED_ENV
+               if key in os.environ)
+    try:
+        _send(sock, dict(argv=list(argv), cwd=os.getcwd(), env=env))
+        for message in _receive(sock):
+            if 'out' in message:
+                output.write(message['out'])
+                output.flush()
+            elif 'err' in message:
+                errors.write(message['err'])
+                errors.flush()
+            elif 'exit' in message:
+                return message['exit']
+    except (IOError, OSError, ValueError):
+        pass
+    finally:
+        sock.close()
+
+    errors.write('ERROR: Connection to the miqcli daemon lost.\n')
+    return 1
+
+
+def control(command, path=DAEMON_SOCKET):
+    """Send a control command (status, stop) to the daemon.
+
+    :param command: control command
+    :type command: str
+    :param path: unix socket
+    :type path: str
+    :return: daemon status or none when no daemon is running
+    :rtype: dict
+    """
+    sock = _connect(path)
+    if sock is None:
+        return None
+    try:
+        _send(sock, dict(control=command))
+        for message in _receive(sock):
+            return message.get('status')
+    except (IOError, OSError, ValueError):
+        pass
+    finally:
+        sock.close()
+    return None
+
+
+class _Output(StringIO):
+    """Command output, every write is sent to the cli."""
+
+    def __init__(self, send, key='out'):
+        """Constructor.
+
+        :param send: function sending a message to the cli
+        :type send: object
+        :param key: message key, out (stdout) or err (stderr)
+        :type key: str
+        """
+        StringIO.__init__(self)
+        self._send = send
+        self._key = key
+
+    def write(self, data):
+        """Send the data written to the cli."""
+        StringIO.write(self, data)
+        data = self.getvalue()
+        if data:
+            self._send({self._key: data})
+        self.seek(0)
+        self.truncate()
+
+    def isatty(self):
+        """The output is not a terminal."""
+        return False
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server, each cli is handled by its own thread."""
+
+    daemon_threads = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handles a message sent by the cli."""
+
+    def handle(self):
+        """Read the message and let the daemon answer it."""
+        try:
+            message = json.loads(self.rfile.readline().decode('utf-8'))
+        except ValueError:
+            return
+        self.server.owner.handle(message, self.send)
+
+    def send(self, message):
+        """Send a message to the cli."""
+        try:
+            self.wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+            self.wfile.flush()
+        except (IOError, OSError):
+            # the cli went away, the command still runs to completion
+            pass
+
+
+class DaemonServer(object):
+    """Daemon running the commands forwarded by the cli.
+
+    Commands share the process state (stdout, current directory and
+    environment), they run one at a time in the order received. Only the
+    user who started the daemon can connect to its socket.
+
+    Usage:
+
+    .. code-block: python
+
+        server = DaemonServer()
+        server.bind()
+        server.serve_forever()
+    """
+
+    def __init__(self, path=DAEMON_SOCKET):
+        """Constructor.
+
+        :param path: unix socket
+        :type path: str
+        """
+        self._path = path
+        self._server = None
+        self._inode = None
+        self._lock = threading.Lock()
+        self.started = None
+        self.commands = 0
+
+    @property
+    def path(self):
+        """Unix socket the daemon listens on."""
+        return self._path
+
+    def bind(self):
+        """Listen on the unix socket, removing the one of a dead daemon."""
+        try:
+            os.makedirs(os.path.dirname(self._path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+        umask = os.umask(0o177)
+        try:
+            self._server = _Server(self._path, _Handler)
+        finally:
+            os.umask(umask)
+        self._server.owner = self
+        self._inode = os.stat(self._path).st_ino
+
+    def detach(self):
+        """Fork the daemon process, detached from the terminal.
+
+        :return: daemon pid in the calling process, zero in the daemon
+        :rtype: int
+        """
+        pid = os.fork()
+        if pid:
+            self._server.socket.close()
+            return pid
+
+        os.setsid()
+        os.chdir('/')
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        return 0
+
+    def serve_forever(self):
+        """Answer the cli until stopped."""
+        from miqcli.utils import log
+
+        if self._server is None:
+            self.bind()
+        # the output of the commands is sent to the cli, not a terminal
+        log.set_styled(False)
+        self.started = time.time()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                # the socket may already belong to a new daemon
+                if os.stat(self._path).st_ino == self._inode:
+                    os.remove(self._path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        """Stop answering the cli (from another thread than the server)."""
+        self._server.shutdown()
+
+    def status(self):
+        """Return the daemon status.
+
+        :return: pid, uptime, commands run and connections kept
+        :rtype: dict
+        """
+        from miqcli.api import connections
+
+        return dict(pid=os.getpid(), commands=self.commands,
+                    connections=len(connections),
+                    uptime=int(time.time() - (self.started or time.time())))
+
+    def handle(self, message, send):
+        """Answer a message sent by the cli.
+
+        :param message: command arguments or control command
+        :type message: dict
+        :param send: function sending a message to the cli
+        :type send: object
+        """
+        command = message.get('control')
+        if command in ('status', 'stop'):
+            send(dict(status=self.status()))
+            if command == 'stop':
+                self.shutdown()
+        elif 'argv' in message:
+            send(dict(exit=self.run(message['argv'], message.get('cwd'),
+                                    message.get('env'), send)))
+
+    def run(self, argv, cwd=None, env=None, send=None):
+        """Run a command, within the directory and environment given.
+
+        :param argv: cli arguments
+        :type argv: list
+        :param cwd: current directory of the cli
+        :type cwd: str
+        :param env: environment variables of the cli
+        :type env: dict
+        :param send: function sending the output to the cli
+        :type send: object
+        :return: exit code
+        :rtype: int
+        """
+        # the cli imports this module (see the daemon built-in command)
+        from miqcli.cli.main import run
+        from miqcli.utils import log
+
+        env = env or dict()
+        send = send or (lambda message: None)
+        output, errors = _Output(send), _Output(send, 'err')
+
+        with self._lock:
+            self.commands += 1
+            stdout, stderr, directory = sys.stdout, sys.stderr, os.getcwd()
+            environ = dict((key, os.environ.get(key)) for key in
+                           FORWARDED_ENV)
+            sys.stdout, sys.stderr = output, errors
+            try:
+                for key in FORWARDED_ENV:
+                    if key in env:
+                        os.environ[key] = env[key]
+                    else:
+                        os.environ.pop(key, None)
+                os.chdir(cwd or directory)
+                rc = run(argv)
+            except Exception:
+                errors.write(traceback.format_exc())
+                rc = 1
+            finally:
+                log.flush()
+                sys.stdout, sys.stderr = stdout, stderr
+                os.chdir(directory)
+                for key, value in environ.items():
+                    if value is None:
+                        os.environ.pop(key, None)
+                    else:
+                        os.environ[key] = value
+        return rc
@@ -18,9 +18,12 @@
 
 from functools import wraps
 
-from miqcli.utils import get_client_api_pointer
+import click
 
-__all__ = ['client_api']
+from miqcli.constants import POLL_TIMEOUT, QUERY_CHUNK_SIZE
+from miqcli.utils.output import OUTPUT_FORMATS
+
+__all__ = ['bulk_options', 'client_api', 'output_options', 'watch_options']
 
 
 def client_api(method):
@@ -34,10 +37,11 @@ def client_api(method):
     def func(*args, **kwargs):
         """Invoke the given collection method.
 
-        Before calling the collection method, it will set common attributes
-        that are used by the collection class itself. These attributes
-        remove the need to perform lookups within the collection method
-        itself.
+        Before calling the collection method, it will bind the method to the
+        collection class. The common attributes used by the collection class
+        itself (api, collection, all and action) are then resolved on first
+        access. These attributes remove the need to perform lookups within
+        the collection method itself.
 
         :param args: Arguments
         :type args: tuple
@@ -45,25 +49,74 @@ def client_api(method):
         :type kwargs: dict
         :return: The invoked collection method
         """
-        # set the api pointer attribute
-        setattr(args[0], 'api', get_client_api_pointer())
-        _api = getattr(args[0], 'api')
-
-        # set the api.client.collection pointer attribute
-        setattr(args[0], 'collection', getattr(
-            _api.client.collections, args[0].__module__.split('.')[-1]))
-        _collection = getattr(args[0], 'collection')
-
-        # set the api.client.collection.all attribute
-        setattr(args[0], 'all', _collection.all)
-
-        # set the api.client.collection.action pointer attribute
-        try:
-            setattr(args[0], 'action', getattr(
-                _collection.action, method.__name__))
-        except (AttributeError, RuntimeError):
-            # action does not exist
-            setattr(args[0], 'action', None)
-
+        args[0]._bind(method.__name__)
         return method(*args, **kwargs)
     return func
+
+
+def output_options(method):
+    """Output options decorator.
+
+    Adds the --output and --fields options to a collection method listing
+    entities. The method receives them as output and fields.
+
+    :param method: Collection method
+    :type method: object
+    :return: The collection method with the options
+    """
+    method = click.option(
+        '--fields', type=str, default='',
+        help='comma separated fields written for each entity (machine '
+        'readable outputs)')(method)
+    method = click.option(
+        '--output', type=click.Choice(OUTPUT_FORMATS), default='text',
+        help='output format, jsonl, csv and json write one record per '
+        'entity')(method)
+    return method
+
+
+def watch_options(method):
+    """Watch options decorator.
+
+    Adds the --watch and --timeout options to a collection method printing
+    the status of a request (or task). The method receives them as watch
+    and timeout.
+
+    :param method: Collection method
+    :type method: object
+    :return: The collection method with the options
+    """
+    method = click.option(
+        '--timeout', type=int, default=POLL_TIMEOUT,
+        help='maximum seconds spent watching')(method)
+    method = click.option(
+        '--watch', is_flag=True, default=False,
+        help='wait for the request to finish, reporting its state '
+        'transitions')(method)
+    return method
+
+
+def bulk_options(method):
+    """Bulk options decorator.
+
+    Adds the --from-file, --filter and --chunk_size options (along with the
+    output options) to a collection method running an action on many
+    resources. The method receives them as from_file, filters, chunk_size,
+    output and fields.
+
+    :param method: Collection method
+    :type method: object
+    :return: The collection method with the options
+    """
+    method = output_options(method)
+    method = click.option(
+        '--from-file', type=click.File('r'), default=None,
+        help='file listing the ids of the resources, one per line')(method)
+    method = click.option(
+        '--filter', 'filters', type=str, multiple=True,
+        help='filter of the resources, e.g. "name=test-*" (multiple '
+        'filters are and\'ed)')(method)
+    method = click.option(
+        '--chunk_size', type=int, default=QUERY_CHUNK_SIZE,
+        help='maximum number of resources per request')(method)
+    return method
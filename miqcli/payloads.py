@@ -0,0 +1,97 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Payloads module builds the payloads of the requests sent to ManageIQ."""
+
+import json
+
+from miqcli.constants import AWS_PAYLOAD, OSP_FIP_PAYLOAD, OSP_PAYLOAD
+
+__all__ = ['PayloadTemplate', 'AWS_PROVISION', 'OSP_PROVISION',
+           'OSP_FLOATING_IP']
+
+
+class PayloadTemplate(object):
+    """Immutable payload template.
+
+    The template is frozen when created, every payload built is a fresh
+    copy the caller owns. Templates are safe to share between threads.
+
+    Usage:
+
+    .. code-block: python
+
+        payload = OSP_PROVISION.build(
+            requester=dict(owner_email='me@example.com'),
+            vm_fields=dict(vm_name='vm01'))
+    """
+
+    def __init__(self, name, template):
+        """Constructor.
+
+        :param name: payload name
+        :type name: str
+        :param template: payload template, section name to default fields
+        :type template: dict
+        """
+        self._name = name
+        self._template = json.dumps(template)
+        self._sections = frozenset(template)
+
+    @property
+    def name(self):
+        """Payload name property.
+
+        :return: payload name
+        :rtype: str
+        """
+        return self._name
+
+    @property
+    def sections(self):
+        """Payload sections property.
+
+        :return: section names
+        :rtype: frozenset
+        """
+        return self._sections
+
+    def build(self, **sections):
+        """Build a payload.
+
+        :param sections: section name to fields set (added or replaced)
+        :type sections: dict
+        :return: payload
+        :rtype: dict
+        """
+        payload = json.loads(self._template)
+        for section, fields in sections.items():
+            if section not in self._sections:
+                raise ValueError('Payload {0} has no section {1}.'.format(
+                    self._name, section))
+            payload[section].update(fields)
+        return payload
+
+
+#: OpenStack provision request
+OSP_PROVISION = PayloadTemplate('OpenStack provision request', OSP_PAYLOAD)
+
+#: Amazon provision request
+AWS_PROVISION = PayloadTemplate('Amazon provision request', AWS_PAYLOAD)
+
+#: OpenStack floating ip automation request
+OSP_FLOATING_IP = PayloadTemplate('OpenStack floating ip automation request',
+                                  OSP_FIP_PAYLOAD)
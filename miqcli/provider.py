@@ -14,13 +14,94 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import threading
+import time
+
 from manageiq_client.api import APIException
 
+from miqcli.constants import PROVIDER_TYPES_TTL
 from miqcli.query import AdvancedQuery
 from miqcli.utils import log
 
 __all__ = ['Provider', 'Flavors', 'Templates', 'SecurityGroups', 'KeyPair',
-           'Tenant', 'Networks', 'Instances', 'Vms']
+           'Tenant', 'Networks', 'Instances', 'Vms', 'ProviderTypeRegistry',
+           'provider_types']
+
+
+class ProviderTypeRegistry(object):
+    """Provider type registry.
+
+    Process wide registry holding the provider types (ManageIQ provider
+    class names) of each ManageIQ server. Provider components consult the
+    registry instead of downloading the providers collection themselves.
+
+    Types are kept for a limited time (ttl). Commands that add or remove
+    providers must call invalidate so the next lookup reloads them.
+    """
+
+    def __init__(self, ttl=PROVIDER_TYPES_TTL):
+        """Constructor.
+
+        :param ttl: seconds the provider types are valid for
+        :type ttl: int
+        """
+        self.ttl = ttl
+        self._types = dict()
+        self._lock = threading.Lock()
+
+    def types(self, api):
+        """Return the provider types for the server.
+
+        :param api: client api pointer
+        :type api: class
+        :return: provider types
+        :rtype: list
+        """
+        with self._lock:
+            loaded, types = self._types.get(api.url, (None, None))
+            if loaded is None or time.time() - loaded > self.ttl:
+                log.debug('Loading provider types from %s.' % api.url)
+                results = api.client.collections.providers.query_string(
+                    expand='resources', attributes='type')
+                types = [res.type for res in results.resources]
+                self._types[api.url] = (time.time(), types)
+            return types
+
+    def lookup(self, api, name):
+        """Return the cloud and network types for the provider name.
+
+        :param api: client api pointer
+        :type api: class
+        :param name: provider name
+        :type name: str
+        :return: cloud type and network type, empty when undefined
+        :rtype: tuple
+        """
+        cloud_type, network_type = '', ''
+        for _type in self.types(api):
+            if name.lower().title() in _type:
+                if 'cloud' in _type.lower():
+                    cloud_type = _type
+                elif 'network' in _type.lower():
+                    network_type = _type
+        return cloud_type, network_type
+
+    def invalidate(self, api=None):
+        """Invalidate the provider types.
+
+        :param api: client api pointer, when not set all servers are
+            invalidated
+        :type api: class
+        """
+        with self._lock:
+            if api is None:
+                self._types.clear()
+            else:
+                self._types.pop(api.url, None)
+
+
+#: process wide provider type registry
+provider_types = ProviderTypeRegistry()
 
 
 class Provider(object):
@@ -32,6 +113,9 @@ class Provider(object):
 
     __collection_name__ = ''
 
+    # entity attribute holding the resource id
+    __id_attribute__ = 'id'
+
     # declare attributes to be defined at a later time..
     _type, _cloud_type, _network_type = '', '', ''
     _collection, _query = None, None
@@ -49,12 +133,8 @@ class Provider(object):
         self._query = AdvancedQuery(self._collection)
 
         # lets first save the provider types for cloud & network
-        for res in self._api.client.collections.providers.all:
-            if self._name.lower().title() in res.type:
-                if 'cloud' in res.type.lower():
-                    self._cloud_type = res.type
-                elif 'network' in res.type.lower():
-                    self._network_type = res.type
+        self._cloud_type, self._network_type = provider_types.lookup(
+            self._api, self._name)
 
     @property
     def name(self):
@@ -155,12 +235,14 @@ class Provider(object):
                 self.__collection_name__, ent_id, e))
         return output
 
-    def get_resource(self, name, tenant_id=None):
+    def get_resource(self, name, tenant_id=None, attributes=None):
         """Get the resource based on the name given.
         :param name: resource name
         :type name: str
         :param tenant_id: optional tenant_id for querying
         :type tenant_id: str
+        :param attributes: optional attributes to load into the resources
+        :type attributes: list
         :return: resources found from query
         :rtype: list
         """
@@ -175,7 +257,7 @@ class Provider(object):
         self.query.collection = self.collection
 
         # run the query!
-        self.query(_query)
+        self.query(_query, attributes)
 
         if len(self.query.resources) == 0:
             log.abort('{0} {1} not found for provider {2}.'.format(
@@ -184,15 +266,49 @@ class Provider(object):
 
         return self.query.resources
 
-    def get_id(self, name):
+    def _cached(self, key, lookup):
+        """Return the cached value for the key or perform the lookup.
+
+        :param key: cache key parts (collection, type, name, tenant)
+        :type key: tuple
+        :param lookup: function performing the lookup
+        :type lookup: object
+        :return: cached or looked up value
+        """
+        cache = self.api.cache
+        if cache is None:
+            return lookup()
+
+        key = cache.key(self.api.url, *key)
+        value = cache.get(key)
+        if value is None:
+            value = lookup()
+            if value is not None:
+                cache.put(key, value)
+        else:
+            log.debug('Resolved {0} from cache: {1}'.format(key, value))
+        return value
+
+    def get_id(self, name, tenant_id=None, attributes=None):
         """Get the ID for the resource name.
+
+        Resolved ids are kept in the resolution cache (when enabled).
+
         :param name: resource name
         :type name: str
+        :param tenant_id: optional tenant_id for querying
+        :type tenant_id: str
+        :param attributes: optional attributes to load into the resource
+        :type attributes: list
         :return: resource id
         :rtype: int
         """
-        self.get_resource(name)
-        return getattr(self.query, 'id')
+        def lookup():
+            self.get_resource(name, tenant_id, attributes)
+            return getattr(self.query, self.__id_attribute__)
+
+        return self._cached(
+            (self.__collection_name__, self.type, name, tenant_id), lookup)
 
     def get_attribute(self, ent_id, attribute):
         """Get the attribute for the collection entity.
@@ -235,6 +351,7 @@ class Templates(Provider):
     """Provider images component."""
 
     __collection_name__ = 'templates'
+    __id_attribute__ = 'guid'
 
     def __init__(self, name, api):
         """Constructor."""
@@ -242,11 +359,6 @@ class Templates(Provider):
         self.collection = self.__collection_name__
         self.type = self.cloud_type + '::Template'
 
-    def get_id(self, name):
-        """Override the parent get_id."""
-        self.get_resource(name)
-        return getattr(self.query, 'guid')
-
 
 class SecurityGroups(Provider):
     """Provider security group component."""
@@ -259,15 +371,6 @@ class SecurityGroups(Provider):
         self.collection = self.__collection_name__
         self.type = self.network_type + '::SecurityGroup'
 
-    def get_id(self, name, tenant_id):
-        """Override the parent get_id.
-        :param name: resource name
-        :type name: str
-        :param tenant_id: tenant_id for querying
-        :type tenant_id: str"""
-        self.get_resource(name, tenant_id)
-        return getattr(self.query, 'id')
-
 
 class KeyPair(Provider):
     """Provider key pair component."""
@@ -307,14 +410,43 @@ class Networks(Provider):
         else:
             self.type = self.network_type + '::CloudNetwork'
 
-    def get_id(self, name, tenant_id=None):
-        """Override the parent get_id.
-        :param name: resource name
+    def get_subnet_id(self, name, network_id):
+        """Get the ID for the subnet name of the given cloud network.
+
+        The cloud subnets loaded by the last get_id call are used when they
+        belong to the given network, otherwise they are requested.
+
+        :param name: subnet name
         :type name: str
-        :param tenant_id: optional tenant_id for querying
-        :type tenant_id: str"""
-        self.get_resource(name, tenant_id)
-        return getattr(self.query, 'id')
+        :param network_id: cloud network id
+        :type network_id: int
+        :return: subnet id or none
+        :rtype: str
+        """
+        def lookup():
+            out = None
+            if len(self.query.resources) == 1:
+                entity = self.query.resources[0].__dict__
+                if entity.get('id') == network_id and \
+                        'cloud_subnets' in entity:
+                    out = entity['cloud_subnets']
+            if out is None:
+                out = self.get_attribute(network_id, 'cloud_subnets')
+
+            subnet_id = None
+            if isinstance(out, list):
+                for att in out:
+                    if 'name' in att and att['name'] == name:
+                        subnet_id = att['id']
+            elif isinstance(out, dict):
+                if out and 'name' in out and out['name'] == name:
+                    subnet_id = out['id']
+
+            log.debug('Attribute: {0}'.format(out))
+            return subnet_id
+
+        return self._cached(('cloud_subnets', self.type, name, network_id),
+                            lookup)
 
 
 class Instances(Provider):
@@ -14,11 +14,25 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from manageiq_client.api import APIException
-from manageiq_client.filters import Q
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+import click
+from click.globals import pop_context, push_context
+from manageiq_client.api import APIException, Entity
+from manageiq_client.filters import OPERATORS, Q
+from miqcli.constants import QUERY_CHUNK_SIZE, QUERY_PAGE_SIZE, \
+    QUERY_PLAN_CACHE_SIZE, QUERY_PREFETCH
 from miqcli.utils import log
 
-__all__ = ['BasicQuery', 'AdvancedQuery', 'inject']
+__all__ = ['BasicQuery', 'AdvancedQuery', 'Record', 'compile_query',
+           'inject', 'iter_pages', 'paginate']
+
+#: operators chaining queries (and, or)
+CONNECTORS = ('&', '|')
+
+# compiled query plans by query shape
+_PLANS = dict()
 
 
 def inject(lst, item):
@@ -27,10 +41,306 @@ def inject(lst, item):
     return result
 
 
+class Record(object):
+    """Projected resource.
+
+    Compact read only resource holding the attributes requested (plus id and
+    href) only. Attributes are read like entity attributes.
+    """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        """Constructor.
+
+        :param data: resource data
+        :type data: dict
+        """
+        self._data = data
+
+    def __getattr__(self, attr):
+        """Return the value for the given attribute.
+
+        :param attr: attribute name
+        :type attr: str
+        :return: attribute value
+        """
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        try:
+            return self._data[attr]
+        except KeyError:
+            raise AttributeError('No such attribute {0}'.format(attr))
+
+    def __getitem__(self, item):
+        """Return the value for the given attribute (entity compatibility)."""
+        return getattr(self, item)
+
+    def __repr__(self):
+        return 'Record({0!r})'.format(self._data)
+
+
+def _get_page(ctx, collection, offset, size, params, attributes,
+              records=False):
+    """Request a page of resources.
+
+    Called from the prefetch worker threads, the click context is pushed
+    so the request can log messages. Any exception (including SystemExit
+    raised when aborting) is returned to be raised again by the consumer.
+
+    The page comes with the number of resources in the collection (matching
+    the filters), none when the server does not return it.
+
+    :return: tuple of success and page with the total (or exception)
+    :rtype: tuple
+    """
+    if ctx is not None:
+        push_context(ctx)
+    try:
+        data = collection._api.get(collection._href, offset=offset,
+                                   limit=size, **params)
+        total = data.get('subquery_count' if 'filter[]' in params
+                         else 'count')
+        if records:
+            # records hold the attributes only, not the resource actions
+            resources = data.get('resources', [])
+            for resource in resources:
+                resource.pop('actions', None)
+            return True, ([Record(resource) for resource in resources],
+                          total)
+        return True, ([Entity(collection, resource, attributes=attributes)
+                       for resource in data.get('resources', [])], total)
+    except BaseException as e:
+        return False, e
+    finally:
+        if ctx is not None:
+            pop_context()
+
+
+def iter_pages(collection, page_size=QUERY_PAGE_SIZE, limit=None, offset=0,
+               attributes=None, prefetch=QUERY_PREFETCH, records=False,
+               filters=None):
+    """Iterate over the pages of a collection.
+
+    Without prefetch, each page is requested from the server (offset/limit)
+    only once the previous page was consumed. With prefetch, up to prefetch
+    pages are requested ahead on a thread pool and yielded in order, new
+    pages are only requested as pages are consumed.
+
+    The last page is known from the number of resources the server reports
+    (or an empty page). A page shorter than requested is not the last one
+    when the server caps the page size, the following pages are then
+    requested from the end of that page, at most that size at a time.
+
+    :param collection: collection object
+    :type collection: object
+    :param page_size: number of resources per page
+    :type page_size: int
+    :param limit: maximum number of resources (all when none)
+    :type limit: int
+    :param offset: number of resources to skip
+    :type offset: int
+    :param attributes: attributes to load into the resources
+    :type attributes: tuple
+    :param prefetch: number of pages requested ahead
+    :type prefetch: int
+    :param records: yield records (projected resources) instead of entities
+    :type records: bool
+    :param filters: filters the resources match (e.g. ['name=vm*'])
+    :type filters: list
+    :return: generator of pages (lists of resources)
+    """
+    if page_size < 1:
+        raise ValueError('Page size must be greater than zero.')
+
+    params = dict(expand='resources', sort_by='id', sort_order='asc')
+    if attributes:
+        params['attributes'] = ','.join(attributes)
+    if filters:
+        params['filter[]'] = list(filters)
+
+    ctx = click.get_current_context(silent=True)
+    pool = ThreadPool(prefetch) if prefetch > 0 else None
+    pending = deque()
+    start = offset
+    remaining = limit
+
+    try:
+        while True:
+            # request the following pages (at least one)
+            while len(pending) < max(prefetch, 1) and \
+                    (remaining is None or remaining > 0):
+                size = page_size
+                if remaining is not None:
+                    size = min(page_size, remaining)
+                    remaining -= size
+                args = (ctx, collection, offset, size, params, attributes,
+                        records)
+                if pool is None:
+                    pending.append((offset, size, None, args))
+                else:
+                    pending.append((offset, size,
+                                    pool.apply_async(_get_page, args), None))
+                offset += size
+
+            if not pending:
+                return
+
+            page_offset, size, result, args = pending.popleft()
+            if result is None:
+                success, page = _get_page(None, *args[1:])
+            else:
+                success, page = result.get()
+            if not success:
+                raise page
+            page, total = page
+
+            if not page:
+                return
+            yield page
+
+            end = page_offset + len(page)
+            if total is not None and end >= total:
+                return
+            if len(page) < size:
+                # the server caps the page size, the pages requested ahead
+                # start past the end of this page
+                page_size = len(page)
+                pending.clear()
+                offset = end
+                if limit is not None:
+                    remaining = limit - (end - start)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def paginate(collection, page_size=QUERY_PAGE_SIZE, limit=None, offset=0,
+             attributes=None, prefetch=QUERY_PREFETCH, records=False,
+             filters=None):
+    """Iterate over the resources of a collection, page by page.
+
+    Only the pages requested ahead (prefetch) and the current page are held
+    in memory at a time.
+
+    Usage:
+
+    .. code-block: python
+
+        for vm in paginate(vm_collection, page_size=500, prefetch=4):
+            print(vm.name)
+
+    :param collection: collection object
+    :type collection: object
+    :param page_size: number of resources per page
+    :type page_size: int
+    :param limit: maximum number of resources (all when none)
+    :type limit: int
+    :param offset: number of resources to skip
+    :type offset: int
+    :param attributes: attributes to load into the resources
+    :type attributes: tuple
+    :param prefetch: number of pages requested ahead
+    :type prefetch: int
+    :param records: yield records (projected resources) instead of entities
+    :type records: bool
+    :param filters: filters the resources match (e.g. ['name=vm*'])
+    :type filters: list
+    :return: generator of resources
+    """
+    for page in iter_pages(collection, page_size, limit, offset, attributes,
+                           prefetch, records, filters):
+        for resource in page:
+            yield resource
+
+
+def _plan(shape):
+    """Return the compiled plan for a query shape.
+
+    The shape of a query is the query without its values, i.e.
+    (('name', '='), '&', ('type', '=')). The plan is the list of
+    (name, operator, is_or) for each query, validated once per shape.
+
+    :param shape: query shape
+    :type shape: tuple
+    :return: compiled plan
+    :rtype: tuple
+    """
+    plan = _PLANS.get(shape)
+    if plan is not None:
+        return plan
+
+    plan = list()
+    for index, item in enumerate(shape):
+        if index % 2:
+            if item not in CONNECTORS:
+                raise ValueError('Invalid query operator {0}'.format(item))
+            continue
+        if not isinstance(item, tuple):
+            raise ValueError('Query attempted is invalid: {0}'.format(shape))
+        if item[1] not in OPERATORS:
+            raise ValueError('Invalid operator {0}'.format(item[1]))
+        plan.append((item[0], item[1], index > 0 and shape[index - 1] == '|'))
+    plan = tuple(plan)
+
+    if len(_PLANS) >= QUERY_PLAN_CACHE_SIZE:
+        _PLANS.clear()
+    _PLANS[shape] = plan
+    return plan
+
+
+def compile_query(query):
+    """Compile a query list into a filter query object.
+
+    :param query: multiple queries containing name, operand and value
+        chained by '&' or '|' operators
+    :type query: list
+    :return: filter query
+    :rtype: Q
+    :raises ValueError: when the query is invalid
+
+    Usage:
+
+    .. code-block: python
+
+        compile_query([('name', '=', 'vm_foo'), '|', ('name', '=', 'vm_bar')])
+    """
+    if len(query) % 2 == 0:
+        raise ValueError('Query attempted is invalid: {0}'.format(query))
+
+    shape = list()
+    for item in query:
+        if isinstance(item, tuple):
+            if len(item) != 3:
+                raise ValueError('Query must contain three indexes (name, '
+                                 'operator, value)')
+            shape.append(item[:2])
+        else:
+            shape.append(item)
+
+    _query = None
+    for (name, op, is_or), item in zip(_plan(tuple(shape)), query[0::2]):
+        # values are strings (quoted) whatever their type, e.g. ids
+        q = Q(name, op, str(item[2]))
+        if _query is None:
+            _query = q
+        elif is_or:
+            _query = _query | q
+        else:
+            _query = _query & q
+    return _query
+
+
 class BaseQuery(object):
     """Base query.
 
     This class contains default methods each child query class can use.
+
+    Attributes of a single resource found are read through the query
+    object. The resource is loaded from the server at most once per query
+    result (only when the attribute read is not part of the query result)
+    and attribute values are cached. Call refresh() to load the resources
+    again.
     """
 
     def __init__(self, collection):
@@ -39,9 +349,43 @@ class BaseQuery(object):
         :param collection: collection object
         :type collection: object
         """
+        self._cache = dict()
+        self._loaded = False
         self.collection = collection
         self.resources = list()
 
+    @property
+    def resources(self):
+        """Resources property.
+
+        :return: resources found by the last query
+        :rtype: list
+        """
+        return self._resources
+
+    @resources.setter
+    def resources(self, resources):
+        """Set the resources, invalidating the cached attributes.
+
+        :param resources: resources
+        :type resources: list
+        """
+        self._resources = resources
+        self._cache.clear()
+        self._loaded = False
+
+    def refresh(self):
+        """Load the resources found again from the server.
+
+        :return: resources
+        :rtype: list
+        """
+        self._cache.clear()
+        for ent in self._resources:
+            ent.reload()
+        self._loaded = True
+        return self._resources
+
     def __getattr__(self, attr):
         """Return the value for the given attribute.
 
@@ -49,20 +393,86 @@ class BaseQuery(object):
         :type attr: str
         :return: attribute value
         """
+        if attr.startswith('_'):
+            # private attributes are never resource attributes
+            raise AttributeError(attr)
+
+        if attr in self._cache:
+            return self._cache[attr]
+
         if len(self.resources) == 0:
             raise AttributeError('No available resources. Did you perform '
                                  'a query?')
         elif len(self.resources) == 1:
-            # load attributes into entity object
-            self.resources[0].reload()
+            entity = self.resources[0].__dict__
 
-            if attr not in self.resources[0].__dict__:
+            # load attributes into entity object (once)
+            if attr not in entity and not self._loaded:
+                self.resources[0].reload()
+                self._loaded = True
+
+            if attr not in entity:
                 raise AttributeError('No such attribute {0}'.format(attr))
-            return self.resources[0].__dict__[attr]
+            self._cache[attr] = entity[attr]
+            return entity[attr]
         else:
             raise AttributeError('Cannot get attribute when multiple '
                                  'resources exist.')
 
+    def _filter(self, filters, attr=None):
+        """Filter the collection resources.
+
+        The resources are expanded by the filter request itself (instead of
+        reloading each resource found), with the attributes given or in
+        full. When the server is unable to return the attributes along with
+        the collection, they are loaded by bulk query requests of
+        QUERY_CHUNK_SIZE resources.
+
+        :param filters: filters
+        :type filters: list
+        :param attr: attributes to load into the resources
+        :type attr: tuple
+        :return: resources matching the filters
+        :rtype: list
+        """
+        if not attr:
+            return self.collection.query_string(**{
+                'filter[]': filters, 'expand': 'resources'}).resources
+
+        attributes = ','.join(attr)
+        try:
+            return self.collection.query_string(**{
+                'filter[]': filters, 'expand': 'resources',
+                'attributes': attributes}).resources
+        except APIException as e:
+            log.debug('Unable to load attributes {0} with the filter '
+                      'request: {1}'.format(attributes, e))
+
+        resources = self.collection.raw_filter(filters).resources
+        return self._bulk_load(resources, attributes)
+
+    def _bulk_load(self, resources, attributes):
+        """Load resources with their attributes by bulk query requests.
+
+        :param resources: resources
+        :type resources: list
+        :param attributes: comma separated attributes
+        :type attributes: str
+        :return: loaded resources
+        :rtype: list
+        """
+        href = '{0}?attributes={1}'.format(self.collection._href, attributes)
+
+        loaded = list()
+        for index in range(0, len(resources), QUERY_CHUNK_SIZE):
+            chunk = resources[index:index + QUERY_CHUNK_SIZE]
+            output = self.collection._api.post(
+                href, action='query',
+                resources=[dict(href=ent._href) for ent in chunk])
+            loaded.extend(Entity(self.collection, data)
+                          for data in output['results'])
+        return loaded
+
 
 class BasicQuery(BaseQuery):
     """Basic query.
@@ -102,15 +512,8 @@ class BasicQuery(BaseQuery):
             return self.resources
 
         try:
-            resources = getattr(self.collection, 'filter')(
-                Q(query[0], query[1], query[2])
-            )
-
-            self.resources = resources.resources
-
-            if attr:
-                for ent in resources.resources:
-                    ent.reload(True, True, attr)
+            self.resources = self._filter(
+                Q(query[0], query[1], query[2]).as_filters, attr)
 
         except (APIException, ValueError) as e:
             log.error('Query attempted failed: {0}, error: {1}'.format(
@@ -150,35 +553,14 @@ class AdvancedQuery(BaseQuery):
         # -- or --
         query.__call__([('name', '=', 'vm_foo'), '&', ('id', '>', '9999934')])
         """
-        adv_query = ''
-
-        if len(query) % 2 == 0:
-            log.warning('Query attempted is invalid: {0}'.format(query))
+        try:
+            adv_query = compile_query(query)
+        except (ValueError, TypeError) as e:
+            log.warning('{0}'.format(e))
             return self.resources
 
-        # build query in string form
-        while query:
-            _query = query.pop(0)
-
-            if isinstance(_query, tuple) and len(_query) != 3:
-                log.warning('Query must contain three indexes (name, operator,'
-                            ' value)')
-                return self.resources
-            elif isinstance(_query, tuple):
-                adv_query += str("Q('" + str(_query[0]) + "', '" + str(
-                    _query[1])) + "', '" + str(_query[2]) + "')"
-            elif isinstance(_query, str):
-                adv_query += ' {0} '.format(_query)
-
         try:
-            resources = getattr(self.collection, 'filter')(eval(adv_query))
-
-            self.resources = resources.resources
-
-            if attr:
-                for ent in resources.resources:
-                    ent.reload(True, True, attr)
-
+            self.resources = self._filter(adv_query.as_filters, attr)
         except (APIException, ValueError, TypeError) as e:
             # most likely user passed an invalid attribute name
             log.error('Query attempted failed: {0}, error: {1}'.format(
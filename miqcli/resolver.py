@@ -0,0 +1,196 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Resolver module runs independent id lookups concurrently."""
+
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import click
+from click.globals import pop_context, push_context
+
+from miqcli._compat import Queue
+from miqcli.constants import RESOLVER_POOL_SIZE
+
+__all__ = ['Resolver', 'SharedLookup']
+
+
+class Resolver(object):
+    """Concurrent id resolver.
+
+    Lookups are added with the names of the lookups they depend on. When
+    called, the resolver runs every lookup whose dependencies are resolved
+    on a bounded thread pool. The total time is roughly the time of the
+    longest chain of dependent lookups.
+
+    Usage:
+
+    .. code-block: python
+
+        resolver = Resolver()
+        resolver.add('tenant', tenant.get_id, ('my_tenant',))
+        resolver.add('network', network.get_id, ('my_network',),
+                     requires=('tenant',))
+        ids = resolver()
+
+    The resolved values of the dependencies are appended to the arguments
+    of the lookup, in the order given, i.e.
+    network.get_id('my_network', ids['tenant']).
+    """
+
+    def __init__(self, size=RESOLVER_POOL_SIZE, pool=None):
+        """Constructor.
+
+        :param size: maximum number of concurrent lookups
+        :type size: int
+        :param pool: thread pool shared by many resolvers, the lookups run
+            on a pool of the given size created per call when not set
+        :type pool: object
+        """
+        self._size = size
+        self._pool = pool
+        self._lookups = OrderedDict()
+
+    def add(self, name, func, args=(), requires=()):
+        """Add a lookup.
+
+        :param name: lookup name, the key of the resolved value
+        :type name: str
+        :param func: function performing the lookup
+        :type func: object
+        :param args: arguments for the function
+        :type args: tuple
+        :param requires: names of the lookups the lookup depends on
+        :type requires: tuple
+        """
+        if name in self._lookups:
+            raise ValueError('Lookup %s is already defined.' % name)
+        self._lookups[name] = (func, tuple(args), tuple(requires))
+
+    def _validate(self):
+        """Verify every dependency is defined and there are no cycles."""
+        for name, (func, args, requires) in self._lookups.items():
+            for dependency in requires:
+                if dependency not in self._lookups:
+                    raise ValueError('Lookup %s depends on undefined lookup '
+                                     '%s.' % (name, dependency))
+
+        resolved = set()
+        while len(resolved) != len(self._lookups):
+            ready = [name for name, (func, args, requires)
+                     in self._lookups.items()
+                     if name not in resolved and set(requires) <= resolved]
+            if not ready:
+                raise ValueError('Lookups %s have circular dependencies.' %
+                                 sorted(set(self._lookups) - resolved))
+            resolved.update(ready)
+
+    @staticmethod
+    def _run(ctx, name, func, args):
+        """Run a lookup within the worker thread.
+
+        The click context is pushed for the worker thread so the lookup can
+        log messages. Any exception (including SystemExit raised when
+        aborting) is returned to be raised again by the calling thread.
+        """
+        if ctx is not None:
+            push_context(ctx)
+        try:
+            return name, True, func(*args)
+        except BaseException as e:
+            return name, False, e
+        finally:
+            if ctx is not None:
+                pop_context()
+
+    def __call__(self):
+        """Run all lookups.
+
+        :return: lookup name to resolved value
+        :rtype: dict
+        """
+        self._validate()
+
+        results = dict()
+        if not self._lookups:
+            return results
+
+        ctx = click.get_current_context(silent=True)
+        done = Queue()
+        pending = OrderedDict(self._lookups)
+        running = 0
+
+        pool = self._pool or ThreadPool(min(self._size, len(self._lookups)))
+        try:
+            while pending or running:
+                # submit every lookup whose dependencies are resolved
+                for name, (func, args, requires) in list(pending.items()):
+                    if not set(requires) <= set(results):
+                        continue
+                    del pending[name]
+                    running += 1
+                    pool.apply_async(
+                        self._run,
+                        (ctx, name, func,
+                         args + tuple(results[r] for r in requires)),
+                        callback=done.put)
+
+                name, success, value = done.get()
+                running -= 1
+                if not success:
+                    raise value
+                results[name] = value
+        finally:
+            if pool is not self._pool:
+                pool.terminate()
+
+        return results
+
+
+class SharedLookup(object):
+    """Lookup shared by the resolvers of many requests.
+
+    The resolved value is kept per arguments, each distinct lookup runs
+    once no matter how many requests need it. Calls are serialized since
+    the provider components keep the result of their last query (lookups
+    of the same component may share a lock for the same reason).
+    """
+
+    def __init__(self, func, lock=None):
+        """Constructor.
+
+        :param func: function performing the lookup
+        :type func: object
+        :param lock: lock serializing the calls
+        :type lock: object
+        """
+        self._func = func
+        self._lock = lock or threading.Lock()
+        self._values = dict()
+
+    def __call__(self, *args):
+        """Return the resolved value, performing the lookup once.
+
+        :param args: arguments for the function
+        :type args: tuple
+        :return: resolved value
+        """
+        key = repr(args)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = self._func(*args)
+            return self._values[key]
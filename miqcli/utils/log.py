@@ -14,12 +14,226 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import atexit
+import sys
+import threading
+import time
+
 import click
 
-__all__ = ['info', 'debug', 'error', 'warning', 'abort']
+from miqcli.constants import LOG_BUFFER_SIZE, LOG_FLUSH_INTERVAL
+
+__all__ = ['info', 'debug', 'error', 'warning', 'abort', 'flush', 'enabled',
+           'raw', 'set_level', 'set_machine_output', 'set_styled', 'DEBUG',
+           'INFO', 'WARNING', 'ERROR', 'LEVELS']
+
+#: logging levels
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+
+#: logging level names
+LEVELS = dict(debug=DEBUG, info=INFO, warning=WARNING, error=ERROR)
+
+# root context meta data key, set when the command writes machine readable
+# output (see set_machine_output)
+MACHINE_OUTPUT = 'miqcli.log.machine_output'
+
+
+class _Level(object):
+    """Logging level.
+
+    The level is resolved once per click context, from the root context
+    --log-level option (or --verbose, which is the debug level). Unless it
+    is set explicitly by set_level.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._ctx = None
+        self._value = INFO
+        self._explicit = False
+
+    @property
+    def value(self):
+        """Return the level for the current click context."""
+        if self._explicit:
+            return self._value
+
+        ctx = click.get_current_context(silent=True)
+        if ctx is not self._ctx:
+            self._ctx, self._value = ctx, self._resolve(ctx)
+        return self._value
+
+    @staticmethod
+    def _resolve(ctx):
+        """Resolve the level from the click context options."""
+        if ctx is None:
+            return INFO
+        params = ctx.find_root().params
+        if params.get('log_level'):
+            return LEVELS[params['log_level'].lower()]
+        if params.get('verbose'):
+            return DEBUG
+        return INFO
+
+    def set(self, level):
+        """Set the level (none resolves it from the click context again)."""
+        if isinstance(level, str):
+            level = LEVELS[level.lower()]
+        self._ctx, self._value = None, INFO if level is None else level
+        self._explicit = level is not None
+
+
+class _Route(object):
+    """Route of the log messages.
+
+    Log messages are written to stdout, along with the text output of the
+    commands. Commands writing machine readable output (jsonl, csv, json)
+    keep stdout for their records (see raw), log messages of every level
+    are then written to stderr. The route is resolved once per click
+    context, from the root context meta data.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._ctx = None
+        self._err = False
+
+    @property
+    def err(self):
+        """Return whether log messages are written to stderr."""
+        ctx = click.get_current_context(silent=True)
+        if ctx is not self._ctx:
+            self._ctx = ctx
+            self._err = ctx is not None and \
+                bool(ctx.find_root().meta.get(MACHINE_OUTPUT))
+        return self._err
+
+    def reset(self):
+        """Resolve the route from the click context again."""
+        self._ctx = None
+
+
+class _Sink(object):
+    """Buffered output sink.
+
+    Log lines accumulate in memory and are written in blocks, once size
+    lines are buffered or interval seconds after the first buffered line
+    (by a single flusher thread). The buffer is also flushed when the click
+    context closes, when the program exits and when logging errors (before
+    aborting).
+
+    Lines are only styled when the output is a terminal, which is checked
+    once when the sink is created.
+    """
+
+    def __init__(self, size=LOG_BUFFER_SIZE, interval=LOG_FLUSH_INTERVAL,
+                 err=False):
+        """Constructor.
+
+        :param size: number of lines buffered before they are written
+        :type size: int
+        :param interval: maximum seconds lines stay buffered
+        :type interval: float
+        :param err: write the lines to stderr instead of stdout
+        :type err: bool
+        """
+        self.size = size
+        self.interval = interval
+        self.err = err
+        self.styled = self._isatty()
+        self._lines = list()
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._deadline = None
+        self._thread = None
+
+    def _isatty(self):
+        """Check if the output is a terminal."""
+        try:
+            return (sys.stderr if self.err else sys.stdout).isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    @staticmethod
+    def _flush_on_close(sink):
+        """Flush the sink when the root click context closes."""
+        ctx = click.get_current_context(silent=True)
+        if ctx is None:
+            return
+        root = ctx.find_root()
+        key = 'miqcli.log.sink.err' if sink.err else 'miqcli.log.sink'
+        if not root.meta.get(key):
+            root.meta[key] = True
+            root.call_on_close(sink.flush)
+
+    def _run(self):
+        """Flusher thread, writes the lines buffered for interval seconds."""
+        with self._cond:
+            while True:
+                if self._deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - time.time()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                self.flush()
+
+    def _schedule(self):
+        """Flush the buffer in interval seconds (lock held)."""
+        self._deadline = time.time() + self.interval
+        if self._thread is None or not self._thread.is_alive():
+            # started once (again in a forked process)
+            self._thread = threading.Thread(target=self._run,
+                                            name='miqcli-log-flusher')
+            self._thread.daemon = True
+            self._thread.start()
+        self._cond.notify()
+
+    def write(self, message, bold=False, fg=None):
+        """Buffer a line.
 
+        :param message: line
+        :type message: str
+        :param bold: bold style text
+        :type bold: bool
+        :param fg: text foreground color
+        :type fg: str
+        """
+        if (bold or fg) and self.styled:
+            message = click.style(message, bold=bold, fg=fg)
 
-def __log(message, level, bold=False, fg=None):
+        with self._lock:
+            if not self._lines:
+                # once per buffer cycle, the buffer is flushed by the close
+                # of the context of its first line at the latest
+                self._flush_on_close(self)
+            self._lines.append(message)
+            if len(self._lines) >= self.size:
+                self.flush()
+            elif self._deadline is None:
+                self._schedule()
+
+    def flush(self):
+        """Write the buffered lines."""
+        with self._lock:
+            self._deadline = None
+            if not self._lines:
+                return
+            lines, self._lines = self._lines, list()
+            click.echo('\n'.join(lines), err=self.err)
+
+
+_sink = _Sink()
+_err_sink = _Sink(err=True)
+atexit.register(_sink.flush)
+atexit.register(_err_sink.flush)
+
+_level = _Level()
+_route = _Route()
+
+
+def __log(message, args, level, bold=False, fg=None):
     """Base function to log messages using click library.
 
     Function is private and not visible from other modules. Modules should
@@ -27,6 +241,8 @@ def __log(message, level, bold=False, fg=None):
 
     :param message: Message content
     :type message: str
+    :param args: Message arguments, formatted into the message (%)
+    :type args: tuple
     :param level: Logging level
     :type level: str
     :param bold: Bold style text
@@ -34,10 +250,85 @@ def __log(message, level, bold=False, fg=None):
     :param fg: Text foreground color
     :type fg: str
     """
-    click.secho('{0}: {1}'.format(level.upper(), message), bold=bold, fg=fg)
+    if args:
+        message = message % args
+    sink = _err_sink if _route.err else _sink
+    sink.write('{0}: {1}'.format(level.upper(), message), bold=bold, fg=fg)
+
+
+def flush():
+    """Write the buffered log messages."""
+    _sink.flush()
+    _err_sink.flush()
+
+
+def raw(line):
+    """Write a line as is (no level prefix, whatever the logging level).
+
+    Raw lines are used for machine readable output, they are the only lines
+    written to stdout once the command writes machine readable output (see
+    set_machine_output).
+
+    :param line: Line content
+    :type line: str
+    """
+    _sink.write(line)
+
+
+def enabled(level):
+    """Check if messages of the given level are logged.
+
+    :param level: Logging level
+    :type level: int
+    :return: True if messages are logged otherwise False
+    :rtype: bool
+    """
+    return _level.value <= level
+
+
+def set_level(level):
+    """Set the logging level.
+
+    By default the level is given by the --log-level (or --verbose) option.
+
+    :param level: Logging level (or level name), none to use the option
+    :type level: int
+    """
+    _level.set(level)
+
+
+def set_styled(styled):
+    """Set whether the messages are styled.
+
+    By default they are styled when the output is a terminal (checked once,
+    on import). Processes replacing their output set it explicitly.
+
+    :param styled: Style the messages, none to check the output again
+    :type styled: bool
+    """
+    for sink in (_sink, _err_sink):
+        sink.styled = sink._isatty() if styled is None else styled
+
+
+def set_machine_output(ctx=None):
+    """Write the log messages to stderr for the rest of the command.
+
+    Called once the command is known to write machine readable output, its
+    records (see raw) are then the only lines written to stdout.
+
+    :param ctx: Click context (the current context when none)
+    :type ctx: Namespace
+    """
+    ctx = ctx or click.get_current_context(silent=True)
+    if ctx is None:
+        return
+    # buffered messages are written to stdout, before any record
+    _sink.flush()
+    ctx.find_root().meta[MACHINE_OUTPUT] = True
+    _route.reset()
 
 
-def info(message):
+def info(message, *args):
     """Info level messages.
 
     Info messages should be used when the program needs to provide the user
@@ -46,27 +337,30 @@ def info(message):
 
     :param message: Message to print
     :type message: str
+    :param args: Message arguments, only formatted when the message is logged
     """
-    __log(message, 'info')
+    if _level.value <= INFO:
+        __log(message, args, 'info')
 
 
-def debug(message):
+def debug(message, *args):
     """Debug level messages.
 
     Debug messages should be used when the program wants to provide the
     user with more information at runtime. These can be good for explaining
     step by step a request being processed (if the user wishes to see the
     process). These messages by default will not be logged and only will be
-    logged when --verbose option is enabled.
+    logged when --verbose option (or --log-level debug) is enabled.
 
     :param message: Message content
     :type message: str
+    :param args: Message arguments, only formatted when the message is logged
     """
-    if click.get_current_context().find_root().params['verbose']:
-        __log(message, 'debug')
+    if _level.value <= DEBUG:
+        __log(message, args, 'debug')
 
 
-def error(message):
+def error(message, *args):
     """Error level messages.
 
     Error messages should be used when the program needs to alert the user
@@ -75,11 +369,13 @@ def error(message):
 
     :param message: Message content
     :type message: str
+    :param args: Message arguments, only formatted when the message is logged
     """
-    __log(message, 'error', bold=True, fg='red')
+    __log(message, args, 'error', bold=True, fg='red')
+    flush()
 
 
-def warning(message):
+def warning(message, *args):
     """Logs warning level messages.
 
     Warning messages should be used when the program needs to alert the user
@@ -88,8 +384,10 @@ def warning(message):
 
     :param message: Message content
     :type message: str
+    :param args: Message arguments, only formatted when the message is logged
     """
-    __log(message, 'warning', fg='yellow')
+    if _level.value <= WARNING:
+        __log(message, args, 'warning', fg='yellow')
 
 
 def abort(message, rc=1):
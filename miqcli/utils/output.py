@@ -0,0 +1,204 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Output module writes entities in machine readable formats."""
+
+import csv
+import json
+
+from miqcli._compat import StringIO
+from miqcli.utils import log
+
+__all__ = ['OUTPUT_FORMATS', 'get_writer', 'parse_fields', 'projection',
+           'record']
+
+#: output formats, text is the human readable output
+OUTPUT_FORMATS = ['text', 'jsonl', 'csv', 'json']
+
+
+def parse_fields(fields):
+    """Parse comma separated fields.
+
+    :param fields: comma separated fields
+    :type fields: str
+    :return: fields
+    :rtype: list
+    """
+    return [field.strip() for field in (fields or '').split(',')
+            if field.strip()]
+
+
+def projection(collection, attr=None, output='text', fields=None):
+    """Return the attributes to request for the entities written.
+
+    Only what is written is requested from the server: the name and the
+    attributes given for the text output (everything in verbose mode) and
+    the fields given for the machine readable outputs (everything when
+    none). Requesting every attribute along with the attributes given
+    requires the collection attributes (options request).
+
+    :param collection: collection object
+    :type collection: object
+    :param attr: attributes given
+    :type attr: tuple
+    :param output: output format
+    :type output: str
+    :param fields: comma separated fields
+    :type fields: str
+    :return: attributes to request, none for the default attributes
+    :rtype: tuple
+    """
+    attr = list(attr or [])
+    fields = parse_fields(fields)
+
+    if output != 'text' and fields:
+        selected = fields
+    elif output == 'text' and not log.enabled(log.DEBUG):
+        selected = ['name'] + attr
+    elif attr:
+        selected = collection.options()['attributes'] + attr
+    else:
+        return None
+
+    unique = list()
+    for name in selected:
+        if name not in unique:
+            unique.append(name)
+    return tuple(unique)
+
+
+def record(entity, fields=None):
+    """Return the record (dict) for an entity.
+
+    :param entity: entity
+    :type entity: object
+    :param fields: fields of the record (all the entity data when none)
+    :type fields: list
+    :return: record
+    :rtype: dict
+    """
+    data = entity._data
+    reload = getattr(entity, 'reload', None)
+    if reload is not None and \
+            ('id' not in data or fields and not set(fields) <= set(data)):
+        # entity is not (or only partially) loaded
+        reload()
+        data = entity._data
+    if not fields:
+        return dict(data)
+    return dict((field, data.get(field)) for field in fields)
+
+
+class Writer(object):
+    """Base writer.
+
+    Writers write one record per entity, as entities are given. Lines are
+    written through the log sink.
+    """
+
+    def __init__(self, fields=None):
+        """Constructor.
+
+        :param fields: fields written for each entity (all when none)
+        :type fields: list
+        """
+        self.fields = fields or None
+        self.count = 0
+
+    def write(self, entity):
+        """Write the record of an entity.
+
+        :param entity: entity
+        :type entity: object
+        """
+        self._write(record(entity, self.fields))
+        self.count += 1
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the output."""
+        log.flush()
+
+
+class JsonLinesWriter(Writer):
+    """JSON Lines writer, one JSON object per line."""
+
+    def _write(self, data):
+        log.raw(json.dumps(data, sort_keys=self.fields is None,
+                           default=str))
+
+
+class JsonWriter(Writer):
+    """JSON writer, a JSON array with one object per line."""
+
+    def _write(self, data):
+        prefix = ',' if self.count else '['
+        log.raw(prefix + json.dumps(data, sort_keys=self.fields is None,
+                                    default=str))
+
+    def close(self):
+        """Finish the output."""
+        log.raw(']' if self.count else '[]')
+        super(JsonWriter, self).close()
+
+
+class CsvWriter(Writer):
+    """CSV writer, a header line followed by one line per entity.
+
+    Without fields, the columns are the fields of the first entity.
+    """
+
+    def __init__(self, fields=None):
+        super(CsvWriter, self).__init__(fields)
+        self._buffer = StringIO()
+        self._csv = csv.writer(self._buffer, lineterminator='')
+
+    def _row(self, values):
+        self._csv.writerow(['' if v is None else v for v in values])
+        line = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        log.raw(line)
+
+    def _write(self, data):
+        if self.count == 0:
+            if self.fields is None:
+                self.fields = sorted(data)
+            self._row(self.fields)
+        self._row([data.get(field) for field in self.fields])
+
+
+def get_writer(output, fields=None):
+    """Return the writer for the given output format.
+
+    Log messages are written to stderr once a writer is returned, stdout
+    holds the records only.
+
+    :param output: output format
+    :type output: str
+    :param fields: comma separated fields written for each entity
+    :type fields: str
+    :return: writer or none for the text output
+    :rtype: Writer
+    """
+    fields = parse_fields(fields)
+    writers = dict(jsonl=JsonLinesWriter, json=JsonWriter, csv=CsvWriter)
+    if output in writers:
+        log.set_machine_output()
+        return writers[output](fields)
+    return None
@@ -0,0 +1,99 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Poll module polls the ManageIQ server until a condition is met."""
+
+import random
+import time
+
+from miqcli.constants import POLL_FACTOR, POLL_INITIAL, POLL_JITTER, \
+    POLL_MAXIMUM, POLL_TIMEOUT
+
+__all__ = ['backoff', 'poll', 'ticks']
+
+
+def backoff(initial=POLL_INITIAL, maximum=POLL_MAXIMUM, factor=POLL_FACTOR,
+            jitter=POLL_JITTER):
+    """Generate exponential backoff delays with jitter.
+
+    The delay grows by factor up to maximum seconds. A random fraction (up
+    to jitter) of each delay is cut so many clients polling at once do not
+    hit the server at the same time.
+
+    :param initial: first delay
+    :type initial: float
+    :param maximum: maximum delay
+    :type maximum: float
+    :param factor: factor the delay grows by
+    :type factor: float
+    :param jitter: maximum fraction of the delay randomly cut
+    :type jitter: float
+    :return: generator of delays (seconds)
+    """
+    delay = initial
+    while True:
+        yield delay - random.uniform(0, delay * jitter)
+        delay = min(maximum, delay * factor)
+
+
+def ticks(timeout=POLL_TIMEOUT, delays=None):
+    """Generate polling ticks until the timeout expires.
+
+    The first tick is generated right away, the following ones after each
+    backoff delay. The last delay is cut to the time left before the
+    timeout.
+
+    :param timeout: maximum seconds spent polling
+    :type timeout: float
+    :param delays: delays between ticks (defaults to backoff delays)
+    :type delays: iterator
+    :return: generator of ticks
+    """
+    if delays is None:
+        delays = backoff()
+    deadline = time.time() + timeout
+
+    while True:
+        yield
+
+        left = deadline - time.time()
+        if left <= 0:
+            return
+        time.sleep(min(next(delays), left))
+
+
+def poll(func, done, timeout=POLL_TIMEOUT, delays=None):
+    """Call a function until its result is done or the timeout expires.
+
+    The function is called on each polling tick (see ticks).
+
+    :param func: function polled
+    :type func: object
+    :param done: function returning whether the result is done
+    :type done: object
+    :param timeout: maximum seconds spent polling
+    :type timeout: float
+    :param delays: delays between calls (defaults to backoff delays)
+    :type delays: iterator
+    :return: whether the result is done and the last result
+    :rtype: tuple
+    """
+    result = None
+    for _ in ticks(timeout, delays):
+        result = func()
+        if done(result):
+            return True, result
+    return False, result
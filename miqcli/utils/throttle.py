@@ -0,0 +1,62 @@
+# Copyright (C) 2017 Red Hat, Inc.
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Throttle module limits the rate of requests sent to the server."""
+
+import threading
+import time
+
+__all__ = ['Throttle']
+
+
+class Throttle(object):
+    """Rate limiter spacing calls evenly.
+
+    At most rate calls per second are let through, callers (from any
+    thread) wait for their turn.
+
+    Usage:
+
+    .. code-block: python
+
+        throttle = Throttle(5)
+        for payload in payloads:
+            throttle.wait()
+            action(payload)
+    """
+
+    def __init__(self, rate=None):
+        """Constructor.
+
+        :param rate: maximum calls per second (no limit when none or 0)
+        :type rate: float
+        """
+        self._interval = 1.0 / rate if rate else 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Wait for the next call to be let through."""
+        if not self._interval:
+            return
+
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + self._interval
+
+        if start > now:
+            time.sleep(start - now)
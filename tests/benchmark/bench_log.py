@@ -0,0 +1,71 @@
+"""Benchmark the buffered log sink.
+
+Reports the timings only, run it by hand:
+
+    python tests/benchmark/bench_log.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from importlib import import_module
+
+import click
+import mock
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'functional'))
+
+from miqcli.utils import log  # noqa: E402
+
+from fake_server import FakeServer, pop_context, push_api_context  # noqa
+
+
+def bench_vms_query(count=50000):
+    """Report the lines/second of vms query against many vms."""
+    server = FakeServer(data=dict(vms=[
+        dict(id=i, name='vm%s' % i, vendor='openstack')
+        for i in range(1, count + 1)])).start()
+    vms = import_module('miqcli.collections.vms').Collections()
+    output = tempfile.TemporaryFile(mode='w+')
+    try:
+        push_api_context(server)
+        with mock.patch('sys.stdout', output):
+            start = time.time()
+            vms.query('', attr=(), page_size=1000)
+            log.flush()
+            elapsed = time.time() - start
+    finally:
+        pop_context()
+        server.stop()
+
+    output.seek(0)
+    lines = sum(1 for _ in output)
+    output.close()
+    print('vms query: %d lines in %.2fs (%d lines/s)' % (
+        lines, elapsed, lines / elapsed))
+
+
+def bench_sink(count=20000):
+    """Report buffered log lines against one write per line."""
+    output = tempfile.TemporaryFile(mode='w+')
+    with mock.patch('sys.stdout', output):
+        start = time.time()
+        for index in range(count):
+            click.secho('INFO: %s' % index)
+        unbuffered = time.time() - start
+
+        start = time.time()
+        for index in range(count):
+            log.info(index)
+        log.flush()
+        buffered = time.time() - start
+    output.close()
+    print('%d lines: buffered %.3fs, unbuffered %.3fs' % (
+        count, buffered, unbuffered))
+
+
+if __name__ == '__main__':
+    bench_vms_query()
+    bench_sink()
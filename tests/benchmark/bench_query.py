@@ -0,0 +1,32 @@
+"""Benchmark compiling queries against the eval based compiler.
+
+Reports the timings only, run it by hand:
+
+    python tests/benchmark/bench_query.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'functional'))
+
+from miqcli.query import compile_query  # noqa: E402
+
+from test_query import VM, eval_query  # noqa: E402
+
+
+def main(count=10000):
+    queries = [[('name', '=', 'vm%s' % i), '&', ('type', '=', VM), '&',
+                ('cloud_tenant_id', '=', str(i))] for i in range(count)]
+
+    old = timeit.timeit(
+        lambda: [eval_query(list(q)) for q in queries], number=1)
+    new = timeit.timeit(
+        lambda: [compile_query(q) for q in queries], number=1)
+    print('%d queries: compiled %.3fs, eval %.3fs' % (count, new, old))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,412 @@
+"""Fake ManageIQ REST API server used by the functional tests.
+
+The server runs in a background thread and keeps a log of every request it
+receives. Tests use it to assert how many round trips a command costs.
+"""
+
+import fnmatch
+import json
+import os
+import re
+import ssl
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+from click import Context
+from click.globals import pop_context, push_context
+
+import miqcli.collections
+from miqcli.api import ClientAPI
+
+#: token accepted by the fake server
+TOKEN = 'f4k3t0k3n'
+
+#: self signed certificate (and key) used by the tls server
+CERTIFICATE = os.path.join(os.path.dirname(__file__), '..', 'assets',
+                           'server.pem')
+
+#: every collection known by the cli
+COLLECTIONS = sorted(
+    name[:-3] for name in os.listdir(
+        os.path.dirname(miqcli.collections.__file__))
+    if name.endswith('.py') and not name.startswith('__'))
+
+FILTER = re.compile(r'^(or )?(\S+) (!=|<=|>=|=|<|>) (.*)$')
+
+
+def _parse_value(value):
+    """Convert a filter value to its python type."""
+    if value == 'NULL':
+        return None
+    if value[:1] in ('"', "'") and value[-1:] == value[:1]:
+        return value[1:-1]
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _lookup(entity, name):
+    """Return the value for a (possibly dotted) attribute name."""
+    value = entity
+    for part in name.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _match(entity, expression):
+    """Evaluate a single filter expression against an entity."""
+    is_or, name, op, value = FILTER.match(expression).groups()
+    actual, value = _lookup(entity, name), _parse_value(value)
+    if op == '=' and isinstance(value, str) and '*' in value:
+        result = fnmatch.fnmatchcase(str(actual), value)
+    elif op in ('=', '!='):
+        result = str(actual) == str(value)
+        if op == '!=':
+            result = not result
+    else:
+        result = {'<': actual < value, '<=': actual <= value,
+                  '>': actual > value, '>=': actual >= value}[op]
+    return bool(is_or), result
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    """Fake ManageIQ API server.
+
+    :param data: collection name to list of entities (dicts with an id)
+    :type data: dict
+    :param actions: collection name to list of supported actions
+    :type actions: dict
+    :param tls: serve https with a self signed certificate
+    :type tls: bool
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, data=None, actions=None, tls=False):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.data = data or {}
+        self.actions = actions or {}
+        self.requests = list()
+        # bodies of the post requests
+        self.payloads = list()
+        self.tokens = set([TOKEN])
+        self.created = 0
+        self.handshakes = 0
+        # whether collection queries support the attributes parameter
+        self.collection_attributes = True
+        # seconds each collection query takes
+        self.delay = 0
+        # maximum number of resources returned by a collection query
+        self.max_limit = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.tls = None
+        if tls:
+            self.tls = ssl.SSLContext(
+                getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+            self.tls.load_cert_chain(CERTIFICATE)
+
+    @property
+    def url(self):
+        """Base url of the server."""
+        return '%s://127.0.0.1:%s' % ('https' if self.tls else 'http',
+                                      self.server_address[1])
+
+    def get_request(self):
+        """Accept a connection, performing the tls handshake if enabled."""
+        sock, address = HTTPServer.get_request(self)
+        if self.tls:
+            sock = self.tls.wrap_socket(sock, server_side=True)
+            with self.lock:
+                self.handshakes += 1
+        return sock, address
+
+    def start(self):
+        """Serve requests in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Shutdown the server."""
+        self.shutdown()
+        self.server_close()
+
+    def reset(self):
+        """Clear the request log."""
+        with self.lock:
+            del self.requests[:]
+            del self.payloads[:]
+            self.handshakes = 0
+
+    def count(self, method=None, path=None, **params):
+        """Count the logged requests matching the given criteria.
+
+        :param method: http method
+        :param path: path relative to /api, e.g. 'vms' or 'vms/1'
+        :param params: query parameters that must be present (None means the
+            parameter must be absent)
+        """
+        total = 0
+        for _method, _path, _params in list(self.requests):
+            if method and method != _method:
+                continue
+            if path is not None and path != _path:
+                continue
+            matched = True
+            for key, value in params.items():
+                if value is None and key in _params:
+                    matched = False
+                elif value is not None and value is not True and \
+                        _params.get(key) != value:
+                    matched = False
+                elif value is True and key not in _params:
+                    matched = False
+            if matched:
+                total += 1
+        return total
+
+    def entity(self, collection, entity, attributes=None, project=False):
+        """Return the json representation of an entity.
+
+        Like ManageIQ, only the id, href and the attributes requested are
+        returned when attributes are given for a collection query.
+        """
+        href = '%s/api/%s/%s' % (self.url, collection, entity['id'])
+        output = dict(href=href)
+        for key, value in entity.items():
+            if project and attributes and \
+                    key not in attributes and key != 'id':
+                continue
+            if isinstance(value, (dict, list)) and \
+                    key not in (attributes or []):
+                # virtual attributes are only returned when requested
+                continue
+            output[key] = value
+        return output
+
+    def actions_for(self, collection, href):
+        """Return the actions list for a collection or entity."""
+        return [dict(name=name, method='post', href=href)
+                for name in self.actions.get(collection, [])]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Request handler for the fake server."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _parse(self):
+        url = urlparse(self.path)
+        path = url.path[len('/api/'):] if url.path.startswith('/api/') \
+            else ''
+        params = parse_qs(url.query)
+        flat = dict((k, v if k == 'filter[]' else v[0])
+                    for k, v in params.items())
+        with self.server.lock:
+            self.server.requests.append((self.command, path, flat))
+        return path, flat
+
+    def _authorized(self, path):
+        if path == 'auth':
+            return self.headers.get('Authorization') is not None
+        return self.headers.get('X-Auth-Token') in self.server.tokens
+
+    def _unauthorized(self):
+        self._reply(401, dict(error=dict(
+            kind='unauthorized', klass='Api::AuthenticationError',
+            message='Invalid Authentication Token')))
+
+    def do_GET(self):
+        path, params = self._parse()
+        if not self._authorized(path):
+            return self._unauthorized()
+        if path == '':
+            return self._reply(200, dict(
+                name='ManageIQ', version='2.4.0', versions=[],
+                collections=[
+                    dict(name=name, description=name,
+                         href='%s/api/%s' % (self.server.url, name))
+                    for name in COLLECTIONS]))
+        if path == 'auth':
+            return self._reply(200, dict(
+                auth_token=TOKEN, token_ttl=600,
+                expires_on='2099-01-01T00:00:00Z'))
+
+        parts = path.split('/')
+        name = parts[0]
+        entities = self.server.data.get(name, [])
+        attributes = params.get('attributes', '')
+        attributes = attributes.split(',') if attributes else []
+
+        if len(parts) == 2:
+            for entity in entities:
+                if str(entity['id']) == parts[1]:
+                    output = self.server.entity(name, entity, attributes)
+                    output['actions'] = self.server.actions_for(
+                        name, output['href'])
+                    return self._reply(200, output)
+            return self._reply(404, dict(error=dict(
+                kind='not_found', klass='ActiveRecord::RecordNotFound',
+                message='Couldn\'t find %s with id %s' % (name, parts[1]))))
+
+        # collection
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if attributes and not self.server.collection_attributes:
+            return self._reply(400, dict(error=dict(
+                kind='bad_request', klass='Api::BadRequestError',
+                message='Cannot expand attributes %s' % ','.join(
+                    attributes))))
+        resources = list(entities)
+        filters = params.get('filter[]', [])
+        if filters:
+            matched = []
+            for entity in resources:
+                result = None
+                for expression in filters:
+                    is_or, value = _match(entity, expression)
+                    if result is None:
+                        result = value
+                    elif is_or:
+                        result = result or value
+                    else:
+                        result = result and value
+                if result:
+                    matched.append(entity)
+            resources = matched
+        matching = len(resources)
+        offset = int(params.get('offset', 0))
+        limit = params.get('limit')
+        if self.server.max_limit is not None:
+            limit = min(int(limit or self.server.max_limit),
+                        self.server.max_limit)
+        if limit is not None:
+            resources = resources[offset:offset + int(limit)]
+        else:
+            resources = resources[offset:]
+
+        if params.get('expand') == 'resources':
+            # like ManageIQ, expanded resources list their actions
+            resources = [self.server.entity(name, e, attributes, True)
+                         for e in resources]
+            for resource in resources:
+                resource['actions'] = self.server.actions_for(
+                    name, resource['href'])
+        else:
+            resources = [dict(href='%s/api/%s/%s' % (
+                self.server.url, name, e['id'])) for e in resources]
+
+        # like ManageIQ, the subcount is the number of resources returned
+        href = '%s/api/%s' % (self.server.url, name)
+        output = dict(name=name, count=len(entities),
+                      subcount=len(resources), resources=resources,
+                      actions=self.server.actions_for(name, href))
+        if filters:
+            output['subquery_count'] = matching
+        self._reply(200, output)
+
+    def do_OPTIONS(self):
+        path, params = self._parse()
+        self._reply(200, dict(attributes=['id', 'name'], virtual_attributes=[],
+                              relationships=[], subcollections=[]))
+
+    def do_POST(self):
+        path, params = self._parse()
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        with self.server.lock:
+            self.server.payloads.append((path, body))
+        if not self._authorized(path):
+            return self._unauthorized()
+
+        parts = path.split('/')
+        name, action = parts[0], body.get('action')
+        if action == 'query':
+            attributes = params.get('attributes', '')
+            attributes = attributes.split(',') if attributes else []
+            ids = [r.get('id') or r['href'].rstrip('/').split('/')[-1]
+                   for r in body.get('resources', [])]
+            entities = dict((str(e['id']), e)
+                            for e in self.server.data.get(name, []))
+            return self._reply(200, dict(results=[
+                self.server.entity(name, entities[str(_id)], attributes)
+                for _id in ids]))
+        if len(parts) == 2:
+            return self._reply(200, dict(
+                success=True, message='%s %s' % (action, parts[1]),
+                task_id=parts[1], href='%s/api/%s' % (self.server.url, path),
+                task_href='%s/api/tasks/%s' % (self.server.url, parts[1])))
+        if 'resources' in body:
+            results = []
+            for resource in body['resources']:
+                if 'id' not in resource and 'href' not in resource:
+                    # create action
+                    with self.server.lock:
+                        self.server.created += 1
+                        _id = str(self.server.created)
+                    results.append(dict(id=_id, href='%s/api/%s/%s' % (
+                        self.server.url, name, _id)))
+                    continue
+                _id = resource.get('id') or \
+                    resource.get('href', '').rstrip('/').split('/')[-1]
+                results.append(dict(
+                    success=True, message='%s %s' % (action, _id),
+                    task_id=str(_id), href='%s/api/%s/%s' % (
+                        self.server.url, name, _id),
+                    task_href='%s/api/tasks/%s' % (self.server.url, _id)))
+            return self._reply(200, dict(results=results))
+        return self._reply(200, dict(results=[dict(
+            id='1', href='%s/api/%s/1' % (self.server.url, name))]))
+
+
+def push_api_context(server, verbose=False):
+    """Connect a client api to the server and push a click context.
+
+    Collections access the client api pointer from the click context. This
+    mirrors what miqcli.Client does, without touching the token file.
+
+    :param server: fake server
+    :type server: FakeServer
+    :param verbose: verbose mode
+    :type verbose: bool
+    :return: the pushed click context
+    """
+    from miqcli.cli.main import ManageIQ
+
+    api = ClientAPI(dict(url=server.url, token=TOKEN, cache=False))
+    api._connect()
+
+    ctx = Context(ManageIQ())
+    ctx.params['verbose'] = verbose
+    setattr(ctx, 'client_api', api)
+    push_context(ctx)
+    return ctx
+
+
+__all__ = ['FakeServer', 'TOKEN', 'push_api_context', 'pop_context']
@@ -1,6 +1,8 @@
 import os
+import shutil
 import stat
 import tempfile
+import time
 
 from unittest import TestCase
 from requests.exceptions import ConnectionError
@@ -9,6 +11,8 @@ from nose.tools import assert_is_none, assert_equal, raises
 
 from miqcli import api
 
+from fake_server import FakeServer, TOKEN
+
 #: token value from tests/assets/auth_token
 AUTH_TOKEN_VALUE = '78asdjasd7nasd90asdmzxc90'
 
@@ -112,7 +116,7 @@ class TestApi(TestCase):
         """Test api.ClientAPI._get_from_auth_file when file doesn't exit"""
         assert_is_none(self.cli_emptysettings._get_from_auth_file())
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_clientapi_validate_token(self, mock_requests_get_func):
         """Test api.ClientAPI._valid_token function"""
         # mock a valid token (response 200)
@@ -127,7 +131,7 @@ class TestApi(TestCase):
             False)
 
     @mock.patch('miqcli.api.TOKENFILE', 'tests/assets/auth_token')
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_clientapi_build_token_none_is_given(self, mock_requests_get_func):
         """Test api.ClientAPI._build_token function when none is given"""
         # mock a valid token (response 200)
@@ -137,7 +141,7 @@ class TestApi(TestCase):
         assert_equal(new_client.token, AUTH_TOKEN_VALUE)
 
     @raises(SystemExit)
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_clientapi_build_token_invalid_is_given(
         self, mock_requests_get_func):
         """Test api.ClientAPI._build_token func when given token is not valid"""
@@ -159,7 +163,7 @@ class TestApi(TestCase):
         new_client._generate_token()
 
     @raises(SystemExit)
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_clientapi_generate_token_auth_fails(self, mock_requests_get_func):
         """Test api.ClientAPI._generate_token when authentication fails"""
         mock_requests_get_func.return_value.status_code = 401
@@ -167,9 +171,196 @@ class TestApi(TestCase):
         new_client._generate_token()
 
     @raises(SystemExit)
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_clientapi_generate_token_conn_error(self, mock_requests_get_func):
         """Test api.ClientAPI._generate_token throws ConnectionError"""
         mock_requests_get_func.side_effect = ConnectionError()
         new_client = api.ClientAPI({})
         new_client._generate_token()
+
+
+class TestOptimisticAuth(TestCase):
+    """Test API module optimistic authentication"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.token_file = os.path.join(self.tmpdir, 'auth')
+        self.patcher = mock.patch('miqcli.api.TOKENFILE', self.token_file)
+        self.patcher.start()
+        self.server.reset()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, token, expires=None):
+        api.ClientAPI._set_auth_file(token, expires)
+
+    @mock.patch('requests.Session.get')
+    def test_build_token_skips_validation(self, mock_requests_get_func):
+        """Test api.ClientAPI._build_token uses the auth file token as is"""
+        self._write(AUTH_TOKEN_VALUE)
+        new_client = api.ClientAPI({})
+        new_client._build_token()
+        assert_equal(new_client.token, AUTH_TOKEN_VALUE)
+        assert_equal(mock_requests_get_func.call_count, 0)
+
+    @mock.patch('requests.Session.get')
+    def test_build_token_validates_when_disabled(self, mock_requests_get_func):
+        """Test api.ClientAPI._build_token validates without optimistic auth"""
+        mock_requests_get_func.return_value.status_code = 200
+        self._write(AUTH_TOKEN_VALUE)
+        new_client = api.ClientAPI({'optimistic_auth': False})
+        new_client._build_token()
+        assert_equal(mock_requests_get_func.call_count, 1)
+
+    def test_build_token_expired(self):
+        """Test api.ClientAPI._build_token generates a token once expired"""
+        self._write(AUTH_TOKEN_VALUE, time.time() - 1)
+        new_client = api.ClientAPI({'url': self.server.url})
+        new_client._build_token()
+        assert_equal(new_client.token, TOKEN)
+        assert_equal(self.server.count('GET', 'auth'), 1)
+        assert_equal(self.server.count('GET', ''), 0)
+        assert new_client.expired() is False
+
+    def test_set_auth_file_removes_expiry(self):
+        """Test api.ClientAPI._set_auth_file drops a previous token expiry"""
+        self._write(AUTH_TOKEN_VALUE, time.time() - 1)
+        self._write(TOKEN)
+        new_client = api.ClientAPI({})
+        assert new_client._get_token_expiry() is None
+        assert not os.path.exists(self.token_file + '.expires')
+
+    def test_build_token_keeps_expiry(self):
+        """Test api.ClientAPI._build_token keeps the saved token expiry"""
+        expires = time.time() + 600
+        self._write(AUTH_TOKEN_VALUE, expires)
+        new_client = api.ClientAPI({})
+        new_client._build_token()
+        with open(self.token_file + '.expires') as fp:
+            assert_equal(float(fp.read()), expires)
+
+    def test_build_token_loads_expiry(self):
+        """Test api.ClientAPI._build_token loads the saved token expiry"""
+        expires = time.time() + 600
+        self._write(AUTH_TOKEN_VALUE, expires)
+        new_client = api.ClientAPI({})
+        new_client._build_token()
+        assert_equal(new_client._token_expires, expires)
+        assert new_client.expired() is False
+        with mock.patch('miqcli.api.time.time', return_value=expires):
+            assert new_client.expired() is True
+
+    def test_connect_valid_token(self):
+        """Test api.ClientAPI.connect costs one request for a valid token"""
+        self._write(TOKEN)
+        new_client = api.ClientAPI({'url': self.server.url})
+        new_client.connect()
+        assert_equal(self.server.count(), 1)
+        assert_equal(self.server.count('GET', ''), 1)
+
+    def test_connect_rejected_token(self):
+        """Test api.ClientAPI.connect generates a token when rejected"""
+        self._write(AUTH_TOKEN_VALUE)
+        new_client = api.ClientAPI({'url': self.server.url})
+        new_client.connect()
+        assert_equal(new_client.token, TOKEN)
+        assert_equal(new_client._get_from_auth_file(), TOKEN)
+        assert_equal(self.server.count('GET', 'auth'), 1)
+        assert_equal(self.server.count('GET', ''), 2)
+        assert new_client.client.collections.providers is not None
+
+    def test_connect_rejected_again(self):
+        """Test api.ClientAPI authenticates again on a later 401"""
+        self._write(AUTH_TOKEN_VALUE)
+        new_client = api.ClientAPI({'url': self.server.url})
+        new_client.connect()
+        try:
+            # the server rejects the token generated on the first 401
+            self.server.tokens = set(['second'])
+            with mock.patch.object(new_client, '_generate_token',
+                                   return_value='second'):
+                new_client.client.get(self.server.url + '/api/providers')
+        finally:
+            self.server.tokens = set([TOKEN])
+        assert_equal(new_client.token, 'second')
+        assert_equal(new_client._get_from_auth_file(), 'second')
+
+    @raises(SystemExit)
+    def test_connect_rejected_once(self):
+        """Test api.ClientAPI.connect authenticates again only once"""
+        self._write(AUTH_TOKEN_VALUE)
+        new_client = api.ClientAPI({'url': self.server.url})
+        with mock.patch.object(new_client, '_generate_token',
+                               return_value='invalid'):
+            new_client.connect()
+
+
+class TestSession(TestCase):
+    """Test API module http session"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=dict(zones=[dict(id=1, name='default')]),
+                                tls=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patcher = mock.patch('miqcli.api.TOKENFILE',
+                                  os.path.join(self.tmpdir, 'auth'))
+        self.patcher.start()
+        # ca bundles from the environment take precedence over the session
+        # verify setting, the certificate of the server is self signed
+        self.environ = mock.patch.dict(os.environ)
+        self.environ.start()
+        os.environ.pop('REQUESTS_CA_BUNDLE', None)
+        os.environ.pop('CURL_CA_BUNDLE', None)
+        self.server.reset()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.patcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_session_property(self):
+        """Test api.ClientAPI.session property is built once"""
+        new_client = api.ClientAPI({'pool_size': 2, 'retries': 1})
+        assert new_client.session is new_client.session
+        adapter = new_client.session.get_adapter('https://localhost')
+        assert_equal(adapter.max_retries.total, 1)
+        assert_equal(adapter._pool_maxsize, 2)
+
+    def test_single_handshake(self):
+        """Test api.ClientAPI sends every request over one connection"""
+        new_client = api.ClientAPI({'url': self.server.url})
+        new_client.connect()
+        zones = new_client.client.collections.zones
+        for _ in range(5):
+            zones.query_string(expand='resources')
+
+        # auth, entry point and the collection queries
+        assert_equal(self.server.count('GET', 'auth'), 1)
+        assert_equal(self.server.count('GET', 'zones'), 5)
+        assert_equal(self.server.handshakes, 1)
+
+    def test_single_handshake_validating_token(self):
+        """Test validating a token reuses the connection of the client"""
+        new_client = api.ClientAPI({'url': self.server.url, 'token': TOKEN})
+        new_client.connect()
+        new_client.client.collections.zones.query_string()
+
+        assert_equal(self.server.count('GET', ''), 2)
+        assert_equal(self.server.handshakes, 1)
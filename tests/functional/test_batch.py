@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from click.testing import CliRunner
+from nose.tools import assert_equal, assert_in
+
+from miqcli.api import connections
+from miqcli.cli.launcher import _local
+from miqcli.cli.main import cli
+
+from fake_server import FakeServer, TOKEN
+
+ZONES = [dict(id=1, name='default', description='Default Zone')]
+
+
+class TestBatch(TestCase):
+    """Test running many commands within one process."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=dict(zones=ZONES)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.directory = tempfile.mkdtemp()
+        self.results = os.path.join(self.directory, 'results.jsonl')
+
+    def tearDown(self):
+        connections.clear()
+        shutil.rmtree(self.directory)
+
+    def _batch(self, *lines, **kwargs):
+        path = os.path.join(self.directory, 'commands.txt')
+        with open(path, 'w') as fp:
+            fp.write('\n'.join(lines) + '\n')
+        args = ['--url', self.server.url, '--token', TOKEN, 'batch', '-f',
+                path, '--results', self.results] + kwargs.get('args', [])
+        return CliRunner().invoke(cli, args)
+
+    def _results(self):
+        with open(self.results) as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_batch(self):
+        """Test the commands share one connection"""
+        result = self._batch('# zones', 'zones query', '', 'zones query')
+
+        assert_equal(result.exit_code, 0)
+        assert_equal([(r['line'], r['command'], r['exit'])
+                      for r in self._results()],
+                     [(2, 'zones query', 0), (4, 'zones query', 0)])
+        assert_equal(self.server.count('GET', 'zones'), 2)
+        assert_equal(self.server.count('GET', ''), 2)
+        assert_equal(len(connections), 1)
+        assert_in('INFO: 2 of 2 commands succeeded.', result.output)
+
+    def test_batch_failed(self):
+        """Test failing commands are reported, following commands run"""
+        result = self._batch('nope', 'zones query')
+
+        assert_equal(result.exit_code, 1)
+        assert_equal([r['exit'] for r in self._results()], [1, 0])
+        assert_in('ERROR: 1 of 2 commands failed.', result.output)
+
+    def test_batch_stop_on_error(self):
+        """Test the batch stops at the first failing command"""
+        result = self._batch('nope', 'zones query',
+                             args=['--stop-on-error'])
+
+        assert_equal(result.exit_code, 1)
+        assert_equal([r['exit'] for r in self._results()], [1])
+        assert_equal(self.server.count('GET', 'zones'), 0)
+
+    def test_batch_invalid_line(self):
+        """Test an invalid line aborts before running any command"""
+        result = self._batch('zones query', 'vms query "vm')
+
+        assert_equal(result.exit_code, 1)
+        assert_in('Line 2: No closing quotation.', result.output)
+        assert_equal(self.server.count('GET', 'zones'), 0)
+
+    def test_batch_builtin_command(self):
+        """Test built-in commands can not run within a batch"""
+        result = self._batch('--verbose batch -f commands.txt')
+
+        assert_equal(result.exit_code, 1)
+        assert_in('Line 1: the batch command can not run within a batch.',
+                  result.output)
+
+    def test_batch_stdin(self):
+        """Test the commands are read from the standard input"""
+        result = CliRunner().invoke(
+            cli, ['--url', self.server.url, '--token', TOKEN, 'batch'],
+            input='zones query\n')
+
+        assert_equal(result.exit_code, 0)
+        assert_equal(self.server.count('GET', 'zones'), 1)
+
+    def test_local(self):
+        """Test batches reading the standard input are not forwarded"""
+        assert _local(['batch'])
+        assert _local(['batch', '-f', '-'])
+        assert not _local(['batch', '-f', 'commands.txt'])
+        assert not _local(['--verbose', 'batch', '--file=commands.txt'])
+        assert _local(['daemon', 'start'])
+        assert not _local(['vms', 'query'])
@@ -0,0 +1,170 @@
+import json
+from importlib import import_module
+from unittest import TestCase
+
+import mock
+from manageiq_client.api import APIException
+from nose.tools import assert_equal, raises
+
+from miqcli.utils import log
+
+from fake_server import FakeServer, pop_context, push_api_context
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+VMS = [dict(id=i, name='test-%d' % i if i % 2 else 'prod-%d' % i)
+       for i in range(1, 11)]
+
+
+class TestBulkActions(TestCase):
+    """Test running actions on many resources."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=dict(vms=VMS, instances=VMS)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        self.server.reset()
+        self.vms = import_module('miqcli.collections.vms').Collections()
+        self.stdout = StringIO()
+        self.patcher = mock.patch('sys.stdout', self.stdout)
+        self.patcher.start()
+
+    def tearDown(self):
+        log.flush()
+        self.patcher.stop()
+        pop_context()
+
+    def _lines(self):
+        log.flush()
+        return self.stdout.getvalue().splitlines()
+
+    def _posted(self, path):
+        return [body for _path, body in self.server.payloads
+                if _path == path]
+
+    def test_delete_from_file(self):
+        """Test vms listed in a file are deleted by chunked requests"""
+        results = self.vms.delete('', from_file=StringIO('1\n2\n\n# 9\n3\n'
+                                                         '2\n4\n5\n'),
+                                  chunk_size=2)
+
+        assert_equal([r['id'] for r in results], ['1', '2', '3', '4', '5'])
+        assert_equal([r['task_id'] for r in results],
+                     ['1', '2', '3', '4', '5'])
+        assert all(r['success'] for r in results)
+
+        posted = self._posted('vms')
+        assert_equal([body['action'] for body in posted], ['delete'] * 3)
+        assert_equal([len(body['resources']) for body in posted], [2, 2, 1])
+        assert_equal(self.server.count('GET', 'vms'), 0)
+        assert 'INFO: Task to delete 3 created: 3' in self._lines()
+
+    def test_delete_filter(self):
+        """Test filtered vms are deleted, found by a single query"""
+        results = self.vms.delete('', filters=('name = test-*',))
+
+        assert_equal([(r['id'], r['name']) for r in results],
+                     [(str(i), 'test-%d' % i) for i in (1, 3, 5, 7, 9)])
+        assert_equal(self.server.count('GET', 'vms'), 1)
+        assert_equal(len(self._posted('vms')), 1)
+        assert 'INFO: Task to delete test-3 (3) created: 3' in self._lines()
+
+    def test_delete_jsonl(self):
+        """Test the results are written one record per vm"""
+        self.vms.delete('', from_file=StringIO('1\n2\n'), output='jsonl',
+                        fields='id,success,task_id')
+
+        assert_equal([json.loads(line) for line in self._lines()], [
+            dict(id='1', success=True, task_id='1'),
+            dict(id='2', success=True, task_id='2')])
+
+    def test_delete_failed_chunk(self):
+        """Test a failing request fails its chunk only"""
+        api = self.ctx.client_api.client
+        post = api.post
+        calls = iter([APIException('boom'), None])
+
+        def side_effect(*args, **kwargs):
+            error = next(calls, None)
+            if error is not None:
+                raise error
+            return post(*args, **kwargs)
+
+        with mock.patch.object(api, 'post', side_effect=side_effect):
+            try:
+                self.vms.delete('', from_file=StringIO('1\n2\n3\n'),
+                                chunk_size=2)
+            except SystemExit:
+                pass
+            else:
+                raise AssertionError('delete did not abort')
+
+        lines = self._lines()
+        assert 'ERROR: Unable to delete 1: boom' in lines
+        assert 'INFO: Task to delete 3 created: 3' in lines
+        assert 'ERROR: 2 of 3 vms failed to delete.' in lines
+
+    @raises(SystemExit)
+    def test_delete_name_and_file(self):
+        """Test a vm name can not be given along with a file"""
+        self.vms.delete('test-1', from_file=StringIO('1\n'))
+
+    @raises(SystemExit)
+    def test_delete_nothing_found(self):
+        """Test a filter matching no vm aborts"""
+        self.vms.delete('', filters=('name = none',))
+
+    def test_terminate_from_file(self):
+        """Test instances listed in a file are terminated"""
+        instances = import_module(
+            'miqcli.collections.instances').Collections()
+        results = instances.terminate('', from_file=StringIO('1\n2\n'))
+
+        assert_equal(len(results), 2)
+        assert_equal([body['action'] for body in self._posted('instances')],
+                     ['terminate'])
+
+    def test_stop_ids(self):
+        """Test vms given by their ids are stopped by chunked requests"""
+        results = self.vms.stop(('1', '2', '3'), chunk_size=2)
+
+        assert_equal([r['task_id'] for r in results], ['1', '2', '3'])
+        posted = self._posted('vms')
+        assert_equal([body['action'] for body in posted], ['stop'] * 2)
+        assert_equal([len(body['resources']) for body in posted], [2, 1])
+        assert_equal(self.server.count('GET', 'vms'), 0)
+
+    def test_start_filter(self):
+        """Test filtered vms are started along with the ids given"""
+        results = self.vms.start(('2',), filters=('name = test-*',))
+
+        assert_equal([r['id'] for r in results],
+                     ['2', '1', '3', '5', '7', '9'])
+        assert_equal(len(self._posted('vms')), 1)
+
+    def test_reboot_guest(self):
+        """Test the action name is reported readable"""
+        self.vms.reboot_guest(('/api/vms/4',))
+
+        assert_equal(self._posted('vms')[0]['resources'][0]['href'],
+                     '%s/api/vms/4' % self.server.url)
+        assert 'INFO: Task to reboot guest 4 created: 4' in self._lines()
+
+    @raises(SystemExit)
+    def test_power_nothing_given(self):
+        """Test a power action on no vm aborts"""
+        self.vms.suspend(())
+
+    @raises(SystemExit)
+    def test_power_invalid_chunk_size(self):
+        """Test a chunk size lower than 1 aborts"""
+        self.vms.pause(('1',), chunk_size=0)
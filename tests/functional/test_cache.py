@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+from nose.tools import assert_equal, assert_is_none
+
+from miqcli.cache import ResolutionCache
+from miqcli.provider import Flavors, provider_types
+
+from fake_server import FakeServer, pop_context, push_api_context
+
+OSP = 'ManageIQ::Providers::Openstack::CloudManager'
+
+
+class TestResolutionCache(TestCase):
+    """Test the persistent resolution cache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key(self):
+        """Test the cache key holds url, collection, type, name and tenant"""
+        assert_equal(ResolutionCache.key('url', 'flavors', 'type', 'small'),
+                     'url|flavors|type|small|')
+        assert_equal(ResolutionCache.key('url', 'networks', 'type', 'net', 1),
+                     'url|networks|type|net|1')
+
+    def test_persistent(self):
+        """Test values are persisted between cache instances"""
+        ResolutionCache(self.path).put('key', 10)
+        assert_equal(ResolutionCache(self.path).get('key'), 10)
+        assert_is_none(ResolutionCache(self.path).get('other'))
+
+    @mock.patch('miqcli.cache.time.time')
+    def test_ttl(self, mock_time):
+        """Test expired entries are removed"""
+        cache = ResolutionCache(self.path, ttl=60)
+        mock_time.return_value = 1000
+        cache.put('key', 10)
+        mock_time.return_value = 1060
+        assert_equal(cache.get('key'), 10)
+        mock_time.return_value = 1061
+        assert_is_none(cache.get('key'))
+        assert_equal(len(ResolutionCache(self.path)), 0)
+
+    @mock.patch('miqcli.cache.time.time')
+    def test_lru_eviction(self, mock_time):
+        """Test the least recently used entries are evicted"""
+        cache = ResolutionCache(self.path, size=2)
+        mock_time.return_value = 1
+        cache.put('a', 1)
+        mock_time.return_value = 2
+        cache.put('b', 2)
+        mock_time.return_value = 3
+        cache.get('a')
+        mock_time.return_value = 4
+        cache.put('c', 3)
+
+        cache = ResolutionCache(self.path, size=2)
+        assert_equal(len(cache), 2)
+        assert_equal(cache.get('a'), 1)
+        assert_is_none(cache.get('b'))
+        assert_equal(cache.get('c'), 3)
+
+    def test_get_does_not_write(self):
+        """Test reading entries does not write the cache file"""
+        cache = ResolutionCache(self.path)
+        cache.put('key', 1)
+
+        with mock.patch.object(cache, '_write') as write:
+            for _ in range(3):
+                assert_equal(cache.get('key'), 1)
+        assert_equal(write.call_count, 0)
+
+    def test_invalidate(self):
+        """Test invalidating removes the server entries of the type"""
+        cache = ResolutionCache(self.path)
+        osp = 'ManageIQ::Providers::Openstack::CloudManager::Flavor'
+        aws = 'ManageIQ::Providers::Amazon::CloudManager::Flavor'
+        keys = [cache.key('https://a/api', 'flavors', osp, 'm1'),
+                cache.key('https://a/api', 'flavors', aws, 't2'),
+                cache.key('https://b/api', 'flavors', osp, 'm1')]
+        for value, key in enumerate(keys):
+            cache.put(key, value)
+
+        cache.invalidate('https://a/api', '::Openstack::')
+        assert_equal([ResolutionCache(self.path).get(key) for key in keys],
+                     [None, 1, 2])
+
+        cache.invalidate('https://a/api')
+        assert_equal(len(ResolutionCache(self.path)), 1)
+
+    def test_atomic_write(self):
+        """Test no temporary files are left behind"""
+        cache = ResolutionCache(self.path)
+        for i in range(10):
+            cache.put('key%s' % i, i)
+        assert_equal(os.listdir(self.directory), ['cache.json'])
+        with open(self.path) as fp:
+            assert_equal(len(json.load(fp)), 10)
+
+    def test_corrupt_file(self):
+        """Test a corrupt cache file is an empty cache"""
+        with open(self.path, 'w') as fp:
+            fp.write('{not json')
+        cache = ResolutionCache(self.path)
+        assert_is_none(cache.get('key'))
+        cache.put('key', 1)
+        assert_equal(ResolutionCache(self.path).get('key'), 1)
+
+    def test_clear(self):
+        """Test clearing the cache"""
+        cache = ResolutionCache(self.path)
+        cache.put('key', 1)
+        cache.clear()
+        assert_equal(len(cache), 0)
+        assert not os.path.exists(self.path)
+        cache.clear()
+
+
+class TestProviderResolutionCache(TestCase):
+    """Test provider components use the resolution cache."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=dict(
+            providers=[dict(id=1, name='OpenStack', type=OSP)],
+            flavors=[dict(id=20, name='m1.small', type=OSP + '::Flavor')]
+        )).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ctx = push_api_context(self.server)
+        self.api = self.ctx.client_api
+        self.api._cache = ResolutionCache(
+            os.path.join(self.directory, 'cache.json'))
+        self.api._cache_enabled = True
+        provider_types.invalidate()
+
+    def tearDown(self):
+        pop_context()
+        shutil.rmtree(self.directory)
+
+    def test_get_id_is_cached(self):
+        """Test resolved ids are read from the cache"""
+        assert_equal(Flavors('OpenStack', self.api).get_id('m1.small'), 20)
+        self.server.reset()
+        assert_equal(Flavors('OpenStack', self.api).get_id('m1.small'), 20)
+        assert_equal(self.server.count('GET', 'flavors'), 0)
+        assert_equal(self.server.count('GET', 'flavors/20'), 0)
@@ -0,0 +1,76 @@
+import subprocess
+import sys
+from unittest import TestCase, skipIf
+
+import mock
+from nose.tools import assert_equal
+
+from miqcli import constants
+
+#: modules reading the package metadata
+METADATA_MODULES = ('pkg_resources', 'importlib.metadata',
+                    'importlib_metadata')
+
+# prints the modules imported by a module, click is imported beforehand as
+# every cli run needs it anyway
+LIST_IMPORTS = """
+import sys
+import click
+before = set(sys.modules)
+import {0}
+sys.stdout.write(','.join(sorted(set(sys.modules) - before)))
+"""
+
+
+class TestVersion(TestCase):
+    """Test the lazy version lookup."""
+
+    def setUp(self):
+        self.patcher = mock.patch.object(constants, '_version', None)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_version(self):
+        """Test the version is looked up once"""
+        with mock.patch.object(constants, '_lookup_version',
+                               return_value='1.2.3') as lookup:
+            assert_equal(constants.get_version(), '1.2.3')
+            assert_equal(constants.get_version(), '1.2.3')
+        assert_equal(lookup.call_count, 1)
+
+    def test_version_not_installed(self):
+        """Test the version of a package not installed"""
+        with mock.patch.object(constants, '_lookup_version',
+                               return_value=None):
+            assert_equal(constants.get_version(), '0.0.0dev1')
+
+
+class TestImports(TestCase):
+    """Test the imports of the modules imported by every invocation."""
+
+    def test_constants_imports(self):
+        """Test importing the constants does not import the metadata"""
+        output = subprocess.check_output(
+            [sys.executable, '-c', LIST_IMPORTS.format('miqcli.constants')])
+        imported = output.decode('utf-8').split(',')
+
+        assert 'miqcli.constants' in imported
+        for name in METADATA_MODULES:
+            assert name not in imported, '{0} imported'.format(name)
+
+    @skipIf(sys.version_info < (3, 5), 'importlib.util is needed')
+    def test_constants_import_without_metadata(self):
+        """Test importing the constants does not read the package metadata"""
+        code = (
+            'import sys\n'
+            'sys.modules["pkg_resources"] = None\n'
+            'sys.modules["importlib.metadata"] = None\n'
+            'sys.modules["importlib_metadata"] = None\n'
+            'from importlib.util import module_from_spec, '
+            'spec_from_file_location\n'
+            'spec = spec_from_file_location("constants", {0!r})\n'
+            'spec.loader.exec_module(module_from_spec(spec))\n'
+        ).format(constants.__file__)
+        subprocess.check_call([sys.executable, '-c', code])
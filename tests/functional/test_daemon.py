@@ -0,0 +1,194 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+import mock
+from click.testing import CliRunner
+from nose.tools import assert_equal, assert_in, assert_is, assert_is_none, \
+    raises
+
+from miqcli.api import Connections, connections
+from miqcli.cli.launcher import main
+from miqcli.cli.main import cli
+from miqcli.daemon import DaemonServer, control, forward
+
+from fake_server import FakeServer, TOKEN
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+ZONES = [dict(id=1, name='default', description='Default Zone')]
+
+
+class TestDaemon(TestCase):
+    """Test running commands within the daemon."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=dict(zones=ZONES)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'daemon.sock')
+        self.daemon = DaemonServer(self.path)
+        self.daemon.bind()
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        self.argv = ['--url', self.server.url, '--token', TOKEN]
+
+    def tearDown(self):
+        control('stop', self.path)
+        self.thread.join()
+        connections.clear()
+        shutil.rmtree(self.directory)
+
+    def _forward(self, *argv):
+        output = StringIO()
+        rc = forward(self.argv + list(argv), self.path, output, output)
+        return rc, output.getvalue()
+
+    def test_forward(self):
+        """Test the command output and exit code are sent back"""
+        rc, output = self._forward('zones', 'query')
+
+        assert_equal(rc, 0)
+        assert_in('INFO:  * Description: Default Zone', output.splitlines())
+
+    def test_forward_reuses_connection(self):
+        """Test following commands reuse the connection"""
+        self._forward('zones', 'query')
+        connect = self.server.count('GET', '')
+
+        rc, output = self._forward('zones', 'query')
+
+        assert_equal(rc, 0)
+        assert_equal(self.server.count('GET', ''), connect)
+        assert_equal(self.server.count('GET', 'zones'), 2)
+        assert_equal(control('status', self.path)['connections'], 1)
+
+    def test_forward_invalid_command(self):
+        """Test a failing command exit code is sent back"""
+        rc, output = self._forward('nope')
+
+        assert_equal(rc, 1)
+        assert_in('Command "nope" is invalid', output)
+
+    def test_forward_environment(self):
+        """Test the configuration environment variable is forwarded"""
+        self.argv = []
+        env = repr(dict(url=self.server.url, token=TOKEN))
+        with mock.patch.dict(os.environ, dict(MIQ_CFG=env)):
+            rc, output = self._forward('zones', 'query')
+
+        assert_equal(rc, 0)
+        assert_equal(self.server.count('GET', 'zones'), 1)
+
+    def test_forward_no_daemon(self):
+        """Test commands are not forwarded when no daemon runs"""
+        assert_is_none(forward(['zones', 'query'],
+                               os.path.join(self.directory, 'none.sock')))
+
+    def test_status(self):
+        """Test the daemon status"""
+        self._forward('zones', 'query')
+        status = control('status', self.path)
+
+        assert_equal(status['pid'], os.getpid())
+        assert_equal(status['commands'], 1)
+
+    def test_stop(self):
+        """Test stopping the daemon removes its socket"""
+        control('stop', self.path)
+        self.thread.join()
+
+        assert not os.path.exists(self.path)
+        assert_is_none(control('status', self.path))
+
+    def test_status_command(self):
+        """Test the daemon status command"""
+        result = CliRunner().invoke(cli, ['daemon', 'status', '--socket',
+                                          self.path])
+
+        assert_equal(result.exit_code, 0)
+        assert_in('Daemon is running', result.output)
+
+    def test_start_command_running(self):
+        """Test starting the daemon twice fails"""
+        result = CliRunner().invoke(cli, ['daemon', 'start', '--socket',
+                                          self.path])
+
+        assert_equal(result.exit_code, 1)
+        assert_in('Daemon is already running.', result.output)
+
+
+class TestLauncher(TestCase):
+    """Test the cli entry point."""
+
+    @raises(SystemExit)
+    @mock.patch('miqcli.cli.launcher.forward', return_value=0)
+    def test_forwarded(self, forward):
+        """Test commands are forwarded to the daemon"""
+        try:
+            main(['zones', 'query'])
+        finally:
+            forward.assert_called_once_with(['zones', 'query'])
+
+    @mock.patch('miqcli.cli.main.cli.main')
+    @mock.patch('miqcli.cli.launcher.forward', return_value=None)
+    def test_not_forwarded(self, forward, main_):
+        """Test commands run within the process without daemon"""
+        main(['zones', 'query'])
+
+        main_.assert_called_once_with(args=['zones', 'query'])
+
+    @mock.patch('miqcli.cli.main.cli.main')
+    @mock.patch('miqcli.cli.launcher.forward')
+    def test_daemon_commands(self, forward, main_):
+        """Test daemon commands are never forwarded"""
+        main(['daemon', 'stop'])
+
+        assert_equal(forward.call_count, 0)
+
+
+class TestConnections(TestCase):
+    """Test the connections of the client apis."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_get(self):
+        """Test the connection of the same settings is reused"""
+        pool = Connections()
+        settings = dict(url=self.server.url, token=TOKEN, verbose=False)
+
+        api = pool.get(settings)
+
+        assert_is(pool.get(dict(settings, verbose=True)), api)
+        assert_equal(len(pool), 1)
+        assert pool.get(dict(settings, cache=False)) is not api
+        assert_equal(len(pool), 2)
+
+    def test_get_expired(self):
+        """Test the connection is connected again once expired"""
+        pool = Connections()
+        api = pool.get(dict(url=self.server.url, token=TOKEN))
+
+        with mock.patch.object(api, 'expired', return_value=True):
+            with mock.patch.object(api, 'connect') as connect:
+                assert_is(pool.get(dict(url=self.server.url, token=TOKEN)),
+                          api)
+        assert_equal(connect.call_count, 1)
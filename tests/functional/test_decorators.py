@@ -0,0 +1,89 @@
+from importlib import import_module
+from unittest import TestCase
+
+from nose.tools import assert_equal
+
+from miqcli.utils import get_class_methods
+
+from fake_server import COLLECTIONS, FakeServer, pop_context, \
+    push_api_context
+
+VMS = [
+    dict(id=42, name='vm42', type='ManageIQ::Providers::Amazon::CloudManager'
+         '::Vm', vendor='amazon'),
+    dict(id=43, name='vm43', type='ManageIQ::Providers::Amazon::CloudManager'
+         '::Vm', vendor='amazon')
+]
+
+#: collection methods which are expected to download the whole collection
+LISTING_METHODS = [('zones', 'query')]
+
+
+class TestClientApiDecorator(TestCase):
+    """Test the lazy collection binding of the client_api decorator."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(
+            data=dict(vms=VMS, zones=[dict(id=1, name='default',
+                                           description='Default Zone')]),
+            actions=dict(vms=['delete'])
+        ).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        self.server.reset()
+
+    def tearDown(self):
+        pop_context()
+
+    def test_delete_by_id_does_not_list_collection(self):
+        """Test vms delete --by_id makes zero listing requests"""
+        vms = import_module('miqcli.collections.vms').Collections()
+
+        assert_equal(vms.delete('42', by_id=True), '42')
+        # the only request on the collection is the (expanded) id filter
+        assert_equal(self.server.count('GET', 'vms', expand='resources',
+                                       **{'filter[]': None}), 0)
+        assert_equal(self.server.count('GET', 'vms'), 1)
+        assert_equal(self.server.count('POST', 'vms/42'), 1)
+
+    def test_action_is_resolved_on_access(self):
+        """Test the collection action is only resolved when accessed"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        vms._bind('delete')
+        assert_equal(len(self.server.requests), 0)
+
+        assert vms.action is not None
+        assert_equal(self.server.count('GET', 'vms', expand=None), 1)
+
+        # resolved once per bound method
+        getattr(vms, 'action')
+        assert_equal(len(self.server.requests), 1)
+
+    def test_all_is_resolved_on_access(self):
+        """Test the collection listing is only downloaded when accessed"""
+        zones = import_module('miqcli.collections.zones').Collections()
+        zones.query()
+        assert_equal(self.server.count('GET', 'zones', expand='resources'), 1)
+
+    def test_collection_methods_make_no_listing_requests(self):
+        """Test no collection method downloads the collection by default"""
+        for name in COLLECTIONS:
+            cls = getattr(import_module('miqcli.collections.' + name),
+                          'Collections')
+            for method in get_class_methods(cls):
+                if (name, method) in LISTING_METHODS:
+                    continue
+                self.server.reset()
+                try:
+                    getattr(cls(), method)()
+                except (NotImplementedError, TypeError, SystemExit):
+                    pass
+                assert_equal(
+                    self.server.count('GET', name, expand='resources'), 0,
+                    '%s %s downloaded the collection' % (name, method))
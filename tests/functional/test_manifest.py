@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+import mock
+from nose.tools import assert_equal, assert_in, assert_is_none
+
+from miqcli.cli.manifest import CommandManifest, command_help
+
+# runs the cli, then prints the collection modules imported
+LIST_IMPORTS = """
+import sys
+from miqcli.cli.main import cli
+try:
+    cli(sys.argv[1:])
+except SystemExit:
+    pass
+sys.stdout.write('\\n' + ','.join(sorted(
+    m for m in sys.modules if m.startswith('miqcli.collections.'))))
+"""
+
+
+class TestCommandManifest(TestCase):
+    """Test the command manifest."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'commands.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_command_help(self):
+        """Test documented parameters are not part of the help"""
+        assert_equal(command_help('Query.\n\n::\n    :param x: x\n'),
+                     'Query.')
+        assert_is_none(command_help(None))
+
+    def test_load(self):
+        """Test the manifest records commands and help text"""
+        collections = CommandManifest(self.path).load()
+
+        vms = collections['vms']
+        assert_equal(vms['help'], 'Virtual machines collections.')
+        assert_equal(vms['commands']['query'], dict(help='Query vms.'))
+        assert_in('providers', collections)
+        assert_equal(CommandManifest(self.path).names(), sorted(collections))
+
+        with open(self.path) as fp:
+            assert_equal(json.load(fp)['collections'], collections)
+
+    def test_load_saved(self):
+        """Test a saved manifest is loaded without importing collections"""
+        CommandManifest(self.path).load()
+
+        manifest = CommandManifest(self.path)
+        with mock.patch.object(manifest, 'build') as build:
+            assert_equal(manifest.get('vms')['help'],
+                         'Virtual machines collections.')
+        assert_equal(build.call_count, 0)
+        assert_is_none(manifest.get('nope'))
+
+    def test_load_key_changed(self):
+        """Test the manifest is built again once the modules changed"""
+        CommandManifest(self.path).load()
+
+        manifest = CommandManifest(self.path)
+        with mock.patch.object(manifest, 'key', return_value='changed'):
+            with mock.patch.object(manifest, 'build',
+                                   return_value=dict()) as build:
+                assert_equal(manifest.load(), dict())
+        assert_equal(build.call_count, 1)
+
+    def test_key(self):
+        """Test the key follows the modules, not the installed version"""
+        root = os.path.join(self.directory, 'collections')
+        os.mkdir(root)
+        module = os.path.join(root, 'vms.py')
+        with open(module, 'w') as fp:
+            fp.write('')
+        manifest = CommandManifest(self.path, root=root)
+
+        with mock.patch('miqcli.constants.get_version',
+                        side_effect=AssertionError('version looked up')):
+            key = manifest.key()
+            assert_equal(manifest.key(), key)
+            with open(module, 'w') as fp:
+                fp.write('"""Virtual machines."""\n')
+            assert manifest.key() != key
+
+    def test_load_corrupt(self):
+        """Test a corrupt manifest file is built again"""
+        with open(self.path, 'w') as fp:
+            fp.write('{')
+        assert_in('vms', CommandManifest(self.path).load())
+
+    def _imports(self, *args):
+        """Run the cli in a new process, return collection modules imported.
+        """
+        env = dict(os.environ, HOME=self.directory)
+        output = subprocess.check_output(
+            [sys.executable, '-c', LIST_IMPORTS] + list(args), env=env)
+        imported = output.decode('utf-8').splitlines()[-1]
+        return imported.split(',') if imported else []
+
+    def test_help_imports(self):
+        """Test listing commands does not import the collection modules"""
+        # the first run builds the manifest
+        assert self._imports('--help')
+
+        assert_equal(self._imports('--help'), [])
+        assert_equal(self._imports('nope'), [])
+        assert_equal(self._imports('vms', '--help'),
+                     ['miqcli.collections.vms'])
@@ -0,0 +1,178 @@
+import json
+from importlib import import_module
+from unittest import TestCase
+
+import mock
+from nose.tools import assert_equal
+
+from miqcli.api import connections
+from miqcli.cli.main import run
+from miqcli.utils import log
+from miqcli.utils.output import get_writer
+
+from fake_server import FakeServer, TOKEN, pop_context, push_api_context
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+DATA = dict(
+    vms=[dict(id=i, name='vm%s' % i, vendor='openstack', power_state='on')
+         for i in range(1, 4)],
+    tasks=[dict(id=7, name='refresh', state='Queued', status='Ok',
+                message='task queued'),
+           dict(id=8, name='delete', state='Finished', status='Ok',
+                message='task finished')]
+)
+
+
+class TestOutput(TestCase):
+    """Test machine readable outputs."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=DATA).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        self.server.reset()
+        self.stdout = StringIO()
+        self.patcher = mock.patch('sys.stdout', self.stdout)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        pop_context()
+
+    def _lines(self):
+        return self.stdout.getvalue().splitlines()
+
+    def test_get_writer_text(self):
+        """Test the text output has no writer"""
+        assert get_writer('text') is None
+
+    def test_vms_query_jsonl(self):
+        """Test listing vms as JSON Lines"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        vms.query('', attr=(), output='jsonl', fields='id,name')
+
+        assert_equal([json.loads(line) for line in self._lines()],
+                     [dict(id=i, name='vm%s' % i) for i in range(1, 4)])
+
+    def test_vms_query_csv(self):
+        """Test listing vms as CSV"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        vms.query('', attr=(), output='csv', fields='name,power_state')
+
+        assert_equal(self._lines(), ['name,power_state', 'vm1,on',
+                                     'vm2,on', 'vm3,on'])
+
+    def test_vms_query_json(self):
+        """Test listing vms as JSON"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        vms.query('', attr=(), output='json')
+
+        output = json.loads(self.stdout.getvalue())
+        assert_equal([vm['name'] for vm in output], ['vm1', 'vm2', 'vm3'])
+        assert_equal(sorted(output[0]), ['href', 'id', 'name', 'power_state',
+                                         'vendor'])
+
+    def test_vms_query_fields_projection(self):
+        """Test the fields selected are requested (only)"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        vms.query('', attr=(), output='jsonl', fields='name,power_state')
+
+        assert_equal(self.server.count('GET', 'vms',
+                                       attributes='name,power_state'), 1)
+        assert_equal(self.server.count(), 1)
+
+    def test_vms_query_text_projection(self):
+        """Test listing vms as text requests the name and attributes only"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        vms.query('', attr=('vendor',))
+
+        assert_equal(self.server.count('GET', 'vms',
+                                       attributes='name,vendor'), 1)
+        assert_equal(self.server.count(), 1)
+
+    def test_vms_query_filter_fields_projection(self):
+        """Test the fields selected are requested by the filter request"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        vms.query('vm2', attr=(), output='csv', fields='id,vendor')
+
+        assert_equal(self._lines(), ['id,vendor', '2,openstack'])
+        assert_equal(self.server.count('GET', 'vms', attributes='id,vendor'),
+                     1)
+        assert_equal(self.server.count(), 1)
+
+    def test_tasks_status_jsonl(self):
+        """Test the active tasks status as JSON Lines"""
+        tasks = import_module('miqcli.collections.tasks').Collections()
+        tasks.status('', output='jsonl', fields='id,state')
+
+        assert_equal([json.loads(line) for line in self._lines()],
+                     [dict(id=7, state='Queued')])
+
+    def test_tasks_status_csv(self):
+        """Test the status of a task as CSV"""
+        tasks = import_module('miqcli.collections.tasks').Collections()
+        tasks.status('8', output='csv', fields='id,message')
+
+        assert_equal(self._lines(), ['id,message', '8,task finished'])
+
+    def test_json_empty(self):
+        """Test the JSON output without entities"""
+        writer = get_writer('json')
+        writer.close()
+        assert_equal(self._lines(), ['[]'])
+
+
+class TestOutputStreams(TestCase):
+    """Test records are the only lines written to stdout."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=DATA).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def tearDown(self):
+        connections.clear()
+
+    def _run(self, *argv):
+        args = ['--url', self.server.url, '--token', TOKEN]
+        args.extend(argv)
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('sys.stdout', stdout), \
+                mock.patch('sys.stderr', stderr):
+            rc = run(args)
+            log.flush()
+        return rc, stdout.getvalue().splitlines(), \
+            stderr.getvalue().splitlines()
+
+    def test_jsonl_stdout(self):
+        """Test log messages are written to stderr for machine output"""
+        rc, out, err = self._run('--verbose', 'vms', 'query', '--output',
+                                 'jsonl')
+
+        assert_equal(rc, 0)
+        assert_equal([json.loads(line)['name'] for line in out],
+                     ['vm1', 'vm2', 'vm3'])
+        assert err, 'no log message written'
+        assert all(line.startswith(('DEBUG:', 'INFO:', 'WARNING:'))
+                   for line in err), err
+
+    def test_text_stdout(self):
+        """Test log messages are written to stdout for the text output"""
+        rc, out, err = self._run('vms', 'query')
+
+        assert_equal(rc, 0)
+        assert 'INFO:  * NAME: vm1' in out
+        assert_equal(err, [])
@@ -0,0 +1,129 @@
+import json
+from copy import deepcopy
+from importlib import import_module
+from multiprocessing.pool import ThreadPool
+from unittest import TestCase
+
+from click.globals import push_context
+from nose.tools import assert_equal, raises
+
+from miqcli.constants import AWS_PAYLOAD, OSP_FIP_PAYLOAD, OSP_PAYLOAD
+from miqcli.payloads import OSP_FLOATING_IP, OSP_PROVISION
+from miqcli.provider import provider_types
+
+from fake_server import FakeServer, pop_context, push_api_context
+from test_provision_requests import DATA, OSP_INPUT
+
+TEMPLATES = (OSP_PAYLOAD, AWS_PAYLOAD, OSP_FIP_PAYLOAD)
+
+
+class TestPayloadTemplate(TestCase):
+    """Test the payload templates."""
+
+    def test_build(self):
+        """Test building a payload sets the fields given"""
+        payload = OSP_PROVISION.build(vm_fields=dict(vm_name='vm01'),
+                                      requester=dict(owner_email='me'))
+
+        assert_equal(payload['vm_fields']['vm_name'], 'vm01')
+        assert_equal(payload['vm_fields']['placement_auto'], 'false')
+        assert_equal(payload['requester'], dict(owner_email='me'))
+
+    def test_build_fresh_copies(self):
+        """Test payloads built do not share state"""
+        payload = OSP_FLOATING_IP.build(
+            uri_parts=dict(instance='release_floating_ip'))
+        payload['parameters']['floating_ip'] = '10.0.0.1'
+
+        payload = OSP_FLOATING_IP.build()
+        assert_equal(payload, OSP_FIP_PAYLOAD)
+        assert_equal(payload['uri_parts']['instance'], 'get_floating_ip')
+
+    @raises(ValueError)
+    def test_build_unknown_section(self):
+        """Test building a payload with an unknown section"""
+        OSP_PROVISION.build(vm_field=dict(vm_name='vm01'))
+
+    def test_sections(self):
+        """Test the payload sections"""
+        assert_equal(OSP_FLOATING_IP.sections,
+                     frozenset(['uri_parts', 'parameters', 'requester']))
+
+
+class TestConcurrentCreate(TestCase):
+    """Test creating requests concurrently."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=DATA, actions=dict(
+            provision_requests=['create'],
+            automation_requests=['create'])).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        provider_types.invalidate()
+        self.server.reset()
+        self.templates = deepcopy(TEMPLATES)
+
+    def tearDown(self):
+        pop_context()
+        assert_equal(TEMPLATES, self.templates)
+
+    def _create(self, vm_name):
+        push_context(self.ctx)
+        try:
+            collection = import_module(
+                'miqcli.collections.provision_requests').Collections()
+            floating_ip = dict(floating_ip_id='fip-%s' % vm_name) \
+                if vm_name.endswith(('0', '2', '4', '6', '8')) else dict()
+            return collection.create('OpenStack', json.dumps(dict(
+                OSP_INPUT, vm_name=vm_name, email=vm_name + '@example.com',
+                **floating_ip)), None)
+        finally:
+            pop_context()
+
+    def test_concurrent_provision_requests(self):
+        """Test concurrent creates submit their own payloads"""
+        names = ['vm%02d' % i for i in range(24)]
+        pool = ThreadPool(8)
+        try:
+            ids = pool.map(self._create, names)
+        finally:
+            pool.terminate()
+
+        assert_equal(len(set(ids)), 24)
+        payloads = [body['resources'][0] for path, body
+                    in self.server.payloads if path == 'provision_requests']
+        assert_equal(len(payloads), 24)
+        for payload in payloads:
+            vm_name = payload['vm_fields']['vm_name']
+            assert_equal(payload['requester']['owner_email'],
+                         vm_name + '@example.com')
+            if int(vm_name[-1]) % 2:
+                assert payload['vm_fields']['floating_ip_address'] is None
+            else:
+                assert_equal(payload['vm_fields']['floating_ip_address'],
+                             'fip-' + vm_name)
+            assert_equal(payload['vm_fields']['cloud_tenant'], 10)
+        assert_equal(sorted(p['vm_fields']['vm_name'] for p in payloads),
+                     names)
+
+    def test_release_floating_ip_does_not_leak(self):
+        """Test releasing a floating ip leaves the next request untouched"""
+        collection = import_module(
+            'miqcli.collections.automation_requests').Collections()
+        collection.create('release_floating_ip',
+                          json.dumps(dict(floating_ip='10.0.0.1')), None)
+        collection.create('gen_floating_ip', '{}', None)
+
+        release, get = [body['resources'][0] for path, body
+                        in self.server.payloads
+                        if path == 'automation_requests']
+        assert_equal(release['uri_parts']['instance'], 'release_floating_ip')
+        assert_equal(release['parameters']['floating_ip'], '10.0.0.1')
+        assert_equal(get['uri_parts']['instance'], 'get_floating_ip')
+        assert 'floating_ip' not in get['parameters']
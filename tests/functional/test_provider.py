@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+from importlib import import_module
+from unittest import TestCase
+
+import mock
+from nose.tools import assert_equal, assert_is_none
+
+from miqcli.cache import ResolutionCache
+from miqcli.provider import Flavors, KeyPair, Networks, ProviderTypeRegistry,\
+    SecurityGroups, Templates, Tenant, provider_types
+
+from fake_server import FakeServer, pop_context, push_api_context
+
+PROVIDERS = [
+    dict(id=1, name='OpenStack',
+         type='ManageIQ::Providers::Openstack::CloudManager'),
+    dict(id=2, name='OpenStack Network Manager',
+         type='ManageIQ::Providers::Openstack::NetworkManager')
+]
+
+
+class TestProviderTypeRegistry(TestCase):
+    """Test the provider type registry."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=dict(providers=PROVIDERS),
+                                actions=dict(providers=['delete'])).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        self.api = self.ctx.client_api
+        provider_types.invalidate()
+        self.server.reset()
+
+    def tearDown(self):
+        pop_context()
+
+    def test_components_share_provider_types(self):
+        """Test provider components load the provider types only once"""
+        for component in (Flavors, Templates, Tenant, SecurityGroups,
+                          KeyPair, Networks):
+            component('OpenStack', self.api)
+        assert_equal(self.server.count('GET', 'providers'), 1)
+
+        flavors = Flavors('OpenStack', self.api)
+        assert_equal(flavors.cloud_type,
+                     'ManageIQ::Providers::Openstack::CloudManager')
+        assert_equal(flavors.network_type,
+                     'ManageIQ::Providers::Openstack::NetworkManager')
+
+    def test_invalidate(self):
+        """Test invalidating the registry reloads the provider types"""
+        Flavors('OpenStack', self.api)
+        provider_types.invalidate(self.api)
+        Flavors('OpenStack', self.api)
+        assert_equal(self.server.count('GET', 'providers'), 2)
+
+    def test_undefined_provider(self):
+        """Test looking up a provider which does not exist"""
+        assert_equal(provider_types.lookup(self.api, 'Amazon'), ('', ''))
+
+    @mock.patch('miqcli.provider.time.time')
+    def test_ttl(self, mock_time):
+        """Test provider types are reloaded once the ttl expires"""
+        registry = ProviderTypeRegistry(ttl=60)
+        mock_time.return_value = 1000
+        registry.types(self.api)
+        mock_time.return_value = 1059
+        registry.types(self.api)
+        assert_equal(self.server.count('GET', 'providers'), 1)
+
+        mock_time.return_value = 1061
+        registry.types(self.api)
+        assert_equal(self.server.count('GET', 'providers'), 2)
+
+    def test_delete_invalidates_cache(self):
+        """Test deleting a provider forgets the ids resolved for it"""
+        tmp = tempfile.mkdtemp()
+        try:
+            self.api._cache = ResolutionCache(os.path.join(tmp, 'cache'))
+            key = self.api.cache.key(
+                self.api.url, 'flavors',
+                'ManageIQ::Providers::Openstack::CloudManager::Flavor', 'm1')
+            self.api.cache.put(key, 20)
+
+            providers = import_module(
+                'miqcli.collections.providers').Collections()
+            providers._bind('delete')
+            providers.delete('OpenStack')
+            assert_is_none(self.api.cache.get(key))
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,197 @@
+import json
+import os
+import shutil
+import tempfile
+from copy import deepcopy
+from importlib import import_module
+from unittest import TestCase
+
+import mock
+from nose.tools import assert_equal, raises
+
+from miqcli.constants import OSP_PAYLOAD
+from miqcli.provider import provider_types
+from miqcli.utils import log
+
+from fake_server import FakeServer, pop_context, push_api_context
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+OSP = 'ManageIQ::Providers::Openstack::CloudManager'
+OSP_NETWORK = 'ManageIQ::Providers::Openstack::NetworkManager'
+AWS = 'ManageIQ::Providers::Amazon::CloudManager'
+AWS_NETWORK = 'ManageIQ::Providers::Amazon::NetworkManager'
+
+DATA = dict(
+    providers=[
+        dict(id=1, name='OpenStack', type=OSP),
+        dict(id=2, name='OpenStack Network Manager', type=OSP_NETWORK),
+        dict(id=3, name='Amazon', type=AWS),
+        dict(id=4, name='Amazon Network Manager', type=AWS_NETWORK)
+    ],
+    cloud_tenants=[
+        dict(id=10, name='admin', type=OSP + '::CloudTenant')
+    ],
+    flavors=[
+        dict(id=20, name='m1.small', type=OSP + '::Flavor'),
+        dict(id=21, name='t2.micro', type=AWS + '::Flavor')
+    ],
+    templates=[
+        dict(id=30, name='rhel', guid='guid-rhel', type=OSP + '::Template'),
+        dict(id=31, name='ami', guid='guid-ami', type=AWS + '::Template')
+    ],
+    security_groups=[
+        dict(id=40, name='default', cloud_tenant_id=10,
+             type=OSP_NETWORK + '::SecurityGroup')
+    ],
+    authentications=[
+        dict(id=50, name='key', type=OSP + '::AuthKeyPair'),
+        dict(id=51, name='key', type=AWS + '::AuthKeyPair')
+    ],
+    cloud_networks=[
+        dict(id=60, name='private', cloud_tenant_id=10,
+             type=OSP_NETWORK + '::CloudNetwork::Private'),
+        dict(id=61, name='vpc', type=AWS_NETWORK + '::CloudNetwork',
+             cloud_subnets=[dict(id=70, name='subnet-a'),
+                            dict(id=71, name='subnet-b')])
+    ]
+)
+
+OSP_INPUT = dict(email='me@example.com', vm_name='vm01', tenant='admin',
+                 image='rhel', network='private', flavor='m1.small',
+                 security_group='default', key_pair='key')
+
+AWS_INPUT = dict(email='me@example.com', vm_name='vm01', image='ami',
+                 flavor='t2.micro', key_pair='key', network='vpc',
+                 subnet='subnet-b')
+
+
+class TestProvisionRequests(TestCase):
+    """Test provision requests collection."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(
+            data=DATA, actions=dict(provision_requests=['create'])).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        provider_types.invalidate()
+        self.server.reset()
+        self.collection = import_module(
+            'miqcli.collections.provision_requests').Collections()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        pop_context()
+
+    def _manifest(self, *entries):
+        """Write a manifest, one payload data per line."""
+        path = os.path.join(self.tmp, 'manifest.jsonl')
+        with open(path, 'w') as fp:
+            for entry in entries:
+                fp.write(json.dumps(entry) + '\n')
+        return path
+
+    def test_create_openstack(self):
+        """Test creating an OpenStack provision request"""
+        self.collection.create('OpenStack', json.dumps(OSP_INPUT), None)
+
+        assert_equal(self.server.count('GET', 'providers'), 1)
+        assert_equal(self.server.count('POST', 'provision_requests'), 1)
+
+    def test_create_amazon_with_subnet(self):
+        """Test the subnet is resolved without reloading the network"""
+        self.collection.create('Amazon', json.dumps(AWS_INPUT), None)
+
+        assert_equal(self.server.count('GET', 'cloud_networks',
+                                       attributes='cloud_subnets'), 1)
+        assert_equal(self.server.count('GET', 'cloud_networks/61',
+                                       attributes='cloud_subnets'), 0)
+        assert_equal(self.server.count('POST', 'provision_requests'), 1)
+
+    def test_create_does_not_change_payload_template(self):
+        """Test creating a request leaves the payload template untouched"""
+        template = deepcopy(OSP_PAYLOAD)
+        self.collection.create('OpenStack', json.dumps(
+            dict(OSP_INPUT, floating_ip_id='10.0.0.1')), None)
+
+        assert_equal(OSP_PAYLOAD, template)
+
+    def test_create_bulk(self):
+        """Test bulk creation resolves the shared ids once"""
+        entries = [dict(OSP_INPUT, vm_name='vm%02d' % i) for i in range(6)]
+        results = os.path.join(self.tmp, 'results.jsonl')
+
+        self.collection._bind('create_bulk')
+        output = self.collection.create_bulk(
+            'OpenStack', self._manifest(*entries), concurrency=3, rate=0,
+            results=results)
+
+        with open(results) as fp:
+            lines = [json.loads(line) for line in fp]
+        assert_equal(sorted(lines, key=lambda r: r['vm_name']),
+                     sorted(output, key=lambda r: r['vm_name']))
+        assert_equal(sorted(r['vm_name'] for r in lines),
+                     ['vm%02d' % i for i in range(6)])
+        assert_equal(len(set(r['request_id'] for r in lines)), 6)
+
+        for collection in ('providers', 'cloud_tenants', 'flavors',
+                           'templates', 'cloud_networks', 'security_groups',
+                           'authentications'):
+            assert_equal(self.server.count('GET', collection), 1)
+        assert_equal(self.server.count('POST', 'provision_requests'), 6)
+
+    def test_create_bulk_stdout(self):
+        """Test bulk creation writes the results only to stdout"""
+        entries = [dict(AWS_INPUT, vm_name='vm%02d' % i) for i in range(3)]
+        stdout, stderr = StringIO(), StringIO()
+        log.flush()
+
+        self.collection._bind('create_bulk')
+        with mock.patch('sys.stdout', stdout), \
+                mock.patch('sys.stderr', stderr):
+            self.collection.create_bulk(
+                'Amazon', self._manifest(*entries), concurrency=3, rate=0)
+            log.flush()
+
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        assert_equal(sorted(r['vm_name'] for r in lines),
+                     ['vm00', 'vm01', 'vm02'])
+        assert 'INFO: Attempt to create 3 provision requests' in \
+            stderr.getvalue().splitlines()
+
+    def test_create_bulk_resolver_pool(self):
+        """Test bulk creation runs every lookup on a single pool"""
+        entries = [dict(OSP_INPUT, vm_name='vm%02d' % i) for i in range(4)]
+        results = os.path.join(self.tmp, 'results.jsonl')
+
+        self.collection._bind('create_bulk')
+        with mock.patch('miqcli.resolver.ThreadPool') as pool:
+            output = self.collection.create_bulk(
+                'OpenStack', self._manifest(*entries), concurrency=2, rate=0,
+                results=results)
+
+        assert_equal(len(output), 4)
+        assert_equal(pool.call_count, 0)
+
+    @raises(SystemExit)
+    def test_create_bulk_invalid_manifest(self):
+        """Test an invalid payload data aborts before submitting requests"""
+        invalid = dict(OSP_INPUT)
+        del invalid['flavor']
+
+        self.collection._bind('create_bulk')
+        try:
+            self.collection.create_bulk(
+                'OpenStack', self._manifest(OSP_INPUT, invalid), rate=0)
+        finally:
+            assert_equal(self.server.count('POST', 'provision_requests'), 0)
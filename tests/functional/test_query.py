@@ -0,0 +1,350 @@
+import time
+from importlib import import_module
+from unittest import TestCase
+
+import mock
+from manageiq_client.filters import Q
+from nose.tools import assert_equal, raises
+
+from miqcli import query as query_module
+from miqcli.api import Client
+from miqcli.query import AdvancedQuery, BasicQuery, Record, compile_query, \
+    paginate
+
+from fake_server import FakeServer, pop_context, push_api_context
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+VM = 'ManageIQ::Providers::Openstack::CloudManager::Vm'
+
+DATA = dict(
+    vms=[dict(id=i, name='vm%02d' % i, vendor='openstack', type=VM,
+              ext_management_system=dict(name='OpenStack'),
+              ipaddresses=['10.0.0.%s' % i])
+         for i in range(1, 26)]
+)
+
+
+class TestQuery(TestCase):
+    """Test query module."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=DATA).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        self.server.reset()
+        self.server.collection_attributes = True
+        self.collection = self.ctx.client_api.client.collections.vms
+
+    def tearDown(self):
+        pop_context()
+
+    def test_basic_query_attributes(self):
+        """Test attributes are loaded by the filter request"""
+        query = BasicQuery(self.collection)
+        vms = query(('vendor', '=', 'openstack'), ('ipaddresses',))
+
+        assert_equal(len(vms), 25)
+        assert_equal(vms[3].__dict__['ipaddresses'], ['10.0.0.4'])
+        assert_equal(self.server.count(), 1)
+        assert_equal(self.server.count('GET', 'vms', expand='resources',
+                                       attributes='ipaddresses'), 1)
+
+    def test_advanced_query_attributes(self):
+        """Test attributes are loaded by the advanced filter request"""
+        query = AdvancedQuery(self.collection)
+        vms = query([('ext_management_system.name', '=', 'OpenStack'), '&',
+                     ('name', '=', 'vm1*')], ('ipaddresses',))
+
+        assert_equal(len(vms), 10)
+        assert_equal(self.server.count(), 1)
+
+    def test_query_attributes_bulk_fallback(self):
+        """Test attributes are loaded by bulk queries when unsupported"""
+        self.server.collection_attributes = False
+
+        with mock.patch('miqcli.query.QUERY_CHUNK_SIZE', 10):
+            query = BasicQuery(self.collection)
+            vms = query(('vendor', '=', 'openstack'), ('ipaddresses',))
+
+        assert_equal(len(vms), 25)
+        assert_equal([vm.__dict__['ipaddresses'][0] for vm in vms],
+                     ['10.0.0.%s' % i for i in range(1, 26)])
+        assert_equal(self.server.count('POST', 'vms'), 3)
+        assert_equal(self.server.count('GET', 'vms/1'), 0)
+
+    def test_vms_query_attributes(self):
+        """Test querying vms attributes by provider costs one request"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        output = vms.query('', provider='OpenStack', attr=('ipaddresses',))
+
+        assert_equal(len(output), 25)
+        assert_equal(self.server.count(), 1)
+
+    def test_vms_query_filter(self):
+        """Test printing filtered vms costs one request"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        for output in ('text', 'jsonl'):
+            self.server.reset()
+            with mock.patch('sys.stdout', StringIO()):
+                vms.query('', vendor='openstack', attr=(), output=output)
+
+            assert_equal(self.server.count('GET', 'vms',
+                                           expand='resources'), 1)
+            assert_equal(self.server.count(), 1)
+
+    def test_attribute_reads_reload_once(self):
+        """Test chained attribute reads do not reload the resource"""
+        query = BasicQuery(self.collection)
+        query(('name', '=', 'vm07'))
+        for _ in range(3):
+            assert_equal(query.id, 7)
+            assert_equal(query.name, 'vm07')
+            assert_equal(query.vendor, 'openstack')
+
+        assert_equal(self.server.count('GET', 'vms'), 1)
+        assert_equal(self.server.count('GET', 'vms/7'), 0)
+
+        # explicit refresh loads the resource again
+        query.refresh()
+        assert_equal(query.name, 'vm07')
+        assert_equal(self.server.count('GET', 'vms/7'), 1)
+
+        # a new query result is read from its filter request
+        query(('name', '=', 'vm08'))
+        assert_equal(query.name, 'vm08')
+        assert_equal(self.server.count('GET', 'vms'), 2)
+        assert_equal(self.server.count('GET', 'vms/8'), 0)
+
+    def test_attribute_reads_from_query_result(self):
+        """Test attributes part of the query result are not reloaded"""
+        query = BasicQuery(self.collection)
+        query(('name', '=', 'vm07'), ('name', 'ipaddresses'))
+        assert_equal(query.name, 'vm07')
+        assert_equal(query.ipaddresses, ['10.0.0.7'])
+        assert_equal(self.server.count(), 1)
+
+
+class TestPaginate(TestCase):
+    """Test paging through collections."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=DATA).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        self.server.reset()
+        self.collection = self.ctx.client_api.client.collections.vms
+
+    def tearDown(self):
+        pop_context()
+
+    def test_paginate(self):
+        """Test every resource is yielded, one page request at a time"""
+        vms = paginate(self.collection, page_size=10)
+
+        assert_equal(next(vms).name, 'vm01')
+        assert_equal(self.server.count(), 1)
+
+        assert_equal([vm.id for vm in vms], list(range(2, 26)))
+        assert_equal(self.server.count('GET', 'vms', limit='10'), 3)
+
+    def test_paginate_limit_offset(self):
+        """Test paging with a limit and an offset"""
+        vms = list(paginate(self.collection, page_size=4, limit=6, offset=3))
+
+        assert_equal([vm.id for vm in vms], list(range(4, 10)))
+        assert_equal(self.server.count('GET', 'vms', offset='3',
+                                       limit='4'), 1)
+        assert_equal(self.server.count('GET', 'vms', offset='7',
+                                       limit='2'), 1)
+        assert_equal(self.server.count(), 2)
+
+    def test_paginate_attributes(self):
+        """Test attributes are loaded by the page requests"""
+        vms = list(paginate(self.collection, page_size=25,
+                            attributes=('ipaddresses',)))
+
+        assert_equal(vms[0].ipaddresses, ['10.0.0.1'])
+        # the count returned tells the page is the last one
+        assert_equal(self.server.count(), 1)
+
+    def test_paginate_records(self):
+        """Test paging yields records holding the attributes requested"""
+        vms = list(paginate(self.collection, page_size=25,
+                            attributes=('name',), records=True))
+
+        assert isinstance(vms[0], Record)
+        assert_equal(vms[0].name, 'vm01')
+        assert_equal(vms[0]['id'], 1)
+        assert_equal(sorted(vms[0]._data), ['href', 'id', 'name'])
+        assert_equal(self.server.count(), 1)
+
+    def test_paginate_capped_page_size(self):
+        """Test pages shorter than requested do not end the listing"""
+        self.server.max_limit = 4
+        try:
+            vms = list(paginate(self.collection, page_size=10, prefetch=2))
+            limited = list(paginate(self.collection, page_size=10, limit=6,
+                                    offset=3))
+        finally:
+            self.server.max_limit = None
+
+        assert_equal([vm.id for vm in vms], list(range(1, 26)))
+        assert_equal([vm.id for vm in limited], list(range(4, 10)))
+
+    def test_paginate_filters(self):
+        """Test the last filtered page is known from the matching count"""
+        vms = list(paginate(self.collection, page_size=5,
+                            filters=['name = vm1*']))
+
+        assert_equal([vm.id for vm in vms], list(range(10, 20)))
+        assert_equal(self.server.count('GET', 'vms'), 2)
+
+    @raises(AttributeError)
+    def test_record_missing_attribute(self):
+        """Test reading an attribute not requested"""
+        Record(dict(id=1, name='vm01')).vendor
+
+    @raises(ValueError)
+    def test_paginate_invalid_page_size(self):
+        """Test paging with an invalid page size"""
+        next(paginate(self.collection, page_size=0))
+
+    def test_paginate_prefetch(self):
+        """Test prefetched pages are yielded in order"""
+        vms = list(paginate(self.collection, page_size=5, prefetch=3))
+
+        assert_equal([vm.id for vm in vms], list(range(1, 26)))
+        assert self.server.count('GET', 'vms') <= 5 + 3
+
+    def test_paginate_prefetch_backpressure(self):
+        """Test pages are only requested ahead as pages are consumed"""
+        vms = paginate(self.collection, page_size=5, prefetch=2)
+        next(vms)
+        time.sleep(0.2)
+        assert_equal(self.server.count('GET', 'vms'), 2)
+
+        # consuming the first page requests the third page
+        for _ in range(5):
+            next(vms)
+        time.sleep(0.2)
+        assert_equal(self.server.count('GET', 'vms'), 3)
+        vms.close()
+
+    def test_paginate_prefetch_concurrent(self):
+        """Test pages are requested concurrently"""
+        self.server.delay = 0.2
+        try:
+            start = time.time()
+            vms = list(paginate(self.collection, page_size=5, prefetch=6))
+            elapsed = time.time() - start
+        finally:
+            self.server.delay = 0
+
+        assert_equal(len(vms), 25)
+        assert elapsed < 0.2 * 6, elapsed
+
+    def test_client_paginate(self):
+        """Test library users can page through collections"""
+        client = Client.__new__(Client)
+        client._ctx = self.ctx
+        vms = client.paginate('vms', page_size=10, prefetch=2)
+        assert_equal(len(list(vms)), 25)
+
+    def test_vms_query_all(self):
+        """Test listing all vms is streamed page by page"""
+        vms = import_module('miqcli.collections.vms').Collections()
+        listed = vms.query('', attr=(), page_size=10)
+        assert_equal([vm['name'] for vm in listed],
+                     ['vm%02d' % i for i in range(1, 26)])
+        assert_equal(self.server.count('GET', 'vms', expand='resources'), 3)
+
+
+def eval_query(query):
+    """Compile a query the way AdvancedQuery used to (reference)."""
+    adv_query = ''
+    while query:
+        _query = query.pop(0)
+        if isinstance(_query, tuple):
+            adv_query += str("Q('" + str(_query[0]) + "', '" + str(
+                _query[1])) + "', '" + str(_query[2]) + "')"
+        elif isinstance(_query, str):
+            adv_query += ' {0} '.format(_query)
+    return eval(adv_query)
+
+
+class TestCompileQuery(TestCase):
+    """Test query compiler."""
+
+    QUERY = [('name', '=', 'vm01'), '&', ('type', '=', VM), '&',
+             ('cloud_tenant_id', '=', '10')]
+
+    def test_compile(self):
+        """Test compiled filters match the eval based filters"""
+        assert_equal(compile_query(list(self.QUERY)).as_filters,
+                     eval_query(list(self.QUERY)).as_filters)
+
+    def test_compile_values(self):
+        """Test values of any type are compiled like the eval based filters"""
+        query = [('id', '=', 10), '&', ('memory', '>', 1.5), '&',
+                 ('template', '=', False)]
+        assert_equal(compile_query(list(query)).as_filters,
+                     eval_query(list(query)).as_filters)
+        assert_equal(compile_query(query).as_filters,
+                     ['id = "10"', 'memory > "1.5"', 'template = "False"'])
+
+    def test_compile_chain(self):
+        """Test or and and operators are chained left to right"""
+        query = [('name', '=', 'a'), '|', ('name', '=', 'b'), '&',
+                 ('id', '>', 1)]
+        assert_equal(compile_query(query).as_filters,
+                     ['name = "a"', 'or name = "b"', 'id > "1"'])
+
+    def test_compile_keeps_query(self):
+        """Test the query list given is not consumed"""
+        query = list(self.QUERY)
+        compile_query(query)
+        assert_equal(query, self.QUERY)
+
+    def test_plan_cache(self):
+        """Test queries of the same shape share their compiled plan"""
+        query_module._PLANS.clear()
+        compile_query([('name', '=', 'a'), '&', ('type', '=', 'b')])
+        compile_query([('name', '=', 'c'), '&', ('type', '=', 'd')])
+        assert_equal(list(query_module._PLANS), [
+            (('name', '='), '&', ('type', '='))])
+
+    @raises(ValueError)
+    def test_invalid_operator(self):
+        """Test compiling a query with an invalid operator"""
+        compile_query([('name', '~', 'a')])
+
+    @raises(ValueError)
+    def test_invalid_connector(self):
+        """Test compiling queries chained by an invalid operator"""
+        compile_query([('name', '=', 'a'), '^', ('name', '=', 'b')])
+
+    @raises(ValueError)
+    def test_invalid_length(self):
+        """Test compiling a query missing its value"""
+        compile_query([('name', '=')])
+
+    @raises(ValueError)
+    def test_invalid_query_count(self):
+        """Test compiling queries missing a query"""
+        compile_query([('name', '=', 'a'), '&'])
@@ -0,0 +1,142 @@
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from unittest import TestCase
+
+import click
+from click.testing import CliRunner
+from nose.tools import assert_equal, raises
+
+from miqcli.resolver import Resolver, SharedLookup
+from miqcli.utils import log
+
+
+class TestResolver(TestCase):
+    """Test the concurrent id resolver."""
+
+    def test_dependencies_are_passed(self):
+        """Test resolved dependencies are appended to the lookup args"""
+        resolver = Resolver()
+        resolver.add('network', lambda name, tenant: '%s@%s' % (name, tenant),
+                     ('private',), requires=('tenant',))
+        resolver.add('tenant', lambda name: name.upper(), ('admin',))
+        resolver.add('subnet', lambda name, network: '%s/%s' % (
+            network, name), ('sub',), requires=('network',))
+        assert_equal(resolver(), dict(tenant='ADMIN',
+                                      network='private@ADMIN',
+                                      subnet='private@ADMIN/sub'))
+
+    def test_independent_lookups_run_concurrently(self):
+        """Test independent lookups run at the same time"""
+        barrier = dict(count=0, event=threading.Event())
+        lock = threading.Lock()
+
+        def lookup(value):
+            with lock:
+                barrier['count'] += 1
+                if barrier['count'] == 3:
+                    barrier['event'].set()
+            # only returns when all three lookups are running
+            assert barrier['event'].wait(5)
+            return value
+
+        resolver = Resolver(size=3)
+        for name in ('flavor', 'image', 'key_pair'):
+            resolver.add(name, lookup, (name,))
+
+        start = time.time()
+        assert_equal(resolver(), dict(flavor='flavor', image='image',
+                                      key_pair='key_pair'))
+        assert time.time() - start < 5
+
+    def test_shared_pool(self):
+        """Test lookups run on the given pool, left running afterwards"""
+        pool = ThreadPool(2)
+        try:
+            for value in (1, 2):
+                resolver = Resolver(pool=pool)
+                resolver.add('a', lambda: value)
+                resolver.add('b', lambda a: a + 1, requires=('a',))
+                assert_equal(resolver(), dict(a=value, b=value + 1))
+        finally:
+            pool.terminate()
+
+    def test_empty(self):
+        """Test running a resolver without lookups"""
+        assert_equal(Resolver()(), dict())
+
+    @raises(ValueError)
+    def test_undefined_dependency(self):
+        """Test a lookup depending on an undefined lookup"""
+        resolver = Resolver()
+        resolver.add('network', lambda tenant: tenant, requires=('tenant',))
+        resolver()
+
+    @raises(ValueError)
+    def test_circular_dependencies(self):
+        """Test lookups depending on each other"""
+        resolver = Resolver()
+        resolver.add('a', lambda b: b, requires=('b',))
+        resolver.add('b', lambda a: a, requires=('a',))
+        resolver()
+
+    @raises(ValueError)
+    def test_duplicate_lookup(self):
+        """Test adding the same lookup twice"""
+        resolver = Resolver()
+        resolver.add('a', lambda: 1)
+        resolver.add('a', lambda: 2)
+
+    def test_abort_in_lookup(self):
+        """Test aborting within a lookup aborts the caller"""
+        @click.command()
+        def cli():
+            """Run a lookup which aborts"""
+            resolver = Resolver()
+            resolver.add('tenant', lambda: log.abort('Tenant not found.'))
+            resolver.add('flavor', lambda: 1)
+            resolver()
+
+        result = CliRunner().invoke(cli)
+        assert isinstance(result.exception, SystemExit)
+        assert_equal(u'ERROR: Tenant not found.\n', result.output)
+
+
+class TestSharedLookup(TestCase):
+    """Test lookups shared by many resolvers."""
+
+    def test_lookup_once(self):
+        """Test each distinct lookup runs once across resolvers"""
+        calls = list()
+
+        def lookup(name):
+            calls.append(name)
+            time.sleep(0.01)
+            return name.upper()
+
+        shared = SharedLookup(lookup)
+        for _ in range(5):
+            resolver = Resolver(size=3)
+            resolver.add('a', shared, ('flavor',))
+            resolver.add('b', shared, ('image',))
+            resolver.add('c', shared, ('flavor',))
+            assert_equal(sorted(resolver().values()),
+                         ['FLAVOR', 'FLAVOR', 'IMAGE'])
+        assert_equal(sorted(calls), ['flavor', 'image'])
+
+    def test_failed_lookup_runs_again(self):
+        """Test failed lookups are not kept"""
+        results = iter([ValueError('failed'), 'ok'])
+
+        def lookup():
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        shared = SharedLookup(lookup)
+        try:
+            shared()
+        except ValueError:
+            pass
+        assert_equal(shared(), 'ok')
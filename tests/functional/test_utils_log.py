@@ -1,10 +1,18 @@
+import time
 from unittest import TestCase
 
 import click
+import mock
 from click.testing import CliRunner
 from nose.tools import assert_equal
+from miqcli.constants import LOG_FLUSH_INTERVAL
 from miqcli.utils import log as miqcli_log
 
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
 MESSAGE = 'Hello Cloud Users'
 INFO_MESSAGE_RESULT = u'INFO: %s\n' % MESSAGE
 DEBUG_MESSAGE_RESULT = u'DEBUG: %s\n' % MESSAGE
@@ -83,4 +91,160 @@ class TestUtilsLog(TestCase):
 
     result = self.runner.invoke(cli)
     assert isinstance(result.exception, SystemExit)
-    assert_equal(ABORT_MESSAGE_RESULT, result.output)
\ No newline at end of file
+    assert_equal(ABORT_MESSAGE_RESULT, result.output)
+
+class TestUtilsLogSink(TestCase):
+
+  def setUp(self):
+    self.runner = CliRunner()
+
+  def test_utilslog_buffered(self):
+    """Test utils.log messages are written in blocks"""
+    @click.command()
+    def cli():
+        """Print info messages"""
+        with mock.patch('click.echo', wraps=click.echo) as echo:
+            for index in range(1200):
+                miqcli_log.info(index)
+        assert_equal(echo.call_count, 2)
+
+    result = self.runner.invoke(cli)
+    assert_equal(result.exception, None)
+    assert_equal(result.output.splitlines(),
+                 ['INFO: %s' % index for index in range(1200)])
+
+  def test_utilslog_flush_on_abort(self):
+    """Test utils.log buffered messages are written before aborting"""
+    @click.command()
+    def cli():
+        """Print an info message and abort"""
+        miqcli_log.info(MESSAGE)
+        miqcli_log.abort(MESSAGE)
+
+    result = self.runner.invoke(cli)
+    assert isinstance(result.exception, SystemExit)
+    assert_equal(INFO_MESSAGE_RESULT + ABORT_MESSAGE_RESULT, result.output)
+
+  def test_utilslog_flush_interval(self):
+    """Test utils.log buffered messages are written after the interval"""
+    output = StringIO()
+    with mock.patch('sys.stdout', output):
+        miqcli_log.info(MESSAGE)
+        assert_equal(output.getvalue(), '')
+        time.sleep(LOG_FLUSH_INTERVAL * 3)
+    assert_equal(output.getvalue(), INFO_MESSAGE_RESULT)
+
+  def test_utilslog_style_tty(self):
+    """Test utils.log messages are only styled for terminals"""
+    with mock.patch.object(miqcli_log._Sink, '_isatty', return_value=False):
+        sink = miqcli_log._Sink()
+    sink.write(MESSAGE, bold=True, fg='red')
+    sink.styled = True
+    sink.write(MESSAGE, bold=True, fg='red')
+    assert_equal(sink._lines[0], MESSAGE)
+    assert_equal(sink._lines[1], click.style(MESSAGE, bold=True, fg='red'))
+    sink._lines = []
+    sink.flush()
+
+  def test_utilslog_single_flusher(self):
+    """Test utils.log buffer cycles share a single flusher thread"""
+    output = StringIO()
+    sink = miqcli_log._Sink(interval=0.01)
+    with mock.patch('sys.stdout', output):
+        sink.write(MESSAGE)
+        thread = sink._thread
+        time.sleep(0.1)
+        sink.write(MESSAGE)
+        time.sleep(0.1)
+    assert_equal(output.getvalue(), (MESSAGE + '\n') * 2)
+    assert sink._thread is thread
+
+  def test_utilslog_close_hook_once(self):
+    """Test utils.log registers the close hook once per buffer cycle"""
+    @click.command()
+    def cli():
+        """Print info messages"""
+        with mock.patch.object(miqcli_log._sink, '_flush_on_close') as hook:
+            for index in range(10):
+                miqcli_log.info(index)
+        miqcli_log.flush()
+        assert_equal(hook.call_count, 1)
+
+    miqcli_log.flush()
+    result = self.runner.invoke(cli)
+    assert_equal(result.exception, None)
+
+
+class TestUtilsLogLevel(TestCase):
+
+  def setUp(self):
+    self.runner = CliRunner()
+
+  def tearDown(self):
+    miqcli_log.set_level(None)
+
+  @staticmethod
+  def _cli():
+    @click.command()
+    @click.option('--log-level', default=None)
+    @click.option('-v', '--verbose', count=True)
+    def cli(log_level, verbose):
+        """Print a message of each level"""
+        miqcli_log.debug(MESSAGE)
+        miqcli_log.info(MESSAGE)
+        miqcli_log.warning(MESSAGE)
+        miqcli_log.error(MESSAGE)
+    return cli
+
+  def test_utilslog_level_warning(self):
+    """Test utils.log messages below the log level are not logged"""
+    result = self.runner.invoke(self._cli(), ['--log-level', 'warning'])
+    assert_equal(result.exception, None)
+    assert_equal(WARNING_MESSAGE_RESULT + ERROR_MESSAGE_RESULT, result.output)
+
+  def test_utilslog_level_debug(self):
+    """Test utils.log messages of every level are logged at debug level"""
+    result = self.runner.invoke(self._cli(), ['--log-level', 'debug'])
+    assert_equal(result.exception, None)
+    assert_equal(DEBUG_MESSAGE_RESULT + INFO_MESSAGE_RESULT +
+                 WARNING_MESSAGE_RESULT + ERROR_MESSAGE_RESULT, result.output)
+
+  def test_utilslog_set_level(self):
+    """Test utils.log level set explicitly"""
+    miqcli_log.set_level('error')
+    result = self.runner.invoke(self._cli(), ['--verbose'])
+    assert_equal(ERROR_MESSAGE_RESULT, result.output)
+
+  def test_utilslog_level_resolved_once(self):
+    """Test utils.log level is resolved once per context"""
+    @click.command()
+    @click.option('-v', '--verbose', count=True)
+    def cli(verbose):
+        """Print debug messages"""
+        with mock.patch.object(click.Context, 'find_root',
+                               autospec=True,
+                               side_effect=lambda ctx: ctx) as find_root:
+            for _ in range(1000):
+                miqcli_log.debug(MESSAGE)
+        assert_equal(find_root.call_count, 1)
+
+    result = self.runner.invoke(cli)
+    assert_equal(result.exception, None)
+    assert_equal(u'', result.output)
+
+  def test_utilslog_suppressed_not_formatted(self):
+    """Test utils.log suppressed messages are not formatted"""
+    value = mock.MagicMock()
+
+    @click.command()
+    @click.option('-v', '--verbose', count=True)
+    def cli(verbose):
+        """Print a debug message"""
+        miqcli_log.debug('%s', value)
+
+    result = self.runner.invoke(cli)
+    assert_equal(u'', result.output)
+    assert_equal(value.__str__.call_count, 0)
+
+    result = self.runner.invoke(cli, ['--verbose'])
+    assert_equal(value.__str__.call_count, 1)
@@ -0,0 +1,234 @@
+import json
+from importlib import import_module
+from unittest import TestCase
+
+import mock
+from nose.tools import assert_equal, raises
+
+from miqcli.api import connections
+from miqcli.cli.main import run
+from miqcli.utils import log
+from miqcli.utils.poll import backoff, poll
+
+from fake_server import FakeServer, TOKEN, pop_context, push_api_context
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+def _request(state, status='Ok'):
+    return dict(id=5, request_state=state, status=status, message='')
+
+
+class TestPoll(TestCase):
+    """Test polling with backoff."""
+
+    def test_backoff(self):
+        """Test backoff delays grow up to the maximum with jitter"""
+        delays = backoff(initial=1, maximum=8, factor=2, jitter=0.5)
+        for maximum in (1, 2, 4, 8, 8, 8):
+            delay = next(delays)
+            assert maximum / 2.0 <= delay <= maximum
+
+    def test_backoff_without_jitter(self):
+        """Test backoff delays without jitter"""
+        delays = backoff(initial=1, maximum=5, factor=2, jitter=0)
+        assert_equal([next(delays) for _ in range(5)], [1, 2, 4, 5, 5])
+
+    @mock.patch('miqcli.utils.poll.time.sleep')
+    def test_poll_done(self, sleep):
+        """Test polling returns right away once done"""
+        results = iter([1, 2, 3])
+        assert_equal(poll(lambda: next(results), lambda r: r == 1), (True, 1))
+        assert_equal(sleep.call_count, 0)
+
+    @mock.patch('miqcli.utils.poll.time.sleep')
+    def test_poll_until_done(self, sleep):
+        """Test polling sleeps the backoff delays between calls"""
+        results = iter([1, 2, 3])
+        assert_equal(poll(lambda: next(results), lambda r: r == 3,
+                          delays=iter([1, 2])), (True, 3))
+        assert_equal([c[0][0] for c in sleep.call_args_list], [1, 2])
+
+    @mock.patch('miqcli.utils.poll.time.sleep')
+    def test_poll_timeout(self, sleep):
+        """Test polling gives up once the timeout expires"""
+        assert_equal(poll(lambda: 1, lambda r: False, timeout=0), (False, 1))
+        assert_equal(sleep.call_count, 0)
+
+
+class TestWaitFor(TestCase):
+    """Test waiting for requests and tasks."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeServer(data=dict(provision_requests=[])).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ctx = push_api_context(self.server)
+        self.server.reset()
+        self.collection = import_module(
+            'miqcli.collections.provision_requests').Collections()
+        self.collection._bind('status')
+        self.stdout = StringIO()
+        self.patcher = mock.patch('sys.stdout', self.stdout)
+        self.patcher.start()
+
+    def tearDown(self):
+        log.flush()
+        self.patcher.stop()
+        pop_context()
+
+    def _lines(self):
+        log.flush()
+        return self.stdout.getvalue().splitlines()
+
+    def _states(self, *states):
+        """Change the request state each time the poll sleeps."""
+        states = iter(states)
+        data = self.server.data['provision_requests']
+        data[:] = [_request(*next(states))]
+
+        def sleep(delay):
+            data[:] = [_request(*next(states))]
+        return mock.patch('miqcli.utils.poll.time.sleep', side_effect=sleep)
+
+    def test_wait_for_finished(self):
+        """Test a finished request is returned right away"""
+        with self._states(('finished',)) as sleep:
+            request = self.collection.wait_for('5')
+
+        assert_equal(request.request_state, 'finished')
+        assert_equal(sleep.call_count, 0)
+        assert_equal(self.server.count('GET', 'provision_requests/5'), 1)
+
+    def test_wait_for_transitions(self):
+        """Test only the state transitions are reported"""
+        with self._states(('pending',), ('pending',), ('active',),
+                          ('active',), ('finished', 'Error')) as sleep:
+            request = self.collection.wait_for('5')
+
+        assert_equal(request.status, 'Error')
+        assert_equal(sleep.call_count, 4)
+        assert_equal(self._lines(), [
+            'INFO:  * ID: 5\tSTATE: pending\tSTATUS: Ok',
+            'INFO:  * ID: 5\tSTATE: active\tSTATUS: Ok',
+            'INFO:  * ID: 5\tSTATE: finished\tSTATUS: Error'])
+
+    def test_wait_for_states(self):
+        """Test waiting for the given states"""
+        with self._states(('pending',), ('active',), ('finished',)):
+            request = self.collection.wait_for('5', states=('active',))
+
+        assert_equal(request.request_state, 'active')
+
+    @raises(SystemExit)
+    def test_wait_for_timeout(self):
+        """Test waiting past the timeout aborts"""
+        with self._states(('pending',)):
+            self.collection.wait_for('5', timeout=0)
+
+    def test_status_watch(self):
+        """Test watching the status of a request"""
+        with self._states(('active',), ('finished',)) as sleep:
+            request = self.collection.status('5', output='jsonl',
+                                             fields='id,request_state',
+                                             watch=True)
+
+        assert_equal(request.request_state, 'finished')
+        assert_equal(sleep.call_count, 1)
+        assert_equal(self._lines(), [
+            '{"id": 5, "request_state": "finished"}'])
+
+    def test_status_watch_cli(self):
+        """Test watching the status keeps stdout machine readable"""
+        with self._states(('pending',), ('active',), ('finished',)), \
+                mock.patch('sys.stderr', StringIO()):
+            rc = run(['--url', self.server.url, '--token', TOKEN,
+                      'provision_requests', 'status', '5', '--watch',
+                      '--output', 'jsonl'])
+        connections.clear()
+
+        assert_equal(rc, 0)
+        lines = self._lines()
+        assert_equal([json.loads(line)['request_state'] for line in lines],
+                     ['finished'])
+
+    def _ticks(self, *ticks):
+        """Change the requests states each time the poll sleeps."""
+        ticks = iter(ticks)
+        data = self.server.data['provision_requests']
+
+        def tick(delay=None):
+            data[:] = [dict(_request(state), id=_id)
+                       for _id, state in enumerate(next(ticks), 1)]
+        tick()
+        return mock.patch('miqcli.utils.poll.time.sleep', side_effect=tick)
+
+    def test_wait_for_all(self):
+        """Test requests are generated as they finish, one query per tick"""
+        with self._ticks(('active', 'finished', 'active'),
+                         ('finished', 'finished', 'active'),
+                         ('finished', 'finished', 'finished')) as sleep:
+            requests = list(self.collection.wait_for_all(['1', '2', '3']))
+
+        assert_equal([r.id for r in requests], [2, 1, 3])
+        assert_equal(sleep.call_count, 2)
+        assert_equal(self.server.count('GET', 'provision_requests'), 3)
+        assert_equal(self.server.count(), 3)
+
+    def test_wait_for_all_chunks(self):
+        """Test outstanding requests are filtered in chunks"""
+        with self._ticks(('active', 'active', 'active'),
+                         ('finished', 'finished', 'finished')):
+            requests = list(self.collection.wait_for_all(
+                [1, 2, 3, 3], chunk_size=2))
+
+        assert_equal(sorted(r.id for r in requests), [1, 2, 3])
+        assert_equal(self.server.count('GET', 'provision_requests'), 4)
+
+    def test_wait_for_all_not_found(self):
+        """Test requests not found are dropped"""
+        with self._ticks(('finished',)):
+            requests = list(self.collection.wait_for_all(['1', '9']))
+
+        assert_equal([r.id for r in requests], [1])
+        assert 'WARNING: provision_requests id: 9 not found!' in \
+            self._lines()
+
+    @raises(SystemExit)
+    def test_wait_for_all_timeout(self):
+        """Test waiting past the timeout aborts"""
+        with self._ticks(('finished', 'active')):
+            list(self.collection.wait_for_all(['1', '2'], timeout=0))
+
+    def test_wait(self):
+        """Test waiting for provision requests"""
+        self.collection._bind('wait')
+        with self._ticks(('active', 'finished'), ('finished', 'finished')):
+            requests = self.collection.wait(('1', '2'), output='jsonl',
+                                            fields='id,request_state')
+
+        assert_equal([r.id for r in requests], [2, 1])
+        assert_equal([json.loads(line) for line in self._lines()], [
+            {'id': 2, 'request_state': 'finished'},
+            {'id': 1, 'request_state': 'finished'}])
+
+    def test_wait_transitions(self):
+        """Test the state transitions are reported for the text output"""
+        self.collection._bind('wait')
+        with self._ticks(('active', 'finished'), ('finished', 'finished')):
+            self.collection.wait(('1', '2'))
+
+        assert_equal(self._lines(), [
+            'INFO:  * ID: 1\tSTATE: active\tSTATUS: Ok',
+            'INFO:  * ID: 2\tSTATE: finished\tSTATUS: Ok',
+            'INFO:  * ID: 2\tFINISHED\tSTATUS: Ok\tMESSAGE: ',
+            'INFO:  * ID: 1\tSTATE: finished\tSTATUS: Ok',
+            'INFO:  * ID: 1\tFINISHED\tSTATUS: Ok\tMESSAGE: '])
@@ -0,0 +1,46 @@
+import threading
+import time
+from unittest import TestCase
+
+from nose.tools import assert_equal
+
+from miqcli.utils.throttle import Throttle
+
+
+class TestThrottle(TestCase):
+    """Test the rate limiter."""
+
+    def test_rate(self):
+        """Test calls are spaced by the rate"""
+        throttle = Throttle(50)
+        start = time.time()
+        for _ in range(6):
+            throttle.wait()
+        assert time.time() - start >= 0.1
+
+    def test_rate_threads(self):
+        """Test calls from many threads are spaced by the rate"""
+        throttle = Throttle(50)
+        times = list()
+
+        def call():
+            throttle.wait()
+            times.append(time.time())
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        times.sort()
+        assert_equal(len(times), 6)
+        assert times[-1] - times[0] >= 0.09
+
+    def test_no_limit(self):
+        """Test calls are not delayed without a rate"""
+        throttle = Throttle(0)
+        start = time.time()
+        for _ in range(1000):
+            throttle.wait()
+        assert time.time() - start < 0.5